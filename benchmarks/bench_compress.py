@@ -0,0 +1,70 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Benchmark gzip writers of derivatives."""
+import gzip
+import shutil
+import tempfile
+from pathlib import Path
+
+from dmriprep.utils.compress import parallel_gzip
+
+from .synthetic import synthetic_dwi
+
+
+class GzipWriter:
+    """Compress a 4D NIfTI file (~30 MB) with the stdlib and the parallel writers."""
+
+    params = ([1, 6], [1, 2, 4, 8])
+    param_names = ["compresslevel", "num_threads"]
+    timeout = 300
+
+    def setup(self, compresslevel, num_threads):
+        self.tmpdir = Path(tempfile.mkdtemp())
+        self.in_file = self.tmpdir / "dwi.nii"
+        synthetic_dwi(shape=(96, 96, 50), nvols=32).to_filename(self.in_file)
+        self.out_file = self.tmpdir / "dwi.nii.gz"
+
+    def teardown(self, compresslevel, num_threads):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def time_stdlib(self, compresslevel, num_threads):
+        with open(self.in_file, "rb") as f_in, open(self.out_file, "wb") as f_out:
+            with gzip.GzipFile("", "wb", compresslevel, f_out, 0.0) as gz_out:
+                shutil.copyfileobj(f_in, gz_out)
+
+    def time_parallel(self, compresslevel, num_threads):
+        parallel_gzip(
+            self.in_file,
+            self.out_file,
+            compresslevel=compresslevel,
+            num_threads=num_threads,
+        )
+
+    def track_throughput(self, compresslevel, num_threads):
+        from time import perf_counter
+
+        start = perf_counter()
+        self.time_parallel(compresslevel, num_threads)
+        return self.in_file.stat().st_size / 2 ** 20 / (perf_counter() - start)
+
+    track_throughput.unit = "MiB/s"
@@ -0,0 +1,91 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Benchmark the image operations of the DWI reference and b=0 handling."""
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import nibabel as nb
+
+from dmriprep.utils.images import extract_b0, median, rescale_b0
+from dmriprep.utils.vectors import b0mask_from_data
+
+from .synthetic import synthetic_dwi, synthetic_mask, synthetic_scheme
+
+
+class DWISeries:
+    """
+    Process synthetic multi-shell DWI series of increasing size.
+
+    Inputs are written uncompressed, so that decompression does not dominate
+    the measurements.
+
+    """
+
+    params = ([(64, 64, 40), (96, 96, 60), (128, 128, 72)], [32, 96])
+    param_names = ["shape", "nvols"]
+    timeout = 600
+
+    def setup(self, shape, nvols):
+        self.tmpdir = Path(tempfile.mkdtemp())
+        _, bvals = synthetic_scheme(nvols, shells=(1000, 2000), nb0=max(2, nvols // 12))
+        self.b0_ixs = np.flatnonzero(bvals == 0).tolist()
+
+        img = synthetic_dwi(shape=shape, bvals=bvals)
+        self.dwi_file = self.tmpdir / "dwi.nii"
+        img.to_filename(self.dwi_file)
+        self.mask_file = self.tmpdir / "mask.nii"
+        synthetic_mask(shape=shape).to_filename(self.mask_file)
+        self.b0_file = self.tmpdir / "b0.nii"
+        nb.Nifti1Image(
+            np.asanyarray(img.dataobj)[..., self.b0_ixs], img.affine, img.header
+        ).to_filename(self.b0_file)
+        self.out_file = self.tmpdir / "out.nii"
+
+    def teardown(self, shape, nvols):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def time_b0mask_from_data(self, shape, nvols):
+        b0mask_from_data(self.dwi_file, self.mask_file)
+
+    def peakmem_b0mask_from_data(self, shape, nvols):
+        b0mask_from_data(self.dwi_file, self.mask_file)
+
+    def time_extract_b0(self, shape, nvols):
+        extract_b0(self.dwi_file, self.b0_ixs, out_path=self.out_file)
+
+    def peakmem_extract_b0(self, shape, nvols):
+        extract_b0(self.dwi_file, self.b0_ixs, out_path=self.out_file)
+
+    def time_rescale_b0(self, shape, nvols):
+        rescale_b0(self.b0_file, self.mask_file, out_path=self.out_file)
+
+    def peakmem_rescale_b0(self, shape, nvols):
+        rescale_b0(self.b0_file, self.mask_file, out_path=self.out_file)
+
+    def time_median(self, shape, nvols):
+        median(self.b0_file, out_path=self.out_file)
+
+    def peakmem_median(self, shape, nvols):
+        median(self.b0_file, out_path=self.out_file)
@@ -0,0 +1,89 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""
+Benchmark the start-up time of the command line.
+
+Run as a script (``python -m benchmarks.bench_startup``) to print the modules
+that dominate the ``python -X importtime`` report of :py:mod:`dmriprep.cli.run`.
+
+"""
+import subprocess
+import sys
+
+
+def importtime(module):
+    """Import ``module`` in a fresh interpreter and return cumulative times (us)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def _run_cli(*args):
+    subprocess.run(
+        [sys.executable, "-c", "from dmriprep.cli.run import main; main()", *args],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+class CLIStartup:
+    """Import and argument-parsing latency of the ``dmriprep`` command."""
+
+    timeout = 120
+
+    def timeraw_import_cli(self):
+        return "import dmriprep.cli.run"
+
+    def timeraw_import_config(self):
+        return "import dmriprep.config"
+
+    def track_importtime_cli(self):
+        return importtime("dmriprep.cli.run")["dmriprep.cli.run"] / 1000
+
+    track_importtime_cli.unit = "ms"
+
+    def time_version(self):
+        _run_cli("--version")
+
+    def time_help(self):
+        _run_cli("--help")
+
+    def time_usage_error(self):
+        _run_cli()
+
+
+if __name__ == "__main__":
+    report = importtime("dmriprep.cli.run")
+    for name, cumulative in sorted(report.items(), key=lambda x: -x[1])[:25]:
+        print(f"{cumulative / 1000:10.1f} ms  {name}")
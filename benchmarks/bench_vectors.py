@@ -0,0 +1,69 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Benchmark the handling of diffusion gradient tables."""
+import numpy as np
+
+from dmriprep.utils.vectors import bvecs2ras, calculate_pole, normalize_gradients
+
+from .synthetic import synthetic_scheme
+
+
+class Gradients:
+    """Check, normalize and reorient multi-shell schemes of increasing length."""
+
+    params = ([32, 64, 128, 256], ["hemisphere", "sphere"])
+    param_names = ["nvols", "scheme"]
+    timeout = 300
+
+    def setup(self, nvols, scheme):
+        self.bvecs, self.bvals = synthetic_scheme(
+            nvols, shells=(1000, 2000, 3000), hemisphere=scheme == "hemisphere"
+        )
+        # Vendors scale b-vectors to encode intermediate b-values
+        self.raw_bvecs = self.bvecs * np.sqrt(self.bvals / 3000.0)[:, np.newaxis]
+        self.raw_bvals = np.full_like(self.bvals, 3000.0)
+        self.raw_bvals[self.bvals == 0] = 0.0
+        # An oblique, LAS acquisition
+        angle = np.pi / 12
+        self.affine = np.diag([-2.0, 2.0, 2.0, 1.0])
+        self.affine[1:3, 1:3] = 2.0 * np.array(
+            [[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]]
+        )
+
+    def time_calculate_pole(self, nvols, scheme):
+        calculate_pole(self.bvecs)
+
+    def peakmem_calculate_pole(self, nvols, scheme):
+        calculate_pole(self.bvecs)
+
+    def time_normalize_gradients(self, nvols, scheme):
+        normalize_gradients(self.raw_bvecs, self.raw_bvals, raise_error=True)
+
+    def peakmem_normalize_gradients(self, nvols, scheme):
+        normalize_gradients(self.raw_bvecs, self.raw_bvals, raise_error=True)
+
+    def time_bvecs2ras(self, nvols, scheme):
+        bvecs2ras(self.affine, self.bvecs)
+
+    def peakmem_bvecs2ras(self, nvols, scheme):
+        bvecs2ras(self.affine, self.bvecs)
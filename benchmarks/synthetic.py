@@ -0,0 +1,85 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Synthetic data generators for benchmarks."""
+import numpy as np
+import nibabel as nb
+
+
+def synthetic_scheme(nvols=64, shells=(1000,), nb0=None, hemisphere=False):
+    """
+    Generate a diffusion gradient scheme, as b-vectors (N x 3) and b-values (N).
+
+    Low-b volumes (``nb0``, by default one every 16 volumes) are interspersed at
+    regular intervals, starting with the first volume.
+    The remaining volumes get unit-norm directions spread evenly (with a Fibonacci
+    lattice) over the full sphere, or over the upper hemisphere (z > 0) if
+    ``hemisphere`` is set, and are assigned to the ``shells`` in turn.
+
+    """
+    nb0 = max(1, nvols // 16) if nb0 is None else nb0
+    b0_ixs = np.linspace(0, nvols, nb0, endpoint=False).astype(int)
+    ndirs = nvols - nb0
+
+    k = np.arange(ndirs) + 0.5
+    z = 1.0 - k / ndirs if hemisphere else 1.0 - 2.0 * k / ndirs
+    azimuth = np.pi * (1.0 + 5 ** 0.5) * k
+    radius = np.sqrt(1.0 - z ** 2)
+    dirs = np.stack((radius * np.cos(azimuth), radius * np.sin(azimuth), z), axis=-1)
+
+    dw_ixs = np.setdiff1d(np.arange(nvols), b0_ixs)
+    bvecs = np.zeros((nvols, 3))
+    bvecs[dw_ixs] = dirs
+    bvals = np.zeros(nvols)
+    bvals[dw_ixs] = np.resize(np.asarray(shells, dtype=float), ndirs)
+    return bvecs, bvals
+
+
+def _blob(shape):
+    """A smooth, blob-shaped "brain" filling the field of view."""
+    grid = np.meshgrid(*[np.linspace(-1, 1, n) for n in shape], indexing="ij")
+    return np.exp(-4.0 * sum(axis ** 2 for axis in grid)).astype("float32")
+
+
+def synthetic_dwi(shape=(96, 96, 60), nvols=64, seed=1234, bvals=None):
+    """
+    Generate a DWI-like int16 series: a smooth, blob-shaped "brain" plus noise.
+
+    Unlike random data, the result compresses to a realistic ratio.
+    If ``bvals`` are given (e.g., from :py:func:`synthetic_scheme`), the series has
+    one volume per b-value, attenuated according to it.
+
+    """
+    rng = np.random.default_rng(seed)
+    if bvals is None:
+        attenuation = np.hstack(([1.0], rng.uniform(0.2, 0.6, nvols - 1)))
+    else:
+        bvals = np.asarray(bvals, dtype=float)
+        attenuation = np.exp(-bvals * rng.uniform(0.5e-3, 1.0e-3, bvals.size))
+    data = 1000.0 * _blob(shape)[..., np.newaxis] * attenuation
+    data += rng.normal(0.0, 20.0, size=data.shape)
+    return nb.Nifti1Image(np.clip(data, 0, None).astype("int16"), np.eye(4), None)
+
+
+def synthetic_mask(shape=(96, 96, 60)):
+    """Generate the brain mask corresponding to :py:func:`synthetic_dwi`."""
+    return nb.Nifti1Image((_blob(shape) > 0.1).astype("uint8"), np.eye(4), None)
@@ -31,12 +31,19 @@ def _build_parser():
     from functools import partial
     from pathlib import Path
     from argparse import (
+        Action,
         ArgumentParser,
         ArgumentDefaultsHelpFormatter,
     )
     from packaging.version import Version
-    from .version import check_latest, is_flagged
-    from niworkflows.utils.spaces import Reference, OutputReferencesAction
+
+    class OutputReferencesAction(Action):
+        """Defer importing NiWorkflows' spatial references (seconds) until needed."""
+
+        def __call__(self, parser, namespace, values, option_string=None):
+            from niworkflows.utils.spaces import OutputReferencesAction as _Action
+
+            _Action.__call__(self, parser, namespace, values, option_string)
 
     def _path_exists(path, parser):
         """Ensure a given path exists."""
@@ -172,6 +179,40 @@ def _build_parser():
         help="attempt to reduce memory usage (will increase disk usage "
         "in working directory)",
     )
+    g_perfm.add_argument(
+        "--clean-intermediates",
+        action="store_true",
+        default=False,
+        help="remove large intermediate results from the working directory as soon "
+        "as all the steps using them have finished (reruns will recompute them)",
+    )
+    g_perfm.add_argument(
+        "--content-hashing",
+        action="store_true",
+        default=False,
+        help="decide whether steps must be rerun by the contents of their input files "
+        "rather than their timestamps (robust to copied or re-staged data); file digests "
+        "are cached in the working directory, so only modified files are read again",
+    )
+    g_perfm.add_argument(
+        "--work-budget",
+        dest="work_budget_gb",
+        action="store",
+        type=_to_gb,
+        help="disk space the working directory may use for intermediate results "
+        "(e.g., 500G); new subjects are not started while it is exceeded "
+        "(requires --clean-intermediates)",
+    )
+    g_perfm.add_argument(
+        "--shared-cache",
+        dest="shared_cache_gb",
+        action="store",
+        type=_to_gb,
+        help="reuse the results of steps run again with identical inputs (template "
+        "resampling across subjects, or SyN registrations and priors removed by "
+        "--clean-intermediates) through a cache of the given size (e.g., 2G) in the "
+        "working directory, evicting the least recently used results",
+    )
     g_perfm.add_argument(
         "--use-plugin",
         action="store",
@@ -187,6 +228,27 @@ def _build_parser():
         default=False,
         help="generate boilerplate only",
     )
+    g_perfm.add_argument(
+        "--defer-reportlets",
+        action="store_true",
+        default=False,
+        help="do not render visual reportlets while processing; render them when the "
+        "reports are generated instead (cached in the working directory)",
+    )
+    g_perfm.add_argument(
+        "--estimate-only",
+        action="store_true",
+        default=False,
+        help="build the workflow and estimate the CPU time, memory and disk space "
+        "each participant will require, without running it",
+    )
+    g_perfm.add_argument(
+        "--cost-model",
+        action="store",
+        type=PathExists,
+        help="cost model (JSON) used by --estimate-only, calibrated on the traces of "
+        "past runs (see dmriprep.utils.estimate.records_from_traces)",
+    )
     g_perfm.add_argument(
         "--md-only-boilerplate",
         action="store_true",
@@ -250,7 +312,6 @@ https://www.nipreps.org/dmriprep/en/{currentv.base_version if is_release else "l
     g_ants.add_argument(
         "--skull-strip-template",
         default="OASIS30ANTs",
-        type=Reference.from_string,
         help="select a template for skull-stripping with antsBrainExtraction",
     )
     g_ants.add_argument(
@@ -332,6 +393,25 @@ is discouraged.""",
         help="Clears working directory of contents. Use of this flag is not"
         "recommended when running concurrent processes of dMRIPrep.",
     )
+    g_other.add_argument(
+        "--output-link-mode",
+        action="store",
+        choices=("copy", "hardlink", "reflink", "auto"),
+        default="copy",
+        help="how derivatives are written out from the working directory: copy them "
+        "(default), or hardlink/reflink them when they are already in the final format "
+        "(``auto`` tries a reflink and then a hardlink). Hardlinked derivatives share "
+        "their data with the working directory, which must not be modified afterwards.",
+    )
+    g_other.add_argument(
+        "--output-precision",
+        action="store",
+        choices=("native", "float32", "int16"),
+        default="native",
+        help="storage type of floating-point derivatives: keep the type they were "
+        "computed with (default), cast them to float32, or quantize them to 16-bit "
+        "integers with a scaling factor",
+    )
     g_other.add_argument(
         "--resource-monitor",
         action="store_true",
@@ -382,7 +462,21 @@ is discouraged.""",
         help="Use low-quality tools for speed - TESTING ONLY",
     )
 
-    latest = check_latest()
+    return parser
+
+
+def _check_version(version_check):
+    """
+    Warn if a newer version is available, or this version has been flagged.
+
+    Only called once arguments are parsed, so that ``--help``, ``--version`` and
+    usage errors never wait on the network.
+
+    """
+    from packaging.version import Version
+
+    latest, _blist = version_check.result()
+    currentv = Version(config.environment.version)
     if latest is not None and currentv < latest:
         print(
             f"""\
@@ -392,7 +486,6 @@ https://dmriprep.readthedocs.io/en/latest/faq.html#upgrading""",
             file=sys.stderr,
         )
 
-    _blist = is_flagged()
     if _blist[0]:
         _reason = _blist[1] or "unknown"
         print(
@@ -404,24 +497,44 @@ discourage its usage.""",
             file=sys.stderr,
         )
 
-    return parser
-
 
 def parse_args(args=None, namespace=None):
     """Parse args and run further checks on the command line."""
     import logging
-    from niworkflows.utils.spaces import Reference, SpatialReferences
 
+    from . import version as _version
+
+    # Query PyPI and GitHub while the parser is being built and arguments parsed
+    version_check = _version.VersionCheck()
     parser = _build_parser()
     opts = parser.parse_args(args, namespace)
+    if opts.work_budget_gb and not opts.clean_intermediates:
+        # Without cleaning, held intermediates never go down and subjects would run serially
+        parser.error("--work-budget requires --clean-intermediates.")
+    _check_version(version_check)
     config.execution.log_level = int(max(25 - 5 * opts.verbose_count, logging.DEBUG))
     config.from_dict(vars(opts))
     config.loggers.init()
 
+    # Templates prefetched with dmriprep-prefetch are used strictly offline
+    from .prefetch import MANIFEST
+
+    if (config.execution.templateflow_home / MANIFEST).exists():
+        os.environ["TEMPLATEFLOW_AUTOUPDATE"] = "0"
+
+    from niworkflows.utils.spaces import Reference, SpatialReferences
+
     # Initialize --output-spaces if not defined
     if config.execution.output_spaces is None:
         config.execution.output_spaces = SpatialReferences([Reference("run")])
 
+    try:
+        config.workflow.skull_strip_template = Reference.from_string(
+            opts.skull_strip_template
+        )[0]
+    except ValueError as err:
+        parser.error(f"Invalid --skull-strip-template: {err}")
+
     # Retrieve logging level
     build_log = config.loggers.cli
 
@@ -475,13 +588,16 @@ license file at several paths, in this order: 1) command line argument ``--fs-li
             build_log.warning(
                 f"Could not clear all contents of working directory: {work_dir}"
             )
+        # The index of the BIDS layout was removed along
+        config.execution._layout = None
+        config.execution.init(reset_database=True)
 
     # Ensure input and output folders are not the same
     if output_dir == bids_dir:
-        ver = version.split("+")[0]
+        suggestion = bids_dir / "derivatives" / f"dmriprep-{version.split('+')[0]}"
         parser.error(
             "The selected output folder is the same as the input BIDS folder. "
-            f'Please modify the output path (suggestion: {bids_dir / 'derivatives' / f'dmriprep-{ver}'}).'
+            f"Please modify the output path (suggestion: {suggestion})."
         )
 
     if bids_dir in work_dir.parents:
@@ -490,6 +606,12 @@ license file at several paths, in this order: 1) command line argument ``--fs-li
             "Please modify the output path."
         )
 
+    if opts.defer_reportlets and opts.clean_intermediates:
+        parser.error(
+            "Deferred reportlets are rendered from intermediate results, which "
+            "--clean-intermediates removes. Please select only one of them."
+        )
+
     # Validate inputs
     if not opts.skip_bids_validation:
         from ..utils.bids import validate_input_dir
@@ -499,7 +621,11 @@ license file at several paths, in this order: 1) command line argument ``--fs-li
             "cases)."
         )
         validate_input_dir(
-            config.environment.exec_env, opts.bids_dir, opts.participant_label
+            config.environment.exec_env,
+            opts.bids_dir,
+            opts.participant_label,
+            cache_dir=work_dir,
+            nprocs=config.nipype.nprocs,
         )
 
     # Setup directories
@@ -524,4 +650,3 @@ license file at several paths, in this order: 1) command line argument ``--fs-li
         )
 
     config.execution.participant_label = sorted(participant_label)
-    config.workflow.skull_strip_template = config.workflow.skull_strip_template[0]
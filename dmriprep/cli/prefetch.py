@@ -0,0 +1,257 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""
+Prefetch the TemplateFlow templates a *dMRIPrep* run will need.
+
+Compute nodes are often not allowed to access the Internet, while templates
+are fetched lazily as the workflow runs.
+``dmriprep-prefetch`` takes the same arguments as ``dmriprep``, derives the set
+of templates the run will access, downloads them into ``$TEMPLATEFLOW_HOME``
+and writes a manifest with their checksums.
+When the manifest is found, ``dmriprep`` disables TemplateFlow's automatic
+updates and runs strictly offline from the local cache.
+
+"""
+import sys
+
+MANIFEST = "dmriprep-prefetch.json"
+"""Name of the manifest of prefetched files, at the top of ``$TEMPLATEFLOW_HOME``."""
+
+NORMALIZATION_RES = 1
+"""Resolution of standard templates used for spatial normalization."""
+
+SYN_PRIOR = ("MNI152NLin2009cAsym", 2)
+"""Template (and resolution) of the prior for fieldmap-less distortion correction."""
+
+
+def template_queries(
+    references, skull_strip_template, run_reconall=True, use_syn=False
+):
+    """
+    List the TemplateFlow queries that cover a *dMRIPrep* run.
+
+    Parameters
+    ----------
+    references : :obj:`list` of :obj:`tuple`
+        ``(template, spec)`` pairs of volumetric, standard output spaces.
+    skull_strip_template : :obj:`tuple`
+        ``(template, spec)`` of the template for brain extraction.
+    run_reconall : :obj:`bool`
+        Whether FreeSurfer's surface reconstruction is run.
+    use_syn : :obj:`bool`
+        Whether fieldmap-less distortion correction may be run.
+
+    Returns
+    -------
+    :obj:`list` of :obj:`tuple`
+        ``(template, query)`` pairs, to be passed on to :py:func:`templateflow.api.get`.
+        Queries filtered by resolution are followed by a query of the files without
+        resolution (``resolution=None``), such as segmentation labels.
+
+    Examples
+    --------
+    >>> template_queries(
+    ...     [("MNI152NLin2009cAsym", {"res": "2"}), ("MNIPediatricAsym", {"cohort": "1"})],
+    ...     ("OASIS30ANTs", {}),
+    ...     use_syn=True,
+    ... )  # doctest: +NORMALIZE_WHITESPACE
+    [('MNI152NLin2009cAsym', {'resolution': [1, 2]}),
+     ('MNI152NLin2009cAsym', {'resolution': None}),
+     ('MNIPediatricAsym', {'cohort': '1', 'resolution': [1]}),
+     ('MNIPediatricAsym', {'cohort': '1', 'resolution': None}),
+     ('OASIS30ANTs', {}),
+     ('fsaverage', {'suffix': 'dseg', 'extension': ['.tsv']})]
+
+    >>> template_queries([], ("MNI152NLin6Asym", {"res": "native"}), run_reconall=False)
+    [('MNI152NLin6Asym', {})]
+
+    """
+    # Keyed by (template, cohort): the set of resolutions, or None to fetch them all
+    resolutions = {}
+
+    def _add(template, spec, res):
+        key = (template, spec.get("cohort"))
+        if res is None or (key in resolutions and resolutions[key] is None):
+            resolutions[key] = None
+            return
+        resolutions.setdefault(key, set()).update(res)
+
+    for template, spec in references:
+        res = {NORMALIZATION_RES}
+        for value in (spec.get("res"), spec.get("resolution")):
+            if value is not None and str(value).isdigit():
+                res.add(int(value))
+        _add(template, spec, res)
+
+    template, spec = skull_strip_template
+    _add(template, spec, None)
+    if use_syn:
+        _add(SYN_PRIOR[0], {}, {NORMALIZATION_RES, SYN_PRIOR[1]})
+
+    queries = []
+    for (template, cohort), res in sorted(resolutions.items(), key=str):
+        query = {"cohort": cohort} if cohort is not None else {}
+        if res is None:
+            queries.append((template, query))
+            continue
+        queries.append((template, {**query, "resolution": sorted(res)}))
+        queries.append((template, {**query, "resolution": None}))
+
+    if run_reconall:
+        queries.append(("fsaverage", {"suffix": "dseg", "extension": [".tsv"]}))
+    return queries
+
+
+def sha256sum(path):
+    """Calculate the SHA-256 checksum of a file."""
+    from functools import partial
+    from hashlib import sha256
+
+    checksum = sha256()
+    with open(path, "rb") as fobj:
+        for chunk in iter(partial(fobj.read, 2 ** 20), b""):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def prefetch(queries, tf_home):
+    """Download the files matching ``queries`` and write their manifest into ``tf_home``."""
+    import json
+    from pathlib import Path
+    from templateflow import api
+
+    tf_home = Path(tf_home)
+    files = set()
+    for template, query in queries:
+        # Not all templates have files without resolution
+        raise_empty = query.get("resolution", []) is not None
+        fetched = api.get(template, raise_empty=raise_empty, **query)
+        files.update(fetched if isinstance(fetched, list) else [fetched])
+
+    manifest = {
+        str(Path(f).relative_to(tf_home)): sha256sum(f) for f in sorted(map(str, files))
+    }
+    (tf_home / MANIFEST).write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def verify(tf_home, queries=None):
+    """
+    Check the files listed in the manifest against their checksums.
+
+    Parameters
+    ----------
+    tf_home : :obj:`os.PathLike`
+        The TemplateFlow home directory, with the manifest.
+    queries : :obj:`list` of :obj:`tuple`
+        If given, files matching these queries (see :py:func:`template_queries`)
+        are also checked to be listed in the manifest.
+
+    Returns
+    -------
+    :obj:`list`
+        Files that are missing, do not match their checksum, or were not prefetched.
+
+    Examples
+    --------
+    >>> tf_home = Path(tmpdir)
+    >>> _ = (tf_home / "tpl-Foo_T1w.nii.gz").write_bytes(b"data")
+    >>> _ = (tf_home / MANIFEST).write_text(
+    ...     '{"tpl-Foo_T1w.nii.gz": "%s", "tpl-Foo_mask.nii.gz": ""}'
+    ...     % sha256sum(tf_home / "tpl-Foo_T1w.nii.gz")
+    ... )
+    >>> verify(tf_home)
+    ['tpl-Foo_mask.nii.gz']
+
+    """
+    import json
+    from pathlib import Path
+
+    tf_home = Path(tf_home)
+    manifest = json.loads((tf_home / MANIFEST).read_text())
+    failed = [
+        relpath
+        for relpath, checksum in manifest.items()
+        if not (tf_home / relpath).is_file()
+        or sha256sum(tf_home / relpath) != checksum
+    ]
+
+    if queries is not None:
+        from templateflow import api
+
+        for template, query in queries:
+            for path in api.ls(template, **query):
+                relpath = str(Path(path).relative_to(tf_home))
+                if relpath not in manifest and relpath not in failed:
+                    failed.append(relpath)
+    return failed
+
+
+def main():
+    """Entry point."""
+    import os
+    from .. import config
+    from .parser import _build_parser
+
+    parser = _build_parser()
+    parser.prog = "dmriprep-prefetch"
+    parser.add_argument(
+        "--verify-only",
+        action="store_true",
+        default=False,
+        help="(dmriprep-prefetch) only check the previously prefetched files",
+    )
+    opts = parser.parse_args()
+
+    tf_home = config.execution.templateflow_home
+    os.environ["TEMPLATEFLOW_HOME"] = str(tf_home)
+    from niworkflows.utils.spaces import Reference, SpatialReferences
+
+    spaces = opts.output_spaces or SpatialReferences([Reference("run")])
+    references = [(ref.space, ref.spec) for ref in spaces.get_standard(dim=(3,))]
+    skull_strip = Reference.from_string(opts.skull_strip_template)[0]
+
+    queries = template_queries(
+        references,
+        (skull_strip.space, skull_strip.spec),
+        run_reconall=opts.run_reconall,
+        use_syn=bool(opts.use_syn or opts.force_syn),
+    )
+
+    if opts.verify_only:
+        if not (tf_home / MANIFEST).exists():
+            parser.error(f"No prefetched templates found at <{tf_home}>.")
+        failed = verify(tf_home, queries)
+        for relpath in failed:
+            print(f"Missing, corrupted or not prefetched: {tf_home / relpath}", file=sys.stderr)
+        sys.exit(int(bool(failed)))
+
+    manifest = prefetch(queries, tf_home)
+    print(f"Prefetched {len(manifest)} files into <{tf_home}>.")
+
+
+if __name__ == "__main__":
+    raise RuntimeError(
+        "dmriprep/cli/prefetch.py should not be run directly;\n"
+        "Please `pip install` dmriprep and use the `dmriprep-prefetch` command"
+    )
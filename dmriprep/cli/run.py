@@ -32,10 +32,14 @@ def main():
     import gc
     from multiprocessing import Process, Manager
     from .parser import parse_args
-    from ..utils.bids import write_derivative_description
 
     parse_args()
 
+    # Heavy imports come after parsing, so that --help and --version stay responsive
+    from ..engine.hooks import SubjectReportHook, chain_callbacks
+    from ..engine.tracing import NodeTracer
+    from ..utils.bids import write_derivative_description
+
     popylar = None
     if not config.execution.notrack:
         import popylar
@@ -52,7 +56,7 @@ def main():
     # is built as a separate process to keep the memory footprint low. The most
     # straightforward way to communicate with the child process is via the filesystem.
     config_file = config.execution.work_dir / ".dmriprep.toml"
-    config.to_filename(config_file)
+    config.to_filename(config_file, snapshot=True)
 
     # CRITICAL Call build_workflow(config_file, retval) in a subprocess.
     # Because Python on Linux does not ever free virtual memory (VM), running the
@@ -66,7 +70,7 @@ def main():
         p.join()
 
         retcode = p.exitcode or retval.get("return_code", 0)
-        dmriprep_wf = retval.get("workflow", None)
+        workflow_file = retval.get("workflow_file", None)
 
     # CRITICAL Load the config from the file. This is necessary because the ``build_workflow``
     # function executed constrained in a process may change the config (and thus the global
@@ -76,6 +80,17 @@ def main():
     if config.execution.reports_only:
         sys.exit(int(retcode > 0))
 
+    dmriprep_wf = None
+    if workflow_file is not None:
+        from time import perf_counter
+        from ..utils.misc import load_pickle
+
+        start = perf_counter()
+        dmriprep_wf = load_pickle(workflow_file)
+        config.loggers.workflow.info(
+            f"Workflow graph loaded from <{workflow_file}> in {perf_counter() - start:.2f}s."
+        )
+
     if dmriprep_wf and config.execution.write_graph:
         dmriprep_wf.write_graph(graph2use="colored", format="svg", simple_form=True)
 
@@ -83,15 +98,34 @@ def main():
     if retcode != 0:
         sys.exit(retcode)
 
-    # Generate boilerplate
-    with Manager() as mgr:
-        from .workflow import build_boilerplate
+    if config.execution.estimate_only:
+        from ..utils.estimate import estimate_workflow, load_model, write_estimates
 
-        p = Process(target=build_boilerplate, args=(str(config_file), dmriprep_wf))
-        p.start()
-        p.join()
+        estimates = estimate_workflow(
+            dmriprep_wf,
+            config.execution.layout,
+            config.execution.participant_label,
+            model=load_model(config.execution.cost_model),
+            run_reconall=config.workflow.run_reconall,
+        )
+        estimates_file = (
+            config.execution.log_dir / f"estimates_{config.execution.run_uuid}.tsv"
+        )
+        summary = write_estimates(estimates, estimates_file)
+        config.loggers.cli.log(
+            25,
+            f"Estimated resources (written to {estimates_file}):\n{summary}",
+        )
+        sys.exit(0)
+
+    # Generate boilerplate in the background, it is only needed once the workflow is done
+    from .workflow import build_boilerplate
+
+    boilerplate = Process(target=build_boilerplate, args=(str(config_file), workflow_file))
+    boilerplate.start()
 
     if config.execution.boilerplate_only:
+        boilerplate.join()
         sys.exit(int(retcode > 0))
 
     # Clean up master process before running workflow, which may create forks
@@ -108,8 +142,36 @@ def main():
     )
     config.loggers.workflow.log(25, "dMRIPrep started!")
     errno = 1  # Default is error exit unless otherwise set
+    if config.nipype.content_hashing:
+        from ..utils.fingerprint import install
+
+        install(config.execution.work_dir / "fingerprints.sqlite")
+
+    tracer = NodeTracer()
+    report_hook = SubjectReportHook(
+        dmriprep_wf,
+        config.execution.output_dir,
+        config.execution.run_uuid,
+        cache_dir=config.execution.work_dir / "reportlets_cache",
+    )
+    callbacks = [tracer, report_hook]
+    if config.nipype.shared_cache_gb:
+        from ..engine.cache import SharedNodeCache
+
+        callbacks.append(
+            SharedNodeCache(
+                config.execution.work_dir / "shared_cache",
+                max_gb=config.nipype.shared_cache_gb,
+            )
+        )
+
     try:
-        dmriprep_wf.run(**config.nipype.get_plugin())
+        dmriprep_wf.run(
+            **config.nipype.get_plugin(
+                status_callback=chain_callbacks(*callbacks),
+                finished_callback=tracer.record_finished,
+            )
+        )
     except Exception as e:
         if not config.execution.notrack:
             popylar.track_event(__ga_id__, "run", "error")
@@ -119,6 +181,7 @@ def main():
         config.loggers.workflow.log(25, "dMRIPrep finished successfully!")
 
         # Bother users with the boilerplate only iff the workflow went okay.
+        boilerplate.join()
         if (config.execution.output_dir / "dmriprep" / "logs" / "CITATION.md").exists():
             config.loggers.workflow.log(
                 25,
@@ -144,16 +207,23 @@ def main():
             )
         errno = 0
     finally:
-        from niworkflows.reports import generate_reports
-        from pkg_resources import resource_filename as pkgrf
+        from ..utils.reports import generate_reports
+
+        boilerplate.join()
+        # Early reports are superseded by those generated below
+        report_hook.close()
+        tracer.write(config.execution.output_dir / "dmriprep", config.execution.run_uuid)
+        tracer.write_reportlets(
+            config.execution.output_dir / "dmriprep", nprocs=config.nipype.nprocs
+        )
 
         # Generate reports phase
         failed_reports = generate_reports(
             config.execution.participant_label,
             config.execution.output_dir,
             config.execution.run_uuid,
-            config=pkgrf("dmriprep", "config/reports-spec.yml"),
-            packagename="dmriprep",
+            nprocs=config.nipype.nprocs,
+            cache_dir=config.execution.work_dir / "reportlets_cache",
         )
         write_derivative_description(
             config.execution.bids_dir, config.execution.output_dir / "dmriprep"
@@ -23,7 +23,7 @@
 """Test parser."""
 from packaging.version import Version
 import pytest
-from ..parser import _build_parser
+from ..parser import _build_parser, _check_version, parse_args
 from .. import version as _version
 from ... import config
 
@@ -107,6 +107,9 @@ def test_get_parser_update(monkeypatch, capsys, current, latest):
     monkeypatch.setattr(_version, "check_latest", _mock_check_latest)
 
     _build_parser()
+    assert not capsys.readouterr().err
+
+    _check_version(_version.VersionCheck())
     captured = capsys.readouterr().err
 
     msg = f"""\
@@ -129,8 +132,43 @@ def test_get_parser_blacklist(monkeypatch, capsys, flagged):
     monkeypatch.setattr(_version, "is_flagged", _mock_is_bl)
 
     _build_parser()
+    assert not capsys.readouterr().err
+
+    _check_version(_version.VersionCheck())
     captured = capsys.readouterr().err
 
     assert ("FLAGGED" in captured) is flagged[0]
     if flagged[0]:
         assert (flagged[1] or "reason: unknown") in captured
+
+
+def test_parser_never_waits(monkeypatch):
+    """Make sure --version does not wait on the version checks."""
+    from threading import Event
+    from time import monotonic
+
+    stalled = Event()
+    monkeypatch.setattr(_version, "check_latest", lambda: stalled.wait(10))
+    monkeypatch.setattr(_version, "is_flagged", lambda: stalled.wait(10))
+
+    start = monotonic()
+    with pytest.raises(SystemExit):
+        parse_args(["--version"])
+    stalled.set()
+    assert monotonic() - start < _version.CHECK_TIMEOUT
+
+
+def test_work_budget_requires_cleaning(tmp_path, capsys):
+    """Check --work-budget is rejected unless intermediates are cleaned up."""
+    datapath = tmp_path / "data"
+    datapath.mkdir()
+    _fs_file = tmp_path / "license.txt"
+    _fs_file.write_text("")
+    args = [str(datapath)] + MIN_ARGS[1:] + [
+        "--fs-license-file", str(_fs_file), "--work-budget", "1G"
+    ]
+
+    with pytest.raises(SystemExit) as error:
+        parse_args(args)
+    assert error.value.code == 2
+    assert "--work-budget requires --clean-intermediates" in capsys.readouterr().err
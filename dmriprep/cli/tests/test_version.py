@@ -25,8 +25,9 @@ from datetime import datetime
 from pathlib import Path
 from packaging.version import Version
 import pytest
+import requests
 from .. import version as _version
-from ..version import check_latest, DATE_FMT, requests, is_flagged
+from ..version import check_latest, DATE_FMT, is_flagged
 
 
 class MockResponse:
@@ -175,8 +176,9 @@ def test_check_latest3(tmpdir, monkeypatch, bad_cache):
         (False, "1.2.1", 200, {}),
     ],
 )
-def test_is_flagged(monkeypatch, result, version, code, json):
+def test_is_flagged(tmpdir, monkeypatch, result, version, code, json):
     """Test that the flagged-versions check is correct."""
+    monkeypatch.setenv("HOME", str(tmpdir))
     monkeypatch.setattr(_version, "__version__", version)
 
     def mock_get(*args, **kwargs):
@@ -195,3 +197,26 @@ def test_is_flagged(monkeypatch, result, version, code, json):
         assert reason == test_reason
     else:
         assert reason is None
+
+
+def test_version_check_timeout(tmpdir, monkeypatch):
+    """A stalled server must not block, the cached versions are used instead."""
+    from threading import Event
+
+    monkeypatch.setenv("HOME", str(tmpdir))
+    monkeypatch.setattr(_version, "__version__", "1.0.0")
+    cachedir = Path(tmpdir) / ".cache" / "dmriprep"
+    cachedir.mkdir(parents=True)
+    (cachedir / "latest").write_text(f"1.1.0|{datetime.now().strftime(DATE_FMT)}")
+    (cachedir / "flagged").write_text('{"1.0.0": "FATAL Bug!"}')
+
+    stalled = Event()
+    monkeypatch.setattr(_version, "check_latest", lambda: stalled.wait(10))
+    monkeypatch.setattr(_version, "is_flagged", lambda: stalled.wait(10))
+    check = _version.VersionCheck(timeout=0.1)
+    assert check.result() == (Version("1.1.0"), (True, "FATAL Bug!"))
+    stalled.set()
+
+    monkeypatch.setattr(_version, "check_latest", lambda: Version("1.2.0"))
+    monkeypatch.setattr(_version, "is_flagged", lambda: (False, None))
+    assert _version.VersionCheck().result() == (Version("1.2.0"), (False, None))
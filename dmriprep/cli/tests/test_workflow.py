@@ -0,0 +1,78 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Test the isolated steps of a dMRIPrep run."""
+import os
+import stat
+from pathlib import Path
+from niworkflows.engine.workflows import LiterateWorkflow as Workflow
+from ... import config
+from ...utils.misc import dump_pickle
+from ..workflow import build_boilerplate
+
+PANDOC = """\
+#!/bin/sh
+for last; do true; done
+echo "$@" >> "{calls}"
+echo rendered > "$last"
+"""
+
+
+def test_build_boilerplate(tmpdir, monkeypatch):
+    """Check the citation boilerplate is only rendered when it changes."""
+    tmpdir.chdir()
+    tmp_path = Path(tmpdir)
+    calls = tmp_path / "pandoc_calls.txt"
+    pandoc = tmp_path / "pandoc"
+    pandoc.write_text(PANDOC.format(calls=calls))
+    pandoc.chmod(pandoc.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.getenv('PATH')}")
+
+    logs_path = tmp_path / "out" / "dmriprep" / "logs"
+    logs_path.mkdir(parents=True)
+    monkeypatch.setattr(config.execution, "output_dir", tmp_path / "out")
+    monkeypatch.setattr(config.execution, "md_only_boilerplate", False)
+    # The boilerplate does not query the BIDS dataset
+    monkeypatch.setattr(config.execution, "_layout", object())
+    monkeypatch.setattr(config.execution, "layout", config.execution.layout)
+    config_file = tmp_path / "config.toml"
+    config.to_filename(config_file)
+
+    workflow = Workflow(name="dmriprep_wf")
+    workflow.__desc__ = "Results included in this manuscript come from dMRIPrep."
+    workflow_file = tmp_path / "workflow.pkl"
+    dump_pickle(workflow, workflow_file)
+
+    build_boilerplate(str(config_file), workflow_file)
+    assert len(calls.read_text().splitlines()) == 2
+    for ext in ("md", "html", "tex", "bib"):
+        assert (logs_path / f"CITATION.{ext}").exists()
+
+    # An unchanged boilerplate is not rendered again
+    build_boilerplate(str(config_file), workflow_file)
+    assert len(calls.read_text().splitlines()) == 2
+
+    workflow.__desc__ += " Changed."
+    dump_pickle(workflow, workflow_file)
+    build_boilerplate(str(config_file), workflow_file)
+    assert len(calls.read_text().splitlines()) == 4
+    assert "Changed." in (logs_path / "CITATION.md").read_text()
@@ -22,13 +22,15 @@
 #
 """Version CLI helpers."""
 
+import json
 from pathlib import Path
 from datetime import datetime
-import requests
 from .. import __version__
 
 RELEASE_EXPIRY_DAYS = 14
 DATE_FMT = "%Y%m%d"
+CHECK_TIMEOUT = 0.5
+"""Seconds the command line waits for the version checks before using the cache."""
 
 
 def check_latest():
@@ -57,6 +59,8 @@ def check_latest():
 
     if latest is None or outdated is True:
         try:
+            import requests
+
             response = requests.get(
                 url="https://pypi.org/pypi/dmriprep/json", timeout=1.0
             )
@@ -87,6 +91,8 @@ def is_flagged():
     # https://raw.githubusercontent.com/nipreps/dmriprep/master/.versions.json
     flagged = tuple()
     try:
+        import requests
+
         response = requests.get(
             url="""\
 https://raw.githubusercontent.com/nipreps/dmriprep/master/.versions.json""",
@@ -95,10 +101,84 @@ https://raw.githubusercontent.com/nipreps/dmriprep/master/.versions.json""",
     except Exception:
         response = None
 
+    cachefile = Path.home() / ".cache" / "dmriprep" / "flagged"
     if response and response.status_code == 200:
         flagged = response.json().get("flagged", {}) or {}
+        try:
+            cachefile.parent.mkdir(parents=True, exist_ok=True)
+            cachefile.write_text(json.dumps(flagged))
+        except Exception:
+            pass
 
     if __version__ in flagged:
         return True, flagged[__version__]
 
     return False, None
+
+
+def cached_latest():
+    """Read the latest version from the on-disk cache, without querying PyPI."""
+    from packaging.version import Version, InvalidVersion
+
+    cachefile = Path.home() / ".cache" / "dmriprep" / "latest"
+    try:
+        return Version(cachefile.read_text().split("|")[0])
+    except (OSError, InvalidVersion):
+        return None
+
+
+def cached_flagged():
+    """Read the flagged versions from the on-disk cache."""
+    cachefile = Path.home() / ".cache" / "dmriprep" / "flagged"
+    try:
+        return json.loads(cachefile.read_text()) or {}
+    except (OSError, ValueError):
+        return {}
+
+
+class VersionCheck:
+    """
+    Run :py:func:`check_latest` and :py:func:`is_flagged` in background threads.
+
+    The checks start as soon as the object is created, so that the network round-trips
+    overlap with building the command line.
+    :py:meth:`result` waits at most ``timeout`` seconds and then falls back to the
+    on-disk cache, so that a slow or unreachable server never blocks *dMRIPrep*.
+
+    """
+
+    def __init__(self, timeout=CHECK_TIMEOUT):
+        from threading import Thread
+
+        self.timeout = timeout
+        self._results = {}
+        self._threads = [
+            Thread(target=self._run, args=(key, check), daemon=True)
+            for key, check in (("latest", check_latest), ("flagged", is_flagged))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _run(self, key, check):
+        try:
+            self._results[key] = check()
+        except Exception:
+            pass
+
+    def result(self):
+        """Return ``(latest, (flagged, reason))``, from the cache if checks timed out."""
+        from time import monotonic
+
+        deadline = monotonic() + self.timeout
+        for thread in self._threads:
+            thread.join(max(deadline - monotonic(), 0))
+
+        latest = self._results.get("latest")
+        if "latest" not in self._results:
+            latest = cached_latest()
+
+        flagged = self._results.get("flagged")
+        if flagged is None:
+            cached = cached_flagged()
+            flagged = (True, cached[__version__]) if __version__ in cached else (False, None)
+        return latest, flagged
@@ -28,6 +28,9 @@ inside this function that has pickleable inputs and output
 dictionary (``retval``) to allow isolation using a
 ``multiprocessing.Process`` that allows dmriprep to enforce
 a hard-limited memory-scope.
+The workflow itself is handed off through a file in the working
+directory (see :py:func:`~dmriprep.utils.misc.dump_pickle`), which
+is serialized only once, and loaded by every process that needs it.
 
 """
 
@@ -35,9 +38,10 @@ a hard-limited memory-scope.
 def build_workflow(config_file, retval):
     """Create the Nipype Workflow that supports the whole execution graph."""
     from niworkflows.utils.bids import collect_participants, check_pipeline_version
-    from niworkflows.reports import generate_reports
+    from time import perf_counter
     from .. import config
-    from ..utils.misc import check_deps
+    from ..utils.misc import check_deps, dump_pickle
+    from ..utils.reports import generate_reports
     from ..workflows.base import init_dmriprep_wf
 
     config.load(config_file)
@@ -47,7 +51,7 @@ def build_workflow(config_file, retval):
     version = config.environment.version
 
     retval["return_code"] = 1
-    retval["workflow"] = None
+    retval["workflow_file"] = None
 
     # warn if older results exist: check for dataset_description.json in output folder
     msg = check_pipeline_version(
@@ -71,8 +75,6 @@ def build_workflow(config_file, retval):
 
     # Called with reports only
     if config.execution.reports_only:
-        from pkg_resources import resource_filename as pkgrf
-
         build_log.log(
             25, f"Running --reports-only on participants {', '.join(subject_list)}",
         )
@@ -80,8 +82,8 @@ def build_workflow(config_file, retval):
             subject_list,
             config.execution.output_dir,
             config.execution.run_uuid,
-            config=pkgrf("dmriprep", "config/reports-spec.yml"),
-            packagename="dmriprep",
+            nprocs=config.nipype.nprocs,
+            cache_dir=config.execution.work_dir / "reportlets_cache",
         )
         return retval
 
@@ -95,40 +97,73 @@ def build_workflow(config_file, retval):
     """
     build_log.log(25, INIT_MSG)
 
-    retval["workflow"] = init_dmriprep_wf()
+    dmriprep_wf = init_dmriprep_wf()
 
-    # Check workflow for missing commands
-    missing = check_deps(retval["workflow"])
+    # Check workflow for missing commands (not needed to estimate resources)
+    missing = [] if config.execution.estimate_only else check_deps(dmriprep_wf)
     if missing:
         deps_list = "\n".join([f"\t* {cmd} (Interface: {iface})" for iface, cmd in missing])
         build_log.critical(f"Cannot run dMRIPrep. Missing dependencies:\n{deps_list}")
         retval["return_code"] = 127  # 127 == command not found.
         return retval
 
-    config.to_filename(config_file)
+    config.to_filename(config_file, snapshot=True)
+    build_log.info(
+        f"dMRIPrep workflow graph with {len(dmriprep_wf._get_all_nodes())} nodes "
+        "built successfully."
+    )
+
+    workflow_file = config.execution.work_dir / ".dmriprep_wf.pkl"
+    start = perf_counter()
+    nbytes, nbuffers = dump_pickle(dmriprep_wf, workflow_file)
     build_log.info(
-        f"dMRIPrep workflow graph with {len(retval['workflow']._get_all_nodes())} nodes built successfully."
+        f"Workflow graph written to <{workflow_file}> ({nbytes / 2 ** 20:.1f} MiB, "
+        f"{nbuffers} out-of-band buffers) in {perf_counter() - start:.2f}s."
     )
+    retval["workflow_file"] = str(workflow_file)
     retval["return_code"] = 0
     return retval
 
 
-def build_boilerplate(config_file, workflow):
+def build_boilerplate(config_file, workflow_file):
     """Write boilerplate in an isolated process."""
+    from hashlib import sha256
+    from pathlib import Path
+    from shutil import copyfile
+    from concurrent.futures import ThreadPoolExecutor
+    from pkg_resources import resource_filename as pkgrf
     from .. import config
+    from ..utils.misc import load_pickle
 
     config.load(config_file)
     logs_path = config.execution.output_dir / "dmriprep" / "logs"
-    boilerplate = workflow.visit_desc()
+    boilerplate = load_pickle(workflow_file).visit_desc()
     citation_files = {
-        ext: logs_path / (f"CITATION.{[ext for ext in ('bib', 'tex', 'md', 'html')]}")
+        ext: logs_path / f"CITATION.{ext}" for ext in ("bib", "tex", "md", "html")
     }
+    bib_file = pkgrf("dmriprep", "data/boilerplate.bib")
+
+    # Skip rendering altogether if the boilerplate did not change since the last run
+    md_only = bool(config.execution.md_only_boilerplate)
+    checksum = sha256(boilerplate.encode())
+    checksum.update(Path(bib_file).read_bytes())
+    checksum.update(f"md_only={md_only}".encode())
+    checksum = checksum.hexdigest()
+    checksum_file = logs_path / ".CITATION.sha256"
+    expected = ("md",) if md_only else ("md", "html", "tex", "bib")
+    if (
+        checksum_file.exists()
+        and checksum_file.read_text() == checksum
+        and all(citation_files[ext].exists() for ext in expected)
+    ):
+        config.loggers.cli.info("Citation boilerplate is up to date.")
+        return
 
     if boilerplate:
         # To please git-annex users and also to guarantee consistency
         # among different renderings of the same file, first remove any
         # existing one
-        for citation_file in citation_files.values():
+        for citation_file in list(citation_files.values()) + [checksum_file]:
             try:
                 citation_file.unlink()
             except FileNotFoundError:
@@ -136,54 +171,58 @@ def build_boilerplate(config_file, workflow):
 
     citation_files["md"].write_text(boilerplate)
 
-    if not config.execution.md_only_boilerplate and citation_files["md"].exists():
-        from subprocess import check_call, CalledProcessError, TimeoutExpired
-        from pkg_resources import resource_filename as pkgrf
-        from shutil import copyfile
-
-        # Generate HTML file resolving citations
-        cmd = [
-            "pandoc",
-            "-s",
-            "--bibliography",
-            pkgrf("dmriprep", "data/boilerplate.bib"),
-            "--citeproc",
-            "--metadata",
-            'pagetitle="dMRIPrep citation boilerplate"',
-            str(citation_files["md"]),
-            "-o",
-            str(citation_files["html"]),
-        ]
-
+    if not md_only and citation_files["md"].exists():
+        commands = {
+            # Generate HTML file resolving citations
+            "html": [
+                "pandoc",
+                "-s",
+                "--bibliography",
+                bib_file,
+                "--citeproc",
+                "--metadata",
+                'pagetitle="dMRIPrep citation boilerplate"',
+                str(citation_files["md"]),
+                "-o",
+                str(citation_files["html"]),
+            ],
+            # Generate LaTex file resolving citations
+            "tex": [
+                "pandoc",
+                "-s",
+                "--bibliography",
+                bib_file,
+                "--natbib",
+                str(citation_files["md"]),
+                "-o",
+                str(citation_files["tex"]),
+            ],
+        }
         config.loggers.cli.info(
-            "Generating an HTML version of the citation boilerplate..."
+            "Generating HTML and LaTeX versions of the citation boilerplate..."
         )
-        try:
-            check_call(cmd, timeout=10)
-        except (FileNotFoundError, CalledProcessError, TimeoutExpired):
-            config.loggers.cli.warning(
-                f"Could not generate CITATION.html file:\n{' '.join(cmd)}"
-            )
-
-        # Generate LaTex file resolving citations
-        cmd = [
-            "pandoc",
-            "-s",
-            "--bibliography",
-            pkgrf("dmriprep", "data/boilerplate.bib"),
-            "--natbib",
-            str(citation_files["md"]),
-            "-o",
-            str(citation_files["tex"]),
-        ]
-        config.loggers.cli.info(
-            "Generating a LaTeX version of the citation boilerplate..."
+        with ThreadPoolExecutor(max_workers=len(commands)) as pool:
+            rendered = dict(zip(commands, pool.map(_pandoc, commands.values())))
+
+        if rendered["tex"]:
+            copyfile(bib_file, citation_files["bib"])
+        if not all(rendered.values()):
+            return
+
+    checksum_file.write_text(checksum)
+
+
+def _pandoc(cmd):
+    """Run pandoc, returning whether it succeeded."""
+    from pathlib import Path
+    from subprocess import check_call, CalledProcessError, TimeoutExpired
+    from .. import config
+
+    try:
+        check_call(cmd, timeout=10)
+    except (FileNotFoundError, CalledProcessError, TimeoutExpired):
+        config.loggers.cli.warning(
+            f"Could not generate {Path(cmd[-1]).name} file:\n{' '.join(cmd)}"
         )
-        try:
-            check_call(cmd, timeout=10)
-        except (FileNotFoundError, CalledProcessError, TimeoutExpired):
-            config.loggers.cli.warning(
-                f"Could not generate CITATION.tex file:\n{' '.join(cmd)}"
-            )
-        else:
-            copyfile(pkgrf("dmriprep", "data/boilerplate.bib"), citation_files["bib"])
+        return False
+    return True
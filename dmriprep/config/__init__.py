@@ -18,6 +18,8 @@ the settings to hard disk in *ToML* format, which looks like:
 
 This config file is used to pass the settings across processes,
 using the :py:func:`~dmriprep.config.load` function.
+A pickled snapshot may be written next to it, so that processes restore the
+settings without parsing them again (see :py:func:`~dmriprep.config.to_filename`).
 
 Configuration sections
 ----------------------
@@ -96,9 +98,6 @@ finally:
     from uuid import uuid4
     from pathlib import Path
     from time import strftime
-    from niworkflows.utils.spaces import SpatialReferences as _SRs, Reference as _Ref
-    from nipype import logging as nlogging, __version__ as _nipype_ver
-    from templateflow import __version__ as _tf_ver
     from .. import __version__
 
 
@@ -113,11 +112,30 @@ warnings.showwarning = redirect_warnings
 logging.addLevelName(25, "IMPORTANT")  # Add a new level between INFO and WARNING
 logging.addLevelName(15, "VERBOSE")  # Add a new level between INFO and DEBUG
 
+
+def _pkg_version(name):
+    """Read the version of an installed distribution without importing it."""
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError:  # Python 3.7
+        from importlib import import_module
+
+        return import_module(name).__version__
+
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
+
+
 DEFAULT_MEMORY_MIN_GB = 0.01
 NONSTANDARD_REFERENCES = ["anat", "T1w", "dwi", "fsnative"]
 
 _exec_env = os.name
 _docker_ver = None
+# Importing nipype and templateflow takes seconds, only their versions are needed here
+_nipype_ver = _pkg_version("nipype")
+_tf_ver = _pkg_version("templateflow")
 # special variable set in the container
 if os.getenv("IS_DOCKER_8395080871"):
     _exec_env = "singularity"
@@ -166,6 +184,10 @@ except Exception:
     pass
 
 
+_SNAPSHOT_FORMAT = 1
+"""Version of the layout of config snapshots (see :py:func:`to_filename`)."""
+
+
 class _Config:
     """An abstract class forbidding instantiation."""
 
@@ -204,9 +226,11 @@ class _Config:
                 continue
             if k in cls._paths:
                 v = str(v)
-            if isinstance(v, _SRs):
+            # Spatial references can only be set once NiWorkflows has been imported
+            _spaces = sys.modules.get("niworkflows.utils.spaces")
+            if _spaces is not None and isinstance(v, _spaces.SpatialReferences):
                 v = " ".join([str(s) for s in v.references]) or None
-            if isinstance(v, _Ref):
+            if _spaces is not None and isinstance(v, _spaces.Reference):
                 v = str(v) or None
             out[k] = v
         return out
@@ -249,6 +273,11 @@ class environment(_Config):
 class nipype(_Config):
     """Nipype settings."""
 
+    clean_intermediates = False
+    """Remove large intermediate results as soon as no node depends on them."""
+    content_hashing = False
+    """Check whether nodes are up to date by the contents of their input files (instead of
+    their timestamps), caching the digests of files that did not change."""
     crashfile_format = "txt"
     """The file format for crashfiles, either text or pickle."""
     get_linked_libs = False
@@ -271,20 +300,50 @@ class nipype(_Config):
     """Settings for NiPype's execution plugin."""
     resource_monitor = False
     """Enable resource monitor."""
+    shared_cache_gb = None
+    """Size in GB of the cache where results of nodes run again with identical inputs
+    (e.g., resampled templates) are shared (disabled if ``None``)."""
     stop_on_first_crash = True
     """Whether the workflow should stop or continue after the first error."""
+    work_budget_gb = None
+    """Size in GB of the intermediates that may be held in the working directory
+    before new subjects are held back (only with ``clean_intermediates``)."""
 
     @classmethod
-    def get_plugin(cls):
-        """Format a dictionary for Nipype consumption."""
+    def get_plugin(cls, status_callback=None, finished_callback=None):
+        """
+        Format a dictionary for Nipype consumption.
+
+        ``finished_callback`` receives the sizes of working directories and the
+        runtimes of nodes, if they are tracked by the plugin
+        (see :py:class:`~dmriprep.engine.plugin.DiskBudgetPlugin`).
+
+        """
+        callback = {"status_callback": status_callback} if status_callback else {}
         nprocs = int(cls.nprocs)
+        manage_disk = cls.clean_intermediates or cls.work_budget_gb
+        if cls.plugin == "MultiProc" and manage_disk:
+            from ..engine.plugin import DiskBudgetPlugin
+
+            plugin_args = {
+                **cls.plugin_args,
+                **callback,
+                "n_procs": nprocs,
+                "clean_intermediates": cls.clean_intermediates,
+                "work_budget_gb": cls.work_budget_gb,
+                "finished_callback": finished_callback,
+            }
+            if cls.memory_gb:
+                plugin_args["memory_gb"] = float(cls.memory_gb)
+            return {"plugin": DiskBudgetPlugin(plugin_args=plugin_args)}
+
         if nprocs == 1:
             cls.plugin = "Linear"
-            return {"plugin": "Linear"}
+            return {"plugin": "Linear", "plugin_args": callback}
 
         out = {
             "plugin": cls.plugin,
-            "plugin_args": cls.plugin_args,
+            "plugin_args": {**cls.plugin_args, **callback},
         }
         if cls.plugin in ("MultiProc", "LegacyMultiProc"):
             out["plugin_args"]["n_procs"] = int(cls.nprocs)
@@ -322,6 +381,8 @@ class nipype(_Config):
                 }
             }
         )
+        if cls.content_hashing:
+            ncfg.update_config({"execution": {"hash_method": "content"}})
 
 
 class execution(_Config):
@@ -337,8 +398,15 @@ class execution(_Config):
     """A dictionary of BIDS selection filters."""
     boilerplate_only = False
     """Only generate a boilerplate."""
+    cost_model = None
+    """A cost model (JSON) calibrated on past runs, to estimate the resources of a run
+    (see :py:mod:`dmriprep.utils.estimate`)."""
     debug = False
     """Run in sloppy mode (meaning, suboptimal parameters that minimize run-time)."""
+    defer_reportlets = False
+    """Record the inputs of visual reportlets and render them when reports are generated."""
+    estimate_only = False
+    """Only estimate the resources the run will require."""
     fs_license_file = _fs_license
     """An existing file containing a FreeSurfer license."""
     fs_subjects_dir = None
@@ -357,6 +425,12 @@ class execution(_Config):
     """Do not monitor *dMRIPrep* using Google Analytics."""
     output_dir = None
     """Folder where derivatives will be stored."""
+    output_link_mode = "copy"
+    """How derivatives are materialized from the working directory (``copy``,
+    ``hardlink``, ``reflink`` or ``auto``)."""
+    output_precision = "native"
+    """Storage type of floating-point derivatives (``native``, ``float32`` or
+    ``int16`` with scaling)."""
     output_spaces = None
     """List of (non)standard spaces designated (with the ``--output-spaces`` flag of
     the command line) as spatial references for outputs."""
@@ -378,6 +452,7 @@ class execution(_Config):
     _paths = (
         "anat_derivatives",
         "bids_dir",
+        "cost_model",
         "fs_license_file",
         "fs_subjects_dir",
         "layout",
@@ -388,8 +463,15 @@ class execution(_Config):
     )
 
     @classmethod
-    def init(cls):
-        """Create a new BIDS Layout accessible with :attr:`~execution.layout`."""
+    def init(cls, reset_database=False):
+        """
+        Create a new BIDS Layout accessible with :attr:`~execution.layout`.
+
+        The layout is indexed into ``<work_dir>/bids.db``, so that other processes
+        load the index instead of crawling the dataset again (unless
+        ``reset_database`` is set, see :py:func:`from_dict`).
+
+        """
         if cls._layout is None:
             import re
             from bids.layout import BIDSLayout
@@ -399,7 +481,8 @@ class execution(_Config):
             cls._layout = BIDSLayout(
                 str(cls.bids_dir),
                 validate=False,
-                # database_path=str(work_dir),
+                database_path=str(work_dir),
+                reset_database=reset_database,
                 ignore=(
                     "code",
                     "stimuli",
@@ -467,11 +550,11 @@ class loggers:
     """The root logger."""
     cli = logging.getLogger("cli")
     """Command-line interface logging."""
-    workflow = nlogging.getLogger("nipype.workflow")
+    workflow = logging.getLogger("nipype.workflow")
     """NiPype's workflow logger."""
-    interface = nlogging.getLogger("nipype.interface")
+    interface = logging.getLogger("nipype.interface")
     """NiPype's interface logger."""
-    utils = nlogging.getLogger("nipype.utils")
+    utils = logging.getLogger("nipype.utils")
     """NiPype's utils logger."""
 
     @classmethod
@@ -502,21 +585,24 @@ class loggers:
 def from_dict(settings):
     """Read settings from a flat dictionary."""
     nipype.load(settings)
-    execution.load(settings)
+    # A new run indexes the dataset afresh, in case it changed since a previous run
+    execution.load(settings, init=False)
+    execution.init(reset_database=True)
     workflow.load(settings)
     loggers.init()
 
 
 def load(filename):
-    """Load settings from file."""
-    from toml import loads
-
+    """Load settings from file, through its snapshot if up-to-date (see :py:func:`to_filename`)."""
     filename = Path(filename)
-    settings = loads(filename.read_text())
-    for sectionname, configs in settings.items():
-        if sectionname != "environment":
-            section = getattr(sys.modules[__name__], sectionname)
-            section.load(configs)
+    if not _load_snapshot(filename):
+        from toml import loads
+
+        settings = loads(filename.read_text())
+        for sectionname, configs in settings.items():
+            if sectionname != "environment":
+                section = getattr(sys.modules[__name__], sectionname)
+                section.load(configs)
     init_spaces()
 
 
@@ -545,10 +631,84 @@ def dumps(flat=False):
     return dumps(get(flat=flat))
 
 
-def to_filename(filename):
-    """Write settings to file."""
+def to_filename(filename, snapshot=False):
+    """
+    Write settings to file.
+
+    With ``snapshot``, all sections are also pickled next to the ToML file
+    (with ``.pkl`` extension), which :py:func:`load` maps back in without parsing
+    the ToML file as long as it is unchanged.
+    The BIDS layout is not pickled, but reopened from its index in the working
+    directory (see :py:meth:`execution.init`), and the spatial references are
+    initialized again (see :py:func:`init_spaces`).
+
+    """
     filename = Path(filename)
     filename.write_text(dumps())
+    if snapshot:
+        from ..utils.misc import dump_pickle
+
+        sections = {
+            name: {
+                k: v
+                for k, v in section.__dict__.items()
+                if not k.startswith("_")
+                and k not in ("layout", "spaces")
+                and not isinstance(v, (classmethod, staticmethod))
+            }
+            for name, section in (
+                ("execution", execution),
+                ("workflow", workflow),
+                ("nipype", nipype),
+            )
+        }
+        dump_pickle(
+            {
+                "format": _SNAPSHOT_FORMAT,
+                "version": __version__,
+                "checksum": _checksum(filename),
+                "sections": sections,
+            },
+            filename.with_suffix(".pkl"),
+        )
+
+
+def _checksum(filename):
+    from hashlib import sha256
+
+    return sha256(Path(filename).read_bytes()).hexdigest()
+
+
+def _load_snapshot(filename):
+    """Restore settings from the snapshot of a ToML file, if it is up-to-date."""
+    from ..utils.misc import load_pickle
+
+    snapshot_file = filename.with_suffix(".pkl")
+    if not snapshot_file.exists():
+        return False
+
+    try:
+        snapshot = load_pickle(snapshot_file)
+    except Exception:  # Truncated, or written by another version
+        return False
+
+    if (
+        not isinstance(snapshot, dict)
+        or snapshot.get("format") != _SNAPSHOT_FORMAT
+        or snapshot.get("version") != __version__
+        or snapshot.get("checksum") != _checksum(filename)
+    ):
+        return False
+
+    for sectionname, configs in snapshot["sections"].items():
+        section = getattr(sys.modules[__name__], sectionname)
+        for k, v in configs.items():
+            setattr(section, k, v)
+        try:
+            section.init()
+        except AttributeError:
+            pass
+    return True
 
 
 def init_spaces(checkpoint=True):
@@ -0,0 +1,90 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Test the config module."""
+from pathlib import Path
+import toml
+from ... import config
+
+
+def test_snapshot(tmpdir, monkeypatch):
+    """Check settings are restored from the snapshot while the ToML file is unchanged."""
+    tmpdir.chdir()
+    tmp_path = Path(tmpdir)
+    # The layout is reopened from its index, not stored in the snapshot
+    monkeypatch.setattr(config.execution, "_layout", object())
+    monkeypatch.setattr(config.execution, "layout", config.execution.layout)
+    monkeypatch.setattr(config.execution, "output_spaces", "MNI152NLin2009cAsym:res-2")
+    monkeypatch.setattr(config.workflow, "skull_strip_template", "MNI152NLin2009cAsym")
+    monkeypatch.setattr(config.workflow, "spaces", None)
+    monkeypatch.setattr(config.nipype, "plugin_args", {"maxtasksperchild": 1})
+    config.init_spaces()
+
+    config_file = tmp_path / "config.toml"
+    config.to_filename(config_file, snapshot=True)
+    assert config_file.with_suffix(".pkl").exists()
+
+    config.workflow.skull_strip_template = "OASIS30ANTs"
+    config.workflow.spaces = None
+    config.nipype.plugin_args = {}
+
+    def _noparse(*args, **kwargs):
+        raise AssertionError("The ToML file should not be parsed")
+
+    with monkeypatch.context() as m:
+        m.setattr(toml, "loads", _noparse)
+        config.load(config_file)
+
+    assert config.workflow.skull_strip_template == "MNI152NLin2009cAsym"
+    assert config.nipype.plugin_args == {"maxtasksperchild": 1}
+    assert config.workflow.spaces.get_spaces() == ["MNI152NLin2009cAsym"]
+    assert config.execution.layout is config.execution._layout
+
+    # An edited ToML file takes precedence over its (now stale) snapshot
+    config_file.write_text(
+        config_file.read_text().replace(
+            'skull_strip_template = "MNI152NLin2009cAsym"',
+            'skull_strip_template = "OASIS30ANTs"',
+        )
+    )
+    config.load(config_file)
+    assert config.workflow.skull_strip_template == "OASIS30ANTs"
+
+
+def test_snapshot_spaces(tmpdir, monkeypatch):
+    """Check spatial references are initialized when restored from a snapshot."""
+    from niworkflows.utils.spaces import SpatialReferences
+
+    tmpdir.chdir()
+    tmp_path = Path(tmpdir)
+    monkeypatch.setattr(config.execution, "_layout", object())
+    monkeypatch.setattr(config.execution, "layout", config.execution.layout)
+    monkeypatch.setattr(config.execution, "output_spaces", "MNI152NLin2009cAsym:res-2 run")
+    # As in a run, the parent process writes out the snapshot before any spaces are set
+    monkeypatch.setattr(config.workflow, "spaces", None)
+
+    config_file = tmp_path / "config.toml"
+    config.to_filename(config_file, snapshot=True)
+    config.load(config_file)
+
+    assert isinstance(config.workflow.spaces, SpatialReferences)
+    assert config.workflow.spaces.get_spaces() == ["MNI152NLin2009cAsym", "run"]
@@ -0,0 +1,243 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""
+A result cache shared by the nodes of all subjects and runs.
+
+Some nodes compute exactly the same thing for every subject (e.g., resampling
+or filtering a template), and some expensive nodes are run again with identical
+inputs (e.g., the registrations and the prior of fieldmap-less distortion
+estimation, once ``--clean-intermediates`` removed them and ``--content-hashing``
+finds their recomputed inputs unchanged).
+A :py:class:`SharedNodeCache` is handed to nipype's plugins as a ``status_callback``:
+when an opted-in node finishes, its working directory is stored in the cache,
+under the hash nipype calculated for its inputs.
+When another node with identical inputs is about to start, the cached working
+directory is restored into the node's, so that nipype finds it up to date and
+collects the results without running the node again.
+Entries are evicted in least-recently-used order to keep the cache under a size cap.
+
+Only nodes submitted to the plugin's workers can be restored, as nodes run without
+submitting do not signal their start.
+
+"""
+import os
+import re
+import shutil
+from pathlib import Path
+from nipype import logging
+from .plugin import dir_size
+
+LOGGER = logging.getLogger("nipype.workflow")
+
+SHARED_NODES = re.compile(
+    r"(^|\.)(res_tmpl|lap_tmpl|syn_preprocessing_[^.]+\.(prior2epi|epi2anat|ref_anat))$"
+)
+"""Nodes opted into the cache (by full name): template resampling and filtering of
+brain extraction, and the SyN prior, anatomical reference and registration of
+fieldmap-less distortion estimation."""
+
+
+def is_shared(node):
+    """
+    Check whether a node is opted into the shared cache.
+
+    Examples
+    --------
+    >>> from nipype.pipeline.engine import Node
+    >>> from nipype.interfaces.utility import IdentityInterface
+    >>> def _node(name, hierarchy):
+    ...     node = Node(IdentityInterface(fields=["a"]), name=name)
+    ...     node._hierarchy = hierarchy
+    ...     return node
+    >>> [
+    ...     is_shared(_node(name, "wf.brain_extraction_wf"))
+    ...     for name in ("lap_tmpl", "res_tmpl", "lap_target")
+    ... ]
+    [True, True, False]
+    >>> [
+    ...     is_shared(_node(name, "wf.syn_preprocessing_auto_00000"))
+    ...     for name in ("prior2epi", "epi2anat", "transform_list")
+    ... ]
+    [True, True, False]
+    >>> is_shared(_node("prior2epi", "wf.other_wf"))
+    False
+
+    """
+    return bool(SHARED_NODES.search(node.fullname))
+
+
+class SharedNodeCache:
+    """Content-addressed cache of the working directories of opted-in nodes."""
+
+    def __init__(self, cache_dir, max_gb=None, opt_in=is_shared):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = int(float(max_gb) * 1e9) if max_gb else None
+        self.opt_in = opt_in
+        self.hits = 0
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def __call__(self, node, status):
+        if not self.opt_in(node):
+            return
+
+        try:
+            if status == "start":
+                self.restore(node)
+            elif status == "end":
+                self.store(node)
+        except Exception as exc:  # The cache must never break a run
+            LOGGER.warning(f"Shared node cache failed for {node.fullname}: {exc}")
+
+    def _entry(self, node):
+        """Locate the cache entry of a node, named after its class and inputs' hash."""
+        _, hashvalue = node._get_hashval()
+        interface = node.interface.__class__
+        return (
+            self.cache_dir / f"{interface.__module__}.{interface.__name__}-{hashvalue}",
+            hashvalue,
+        )
+
+    def restore(self, node):
+        """Populate the node's working directory from the cache, if an entry exists."""
+        from nipype.pipeline.engine.utils import load_resultfile
+        from nipype.utils.filemanip import savepkl
+
+        entry, hashvalue = self._entry(node)
+        outdir = Path(node.output_dir())
+        if not entry.is_dir() or (outdir / f"_0x{hashvalue}.json").exists():
+            return False
+
+        # Paths into the original node's directory are redirected to this node's
+        result = load_resultfile(entry / "result.pklz", resolve=False)
+        srcdir = (entry / "source").read_text()
+        outputs = {
+            name: _rebase(value, srcdir, str(outdir))
+            for name, value in result.outputs.get().items()
+        }
+        if not all(os.path.exists(p) for p in _abspaths(outputs, exclude=str(outdir))):
+            # Some output outside the working directory is gone (e.g., a purged template)
+            shutil.rmtree(entry, ignore_errors=True)
+            return False
+
+        for name, value in outputs.items():
+            setattr(result.outputs, name, value)
+
+        shutil.rmtree(outdir, ignore_errors=True)
+        _link_tree(entry / "files", outdir)
+        savepkl(str(outdir / f"result_{node.name}.pklz"), result)
+        os.utime(entry)
+        self.hits += 1
+        LOGGER.info(f"[Shared cache] Restored {node.fullname} from <{entry.name}>.")
+        return True
+
+    def store(self, node):
+        """Store the working directory of a finished node, if not cached yet."""
+        entry, hashvalue = self._entry(node)
+        if entry.is_dir():
+            os.utime(entry)
+            return False
+
+        outdir = Path(node.output_dir())
+        result_file = outdir / f"result_{node.name}.pklz"
+        if not (outdir / f"_0x{hashvalue}.json").exists() or not result_file.exists():
+            return False
+
+        staging = entry.with_name(f".{entry.name}.{os.getpid()}")
+        shutil.rmtree(staging, ignore_errors=True)
+        _link_tree(outdir, staging / "files", exclude=result_file.name)
+        shutil.copyfile(result_file, staging / "result.pklz")
+        (staging / "source").write_text(str(outdir))
+        os.replace(staging, entry)
+        LOGGER.debug(f"[Shared cache] Stored {node.fullname} into <{entry.name}>.")
+        self.evict()
+        return True
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits its cap."""
+        if self.max_bytes is None:
+            return
+
+        entries = [
+            (entry.stat().st_mtime, dir_size(entry), entry)
+            for entry in self.cache_dir.iterdir()
+            if entry.is_dir() and not entry.name.startswith(".")
+        ]
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            LOGGER.debug(f"[Shared cache] Evicted <{entry.name}>.")
+
+
+def _link_tree(src, dst, exclude=None):
+    """Replicate a directory tree, hard-linking (or copying) its files."""
+    from ..utils.misc import link_file
+
+    src, dst = Path(src), Path(dst)
+    for root, _, files in os.walk(src):
+        target = dst / Path(root).relative_to(src)
+        target.mkdir(parents=True, exist_ok=True)
+        for fname in files:
+            if fname == exclude and Path(root) == src:
+                continue
+            if link_file(Path(root) / fname, target / fname) is None:
+                shutil.copy2(Path(root) / fname, target / fname)
+
+
+def _rebase(value, srcdir, dstdir):
+    """
+    Redirect the paths under ``srcdir`` found in an output value to ``dstdir``.
+
+    Examples
+    --------
+    >>> _rebase(["/work/a/out.nii", ("/work/a/sub/x.txt", 3)], "/work/a", "/work/b")
+    ['/work/b/out.nii', ('/work/b/sub/x.txt', 3)]
+    >>> _rebase({"f": "/work/ab/out.nii"}, "/work/a", "/work/b")
+    {'f': '/work/ab/out.nii'}
+
+    """
+    if isinstance(value, (list, tuple)):
+        return type(value)(_rebase(item, srcdir, dstdir) for item in value)
+    if isinstance(value, dict):
+        return {key: _rebase(item, srcdir, dstdir) for key, item in value.items()}
+    if isinstance(value, str) and (value + os.sep).startswith(srcdir + os.sep):
+        return dstdir + value[len(srcdir):]
+    return value
+
+
+def _abspaths(value, exclude):
+    """Iterate over the absolute paths in an output value that are not under ``exclude``."""
+    if isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _abspaths(item, exclude)
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _abspaths(item, exclude)
+    elif (
+        isinstance(value, str)
+        and os.path.isabs(value)
+        and not (value + os.sep).startswith(exclude + os.sep)
+    ):
+        yield value
@@ -0,0 +1,166 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Hooks into the execution of workflows."""
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from nipype import logging
+from .plugin import node_subject
+
+LOGGER = logging.getLogger("nipype.workflow")
+
+_REPORTLET_SINK_RE = re.compile(r"^ds_(report_.+|.+_report)$")
+
+
+def chain_callbacks(*callbacks):
+    """Combine several ``status_callback`` functions into one."""
+
+    def _callback(node, status):
+        for callback in callbacks:
+            callback(node, status)
+
+    return _callback
+
+
+def is_reportlet_sink(node):
+    """
+    Check whether a node writes out a reportlet (by its name).
+
+    Examples
+    --------
+    >>> from nipype.pipeline.engine import Node
+    >>> from nipype.interfaces.utility import IdentityInterface
+    >>> [
+    ...     is_reportlet_sink(Node(IdentityInterface(fields=["a"]), name=name))
+    ...     for name in ("ds_report_eddy", "ds_t1w_dseg_mask_report", "ds_dwi", "report")
+    ... ]
+    [True, True, False, False]
+
+    """
+    return bool(_REPORTLET_SINK_RE.match(node.name))
+
+
+class SubjectReportHook:
+    """
+    Generate a subject's report as soon as all its reportlets have been written.
+
+    Reports are rendered in the background, by a single worker process with
+    lowered priority so that it does not compete with the computing nodes.
+    The final reporting phase renders all reports again (including reportlets,
+    such as the performance summary, that are only available after the run).
+
+    """
+
+    def __init__(
+        self,
+        workflow,
+        output_dir,
+        run_uuid,
+        config=None,
+        packagename="dmriprep",
+        cache_dir=None,
+    ):
+        if config is None:
+            from pkg_resources import resource_filename as pkgrf
+
+            config = pkgrf("dmriprep", "config/reports-spec.yml")
+
+        self._job_args = (output_dir, run_uuid, config, packagename, cache_dir)
+        self._prefix = f"{workflow.name}."
+        self._pending = {}
+        for name, node in _iter_nodes(workflow):
+            subject = node_subject(name)
+            if subject is not None and is_reportlet_sink(node):
+                self._pending.setdefault(subject, set()).add(name)
+
+        self._executor = None
+        self.futures = {}
+
+    def __call__(self, node, status):
+        if status != "end":
+            return
+
+        subject = node_subject(node)
+        pending = self._pending.get(subject)
+        if not pending or self._key(node) not in pending:
+            return
+
+        pending.discard(self._key(node))
+        if not pending:
+            self._submit(subject)
+
+    def _key(self, node):
+        # Nodes of the execution graph are named after the top-level workflow too
+        fullname = node.fullname
+        if fullname.startswith(self._prefix):
+            fullname = fullname[len(self._prefix):]
+        return fullname
+
+    def _submit(self, subject):
+        from ..utils.reports import _run_reports
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=1, initializer=_lower_priority
+            )
+
+        output_dir, run_uuid, config, packagename, cache_dir = self._job_args
+        LOGGER.info(f"All reportlets of sub-{subject} written, generating its report.")
+        self.futures[subject] = self._executor.submit(
+            _run_reports,
+            (output_dir, subject, run_uuid, config, None, packagename, cache_dir),
+        )
+
+    def close(self, wait=True):
+        """Shut down the background worker, cancelling reports not yet started."""
+        if self._executor is None:
+            return
+
+        for future in self.futures.values():
+            future.cancel()
+        self._executor.shutdown(wait=wait)
+        self._executor = None
+
+
+def _iter_nodes(workflow, prefix=""):
+    """
+    Iterate over the nodes of a workflow that has not been flattened yet.
+
+    Until the workflow is run, nodes only know the name of their immediate parent
+    workflow, so dotted names (relative to ``workflow``) are built here instead.
+
+    """
+    from nipype.pipeline.engine import Workflow
+
+    for node in workflow._graph.nodes():
+        if isinstance(node, Workflow):
+            yield from _iter_nodes(node, f"{prefix}{node.name}.")
+        else:
+            yield f"{prefix}{node.name}", node
+
+
+def _lower_priority():
+    try:
+        os.nice(10)
+    except (AttributeError, OSError):  # Not available on all platforms
+        pass
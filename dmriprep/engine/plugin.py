@@ -0,0 +1,235 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""
+A MultiProc plugin that keeps the working directory within a disk budget.
+
+Nodes are tracked as they finish: once every node consuming the outputs
+of a node has finished, its working directory is not necessary anymore and,
+if larger than a threshold, it is removed (``clean_intermediates``).
+Nodes that failed (and therefore, their inputs) are never cleaned up, so that
+crashes can be investigated and rerun.
+
+With a ``work_budget_gb``, the plugin stops admitting new subjects while the
+intermediates being held in the working directory exceed the budget
+(subjects already started are always allowed to continue).
+
+"""
+import os
+import re
+from copy import deepcopy
+from nipype import logging
+from nipype.pipeline.plugins.multiproc import MultiProcPlugin
+
+LOGGER = logging.getLogger("nipype.workflow")
+
+MIN_CLEAN_SIZE = 2 ** 20
+"""Node directories smaller than this (in bytes) are not worth removing."""
+
+_SUBJECT_RE = re.compile(r"single_subject_(?P<subject>[^.]+)_wf")
+
+
+def dir_size(path):
+    """
+    Calculate the size (in bytes) of all the files under ``path``.
+
+    Symbolic links are not followed, and hardlinks are counted as many
+    times as they are found.
+
+    Examples
+    --------
+    >>> os.chdir(tmpdir)
+    >>> Path("node").mkdir()
+    >>> _ = Path("node/result.pklz").write_bytes(b"x" * 100)
+    >>> Path("node/sub").mkdir()
+    >>> _ = Path("node/sub/data.nii").write_bytes(b"x" * 20)
+    >>> dir_size("node")
+    120
+    >>> dir_size("missing")
+    0
+
+    """
+    total = 0
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        return 0
+
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                total += dir_size(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                total += entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            continue
+    return total
+
+
+def node_subject(node):
+    """
+    Extract the participant label a node belongs to, from its full name.
+
+    A dotted name (e.g., ``single_subject_01_wf.ds_report_mask``) is also accepted.
+
+    Examples
+    --------
+    >>> from nipype.pipeline.engine import Node
+    >>> from nipype.interfaces.utility import IdentityInterface
+    >>> node = Node(IdentityInterface(fields=["a"]), name="inputnode")
+    >>> node._hierarchy = "dmriprep_wf.single_subject_01_wf.dwi_preproc_wf"
+    >>> node_subject(node)
+    '01'
+    >>> node._hierarchy = "dmriprep_wf"
+    >>> node_subject(node) is None
+    True
+    >>> node_subject("single_subject_02_wf.reportlets_wf.ds_report_mask")
+    '02'
+
+    """
+    match = _SUBJECT_RE.search(getattr(node, "fullname", node))
+    return match.group("subject") if match else None
+
+
+class DiskBudgetPlugin(MultiProcPlugin):
+    """
+    Execute a workflow with MultiProc, removing intermediates as soon as possible.
+
+    In addition to those of :obj:`~nipype.pipeline.plugins.multiproc.MultiProcPlugin`,
+    the following ``plugin_args`` are accepted:
+
+    - ``clean_intermediates``: remove working directories of nodes whose
+      outputs have been consumed by all their dependent nodes (enabling
+      nipype's ``remove_node_directories`` execution option for this run).
+    - ``min_clean_size``: directories below this size (bytes) are kept.
+    - ``work_budget_gb``: stop starting new subjects while the working
+      directories of finished nodes add up to more than this budget.
+      Only intermediates being removed bring the usage down, so without
+      ``clean_intermediates`` subjects would end up being run one at a time.
+    - ``finished_callback``: called with each finished node, the size (bytes)
+      of its working directory (before the directory may be removed), and its
+      runtime (if it was run, as returned by the worker).
+
+    """
+
+    def __init__(self, plugin_args=None):
+        plugin_args = plugin_args or {}
+        super().__init__(plugin_args=plugin_args)
+        self._clean = bool(plugin_args.get("clean_intermediates", False))
+        self._min_size = int(plugin_args.get("min_clean_size", MIN_CLEAN_SIZE))
+        budget = plugin_args.get("work_budget_gb")
+        self._budget = int(float(budget) * 1e9) if budget else None
+        self._finished_callback = plugin_args.get("finished_callback")
+        self._last_result = None
+
+        self._sizes = {}
+        self._kept = set()
+        self._started_subjects = set()
+
+    @property
+    def work_usage(self):
+        """Bytes held in the working directory by finished nodes (as tracked)."""
+        return sum(self._sizes.values())
+
+    def run(self, graph, config, updatehash=False):
+        if self._clean:
+            config = deepcopy(config)
+            config["execution"]["remove_node_directories"] = "true"
+        return super().run(graph, config, updatehash=updatehash)
+
+    def _task_finished_cb(self, jobid, cached=False):
+        super()._task_finished_cb(jobid, cached=cached)
+
+        if jobid not in self.mapnodesubids:
+            self._sizes[jobid] = dir_size(self.procs[jobid].output_dir())
+            if self._finished_callback:
+                result = None if cached else (self._last_result or {}).get("result")
+                self._finished_callback(
+                    self.procs[jobid], self._sizes[jobid], getattr(result, "runtime", None)
+                )
+            if self._sizes[jobid] < self._min_size:
+                self._keep(jobid)
+
+    def _get_result(self, taskid):
+        # Keep the result of the task about to be finished, to hand its runtime over
+        self._last_result = super()._get_result(taskid)
+        return self._last_result
+
+    def _clear_task(self, taskid):
+        super()._clear_task(taskid)
+        self._last_result = None
+
+    def _remove_node_deps(self, jobid, crashfile, graph):
+        result = super()._remove_node_deps(jobid, crashfile, graph)
+        for node in result["dependents"]:
+            self._keep(self.procs.index(node))
+        return result
+
+    def _remove_node_dirs(self):
+        """Remove the working directories no remaining node depends on."""
+        removed = self.refidx.diagonal() < 0
+        super()._remove_node_dirs()
+        removed = (self.refidx.diagonal() < 0) & ~removed
+        for jobid in removed.nonzero()[0]:
+            if jobid in self._kept:
+                continue
+            size = self._sizes.get(jobid, 0)
+            LOGGER.info(
+                f"[node dependencies finished] removed {size / 2 ** 20:.1f}MB "
+                f"of intermediates of {self.procs[jobid].fullname}."
+            )
+            self._sizes[jobid] = 0
+
+    def _keep(self, jobid):
+        """
+        Exclude a node from the removal of working directories.
+
+        Nipype removes those directories whose rows in ``refidx`` sum up to
+        zero (i.e., all nodes depending on them have finished), and flags them
+        with a negative diagonal. A diagonal set below the number of pending
+        dependent nodes keeps the sum negative, so the directory is never removed.
+        """
+        self._kept.add(jobid)
+        self.refidx[jobid, jobid] = -(self.refidx[jobid].sum() - self.refidx[jobid, jobid]) - 1
+
+    def _sort_jobs(self, jobids, scheduler="tsort"):
+        jobids = super()._sort_jobs(jobids, scheduler=scheduler)
+        if self._budget is None:
+            return jobids
+
+        over_budget = self.work_usage > self._budget
+        admitted = []
+        for jobid in jobids:
+            subject = node_subject(self.procs[jobid])
+            if subject is not None and subject not in self._started_subjects:
+                # Nothing else running, admit anyways to avoid a deadlock
+                if over_budget and (self.pending_tasks or admitted):
+                    continue
+                self._started_subjects.add(subject)
+            admitted.append(jobid)
+
+        if over_budget and len(admitted) < len(jobids):
+            LOGGER.debug(
+                f"Work directory budget exceeded ({self.work_usage / 1e9:.1f}GB), "
+                "deferring new subjects."
+            )
+        return admitted
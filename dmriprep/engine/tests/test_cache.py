@@ -0,0 +1,89 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Test the cache of results shared across subjects."""
+from pathlib import Path
+from nipype.pipeline import engine as pe
+from nipype.interfaces import utility as niu
+from dmriprep.engine.cache import SharedNodeCache
+
+
+def _resample(size):
+    import os
+    from pathlib import Path
+
+    with open(os.environ["SHARED_CACHE_LOG"], "a") as log:
+        log.write("run\n")
+    out_file = Path("template.bin").absolute()
+    out_file.write_bytes(b"\1" * size)
+    return str(out_file)
+
+
+def _subject_wf(subject_id, size):
+    wf = pe.Workflow(name=f"single_subject_{subject_id}_wf")
+    res_tmpl = pe.Node(
+        niu.Function(function=_resample, input_names=["size"]),
+        name="res_tmpl",
+    )
+    res_tmpl.inputs.size = size
+    wf.add_nodes([res_tmpl])
+    return wf
+
+
+def test_shared_cache(tmpdir, monkeypatch):
+    """Check identical nodes are run once, and the cache is kept under its cap."""
+    tmpdir.chdir()
+    tmp_path = Path(tmpdir)
+    log_file = tmp_path / "runs.log"
+    monkeypatch.setenv("SHARED_CACHE_LOG", str(log_file))
+    cache = SharedNodeCache(tmp_path / "shared_cache", max_gb=3e-5)
+
+    wf = pe.Workflow(name="dmriprep_wf", base_dir=str(tmp_path / "work"))
+    wf.add_nodes([_subject_wf("01", 1024), _subject_wf("02", 1024)])
+    wf.run(plugin="Linear", plugin_args={"status_callback": cache})
+
+    assert log_file.read_text().count("run") == 1
+    assert cache.hits == 1
+    out_file = (
+        tmp_path / "work" / "dmriprep_wf" / "single_subject_02_wf" / "res_tmpl"
+        / "template.bin"
+    )
+    assert out_file.stat().st_size == 1024
+
+    # The restored result points into the node's own directory
+    from nipype.pipeline.engine.utils import load_resultfile
+
+    result = load_resultfile(out_file.parent / "result_res_tmpl.pklz")
+    assert Path(result.outputs.out) == out_file
+    assert len(list((tmp_path / "shared_cache").iterdir())) == 1
+
+    # A different template does not fit together with the first one (30 kB cap)
+    wf = pe.Workflow(name="dmriprep_wf", base_dir=str(tmp_path / "work2"))
+    wf.add_nodes([_subject_wf("03", 16384)])
+    wf.run(plugin="Linear", plugin_args={"status_callback": cache})
+
+    assert log_file.read_text().count("run") == 2
+    entries = list((tmp_path / "shared_cache").iterdir())
+    assert len(entries) == 1
+    assert entries[0].name.endswith(
+        next((tmp_path / "work2").glob("**/res_tmpl/_0x*.json")).stem[3:]
+    )
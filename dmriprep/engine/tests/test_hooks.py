@@ -0,0 +1,93 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Test execution hooks."""
+from nipype.pipeline import engine as pe
+from nipype.interfaces import utility as niu
+from dmriprep.engine.hooks import SubjectReportHook
+from dmriprep.engine.plugin import node_subject
+
+
+def _identity(value):
+    return value
+
+
+def _subject_wf(subject_id):
+    wf = pe.Workflow(name=f"single_subject_{subject_id}_wf")
+    nodes = [
+        pe.Node(
+            niu.Function(function=_identity, input_names=["value"]), name=name
+        )
+        for name in ("compute", "ds_report_mask", "ds_report_eddy")
+    ]
+    nodes[0].inputs.value = 1
+
+    # A reportlet sink nested two workflows below the subject's
+    dwi_wf = pe.Workflow(name="dwi_preproc_wf")
+    reportlets_wf = pe.Workflow(name="reportlets_wf")
+    ds_report_sdc = pe.Node(
+        niu.Function(function=_identity, input_names=["value"]), name="ds_report_sdc"
+    )
+    reportlets_wf.add_nodes([ds_report_sdc])
+    dwi_wf.add_nodes([reportlets_wf])
+
+    wf.connect([
+        (nodes[0], nodes[1], [("out", "value")]),
+        (nodes[1], nodes[2], [("out", "value")]),
+        (nodes[2], dwi_wf, [("out", "reportlets_wf.ds_report_sdc.value")]),
+    ])
+    return wf
+
+
+def test_subject_report_hook(tmpdir, monkeypatch):
+    """Check reports are triggered once per subject, after its last reportlet."""
+    tmpdir.chdir()
+    wf = pe.Workflow(name="dmriprep_wf", base_dir=str(tmpdir))
+    wf.add_nodes([_subject_wf("01"), _subject_wf("02")])
+
+    hook = SubjectReportHook(wf, str(tmpdir), "uuid", config="spec.yml")
+    assert hook._pending["01"] == {
+        "single_subject_01_wf.ds_report_mask",
+        "single_subject_01_wf.ds_report_eddy",
+        "single_subject_01_wf.dwi_preproc_wf.reportlets_wf.ds_report_sdc",
+    }
+
+    submitted = []
+
+    def _submit(subject):
+        # All reportlet sinks of the subject must have finished
+        assert not hook._pending[subject]
+        assert finished[subject] == 3
+        submitted.append(subject)
+
+    finished = {"01": 0, "02": 0}
+
+    def _callback(node, status):
+        if status == "end" and node.name.startswith("ds_report"):
+            finished[node_subject(node)] += 1
+        hook(node, status)
+
+    monkeypatch.setattr(hook, "_submit", _submit)
+    wf.run(plugin="Linear", plugin_args={"status_callback": _callback})
+
+    assert sorted(submitted) == ["01", "02"]
+    hook.close()
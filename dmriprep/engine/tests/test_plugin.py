@@ -0,0 +1,100 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Test the disk-budget plugin."""
+from pathlib import Path
+from nipype.pipeline import engine as pe
+from nipype.interfaces import utility as niu
+from dmriprep.engine.plugin import DiskBudgetPlugin
+from dmriprep.engine.tracing import NodeTracer
+
+
+def _write_blob(size, prev=None):
+    from pathlib import Path
+
+    out_file = Path("blob.bin").absolute()
+    out_file.write_bytes(b"\0" * size)
+    return str(out_file)
+
+
+def _consume(in_file):
+    from pathlib import Path
+
+    return Path(in_file).stat().st_size
+
+
+def _subject_wf(subject_id):
+    wf = pe.Workflow(name=f"single_subject_{subject_id}_wf")
+    produce = pe.Node(
+        niu.Function(function=_write_blob, input_names=["size"]), name="produce"
+    )
+    produce.inputs.size = 4 * 2 ** 20
+    small = pe.Node(
+        niu.Function(function=_write_blob, input_names=["size"]), name="small"
+    )
+    small.inputs.size = 16
+    consume = pe.Node(
+        niu.Function(function=_consume, input_names=["in_file"]), name="consume"
+    )
+    wf.connect([(produce, consume, [("out", "in_file")])])
+    wf.add_nodes([small])
+    return wf
+
+
+def test_clean_intermediates(tmpdir):
+    """Check intermediates are removed only after their consumers ran."""
+    tmpdir.chdir()
+    tmp_path = Path(tmpdir)
+    wf = pe.Workflow(name="dmriprep_wf", base_dir=str(tmp_path))
+    wf.add_nodes([_subject_wf("01"), _subject_wf("02")])
+
+    tracer = NodeTracer()
+    plugin = DiskBudgetPlugin(
+        plugin_args={
+            "status_callback": tracer,
+            "finished_callback": tracer.record_finished,
+            "n_procs": 2,
+            "clean_intermediates": True,
+            "work_budget_gb": 1e-3,
+        }
+    )
+    graph = wf.run(plugin=plugin)
+
+    results = {node.fullname: node for node in graph.nodes}
+    for subject_id in ("01", "02"):
+        prefix = f"dmriprep_wf.single_subject_{subject_id}_wf"
+        consume = results[f"{prefix}.consume"]
+        assert consume.result.outputs.out == 4 * 2 ** 20
+        assert not Path(results[f"{prefix}.produce"].output_dir()).exists()
+        assert Path(results[f"{prefix}.small"].output_dir()).exists()
+
+    assert plugin._started_subjects == {"01", "02"}
+
+    # Sizes are traced before intermediates are removed
+    traced = {r["node"]: r for r in tracer.records}
+    assert len(traced) == 6
+    assert traced["dmriprep_wf.single_subject_01_wf.produce"]["out_bytes"] > 4 * 2 ** 20
+    assert {r["status"] for r in tracer.records} == {"end"}
+    # Runtimes are handed over by the plugin, instead of read from disk
+    assert all(r["result_file"] is None for r in tracer.records)
+    assert len(tracer.write(tmp_path / "out", "run")) == 2
+    assert traced["dmriprep_wf.single_subject_01_wf.produce"]["out_bytes"] > 4 * 2 ** 20
@@ -0,0 +1,448 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""
+Tracing of the execution of workflows.
+
+A :py:class:`NodeTracer` is handed to nipype's plugins as a ``status_callback``
+and records when each node started and finished, along with the CPU time and
+peak memory reported by nipype's resource monitor (when enabled with
+``--resource-monitor``) and the bytes the node left in its working directory.
+Neither results are read nor working directories walked within the callback:
+:py:class:`~dmriprep.engine.plugin.DiskBudgetPlugin` reports the results it
+holds in memory and the sizes it measures anyways, and otherwise they are read
+when traces are written.
+Traces are written per subject in the *Chrome trace format*,
+which can be opened with ``chrome://tracing``, `Perfetto <https://ui.perfetto.dev>`__
+or `speedscope <https://www.speedscope.app>`__, along with a TSV summary.
+
+"""
+import json
+import re
+from time import time
+from nipype import logging
+from .plugin import dir_size, node_subject
+
+LOGGER = logging.getLogger("nipype.workflow")
+
+TRACE_COLUMNS = (
+    "node",
+    "interface",
+    "dwi_run",
+    "status",
+    "start",
+    "duration_s",
+    "cpu_time_s",
+    "peak_rss_gb",
+    "out_bytes",
+)
+"""Columns of the summary TSV files."""
+
+_DWI_RUN_RE = re.compile(r"dwi_preproc_(?P<run>[^.]+)_wf")
+
+PERFORMANCE_TEMPLATE = """\
+\t<ul class="elem-desc">
+\t\t<li>Wall time: {wall:.1f} min ({nodes:d} nodes run, {cached:d} cached)</li>
+\t\t<li>Processor allocation: {allocation:.0%} of {nprocs:d} requested processors</li>
+\t\t<li>{efficiency}</li>
+\t</ul>
+{gantt}
+\t<h4>Top-10 nodes by wall time</h4>
+{top_time}
+\t<h4>Top-10 nodes by peak memory</h4>
+{top_mem}
+"""
+
+
+class NodeTracer:
+    """
+    Record the execution of nodes, as a nipype ``status_callback``.
+
+    Examples
+    --------
+    >>> from nipype.pipeline.engine import Node
+    >>> from nipype.interfaces.utility import IdentityInterface
+    >>> node = Node(IdentityInterface(fields=["a"]), name="inputnode")
+    >>> node._hierarchy = "dmriprep_wf.single_subject_01_wf.dwi_preproc_acq_AP_wf"
+    >>> tracer = NodeTracer()
+    >>> tracer(node, "start")
+    >>> tracer(node, "end")
+    >>> record = tracer.records[0]
+    >>> record["subject"], record["dwi_run"], record["status"]
+    ('01', 'acq_AP', 'end')
+    >>> tracer.record_finished(node, 1024)
+    >>> record["out_bytes"]
+    1024
+
+    CPU time is averaged over the samples of nipype's resource monitor:
+
+    >>> from nipype.interfaces.base.support import Bunch
+    >>> runtime = Bunch(
+    ...     duration=60.0, cpu_percent=400.0, mem_peak_gb=1.5,
+    ...     prof_dict={"time": [0.0, 20.0, 40.0, 60.0], "cpus": [400.0, 50.0, 50.0, 50.0]},
+    ... )
+    >>> tracer.record_finished(node, 1024, runtime)
+    >>> record["duration_s"], record["cpu_time_s"], record["peak_rss_gb"]
+    (60.0, 82.5, 1.5)
+
+    """
+
+    def __init__(self):
+        self.records = []
+        self._started = {}
+        self._last = {}
+        self._t0 = time()
+
+    def __call__(self, node, status):
+        now = time()
+        if status == "start":
+            self._started[node.fullname] = now
+            return
+
+        start = self._started.pop(node.fullname, None)
+        duration = None if start is None else now - start
+        if start is None:  # Cached nodes do not signal their start
+            status = "cached" if status == "end" else status
+            start, duration = now, 0.0
+
+        match = _DWI_RUN_RE.search(node.fullname)
+        record = {
+            "subject": node_subject(node),
+            "node": node.fullname,
+            "interface": type(node.interface).__name__,
+            "n_procs": getattr(node, "n_procs", 1) or 1,
+            "dwi_run": match.group("run") if match else None,
+            "status": status,
+            "start": start - self._t0,
+            "duration_s": float(duration),
+            "cpu_time_s": None,
+            "peak_rss_gb": None,
+            "out_bytes": None,
+            "output_dir": node.output_dir(),
+            "result_file": (
+                f"{node.output_dir()}/result_{node.name}.pklz"
+                if status == "end"
+                else None
+            ),
+        }
+        self.records.append(record)
+        self._last[node.fullname] = record
+
+    def record_finished(self, node, nbytes, runtime=None):
+        """Set the working directory size and the runtime of the last run of ``node``."""
+        record = self._last.get(node.fullname)
+        if record is None:
+            return
+
+        record["out_bytes"] = nbytes
+        if runtime is not None:
+            _update_runtime(record, runtime)
+            record["result_file"] = None
+
+    def _complete(self):
+        """Read the results and measure the working directories not reported yet."""
+        from pathlib import Path
+        from nipype.pipeline.engine.utils import load_resultfile
+
+        for r in self.records:
+            if r.get("result_file"):
+                if Path(r["result_file"]).exists():
+                    try:
+                        _update_runtime(r, load_resultfile(r["result_file"]).runtime)
+                    except Exception:
+                        pass
+                r["result_file"] = None
+            if r["out_bytes"] is None and r.get("output_dir"):
+                r["out_bytes"] = dir_size(r["output_dir"])
+
+    def write(self, output_dir, run_uuid):
+        """
+        Write out the traces of each subject.
+
+        Files are stored as ``sub-<label>/log/<run_uuid>/trace.json`` (Chrome
+        trace format) and ``trace.tsv`` (nodes sorted by decreasing duration)
+        under ``output_dir``.
+
+        Examples
+        --------
+        >>> tracer = NodeTracer()
+        >>> tracer.records = [
+        ...     {"subject": "01", "node": "a", "interface": "Eddy", "dwi_run": "AP",
+        ...      "status": "end", "start": 0.0, "duration_s": 3.0, "cpu_time_s": None,
+        ...      "peak_rss_gb": None, "out_bytes": 10},
+        ...     {"subject": "01", "node": "b", "interface": "Merge", "dwi_run": None,
+        ...      "status": "end", "start": 1.0, "duration_s": 1.0, "cpu_time_s": 0.5,
+        ...      "peak_rss_gb": 0.2, "out_bytes": 5},
+        ... ]
+        >>> out_files = tracer.write(tmpdir, "20210101-000000_uuid")
+        >>> [str(Path(f).relative_to(tmpdir)) for f in out_files]
+        ['sub-01/log/20210101-000000_uuid/trace.json']
+        >>> trace = json.loads(Path(out_files[0]).read_text())
+        >>> [(ev["name"], ev["tid"]) for ev in trace["traceEvents"] if ev["ph"] == "X"]
+        [('a', 0), ('b', 1)]
+        >>> (Path(out_files[0]).parent / "trace.tsv").read_text().splitlines()[1].split("\\t")
+        ['a', 'Eddy', 'AP', 'end', '0.000', '3.000', 'n/a', 'n/a', '10']
+
+        """
+        from pathlib import Path
+
+        self._complete()
+        out_files = []
+        for subject in sorted({r["subject"] for r in self.records} - {None}):
+            records = sorted(
+                (r for r in self.records if r["subject"] == subject),
+                key=lambda r: r["start"],
+            )
+            log_dir = Path(output_dir) / f"sub-{subject}" / "log" / run_uuid
+            log_dir.mkdir(parents=True, exist_ok=True)
+
+            trace_file = log_dir / "trace.json"
+            trace_file.write_text(json.dumps(_chrome_trace(records, subject)))
+            out_files.append(str(trace_file))
+
+            lines = ["\t".join(TRACE_COLUMNS)] + [
+                "\t".join(_format(r[col]) for col in TRACE_COLUMNS)
+                for r in sorted(records, key=lambda r: -r["duration_s"])
+            ]
+            (log_dir / "trace.tsv").write_text("\n".join(lines) + "\n")
+        return out_files
+
+    def write_reportlets(self, output_dir, nprocs):
+        """Write out the performance reportlet of each subject."""
+        from pathlib import Path
+
+        self._complete()
+        out_files = []
+        for subject in sorted({r["subject"] for r in self.records} - {None}):
+            records = [r for r in self.records if r["subject"] == subject]
+            figures = Path(output_dir) / f"sub-{subject}" / "figures"
+            figures.mkdir(parents=True, exist_ok=True)
+            out_file = figures / f"sub-{subject}_desc-performance_T1w.html"
+            out_file.write_text(performance_report(records, int(nprocs)))
+            out_files.append(str(out_file))
+        return out_files
+
+
+def _assign_lanes(records):
+    """Stack overlapping nodes in lanes (records must be sorted by start time)."""
+    lanes = []  # end time of the last event in each lane
+    tids = []
+    for r in records:
+        end = r["start"] + r["duration_s"]
+        tid = next((i for i, lane_end in enumerate(lanes) if lane_end <= r["start"]), None)
+        if tid is None:
+            tid = len(lanes)
+            lanes.append(end)
+        lanes[tid] = end
+        tids.append(tid)
+    return tids
+
+
+def _chrome_trace(records, subject):
+    """Convert records into Chrome trace events."""
+    events = [
+        {"name": "process_name", "ph": "M", "pid": 0, "args": {"name": f"sub-{subject}"}}
+    ]
+    for r, tid in zip(records, _assign_lanes(records)):
+        events.append(
+            {
+                "name": r["node"],
+                "cat": r["interface"],
+                "ph": "X",
+                "ts": int(r["start"] * 1e6),
+                "dur": int(r["duration_s"] * 1e6),
+                "pid": 0,
+                "tid": tid,
+                "args": {
+                    key: r[key]
+                    for key in ("dwi_run", "status", "cpu_time_s", "peak_rss_gb", "out_bytes")
+                    if r[key] is not None
+                },
+            }
+        )
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def performance_report(records, nprocs):
+    """
+    Generate an HTML reportlet summarizing the execution of a subject's nodes.
+
+    The reportlet shows a Gantt chart of the nodes, the ten nodes that took
+    longest and those with the highest peak memory, and how the processors
+    (``nprocs``) were used while the subject was being processed:
+    the processor allocation is the fraction of them that nodes requested
+    (their ``n_procs``), and the parallel efficiency is the fraction actually
+    kept busy, according to the CPU time measured by nipype's resource monitor
+    (only with ``--resource-monitor``).
+
+    Examples
+    --------
+    >>> records = [
+    ...     {"node": "a.eddy", "interface": "Eddy", "status": "end", "start": 0.0,
+    ...      "duration_s": 60.0, "n_procs": 2, "peak_rss_gb": 1.5, "cpu_time_s": 90.0},
+    ...     {"node": "a.mask", "interface": "Mask", "status": "end", "start": 0.0,
+    ...      "duration_s": 30.0, "n_procs": 1, "peak_rss_gb": None, "cpu_time_s": 18.0},
+    ...     {"node": "a.grab", "interface": "Grab", "status": "cached", "start": 0.0,
+    ...      "duration_s": 0.0},
+    ... ]
+    >>> html = performance_report(records, nprocs=4)
+    >>> "Processor allocation: 62% of 4 requested processors" in html
+    True
+    >>> "Parallel efficiency: 45% (measured CPU time)" in html
+    True
+    >>> "<svg" in html and html.count("<tr>")
+    5
+
+    Node names are escaped, and efficiency is not reported when CPU time was not
+    measured:
+
+    >>> records[0]["node"], records[0]["cpu_time_s"] = "a.<eddy>", None
+    >>> html = performance_report(records, nprocs=4)
+    >>> "a.&lt;eddy&gt;" in html, "Parallel efficiency: n/a" in html
+    (True, True)
+
+    CPU time is that sampled over the runtime of nodes, and therefore short peaks
+    using more processors than available do not inflate the efficiency:
+
+    >>> from nipype.interfaces.base.support import Bunch
+    >>> record = {"node": "a.eddy", "interface": "Eddy", "status": "end",
+    ...           "start": 0.0, "duration_s": 60.0, "n_procs": 4}
+    >>> _update_runtime(record, Bunch(
+    ...     duration=60.0, cpu_percent=800.0, mem_peak_gb=1.0,
+    ...     prof_dict={"time": [0.0, 30.0, 60.0], "cpus": [800.0, 100.0, 100.0]},
+    ... ))
+    >>> "Parallel efficiency: 83% (measured CPU time)" in performance_report(
+    ...     [record], nprocs=4
+    ... )
+    True
+
+    """
+    run = [r for r in records if r["status"] != "cached"]
+    start = min((r["start"] for r in run), default=0.0)
+    wall = max((r["start"] + r["duration_s"] for r in run), default=0.0) - start
+    requested = sum(r["duration_s"] * min(r.get("n_procs", 1), nprocs) for r in run)
+    cpu_time = [r.get("cpu_time_s") for r in run]
+    if run and wall > 0 and None not in cpu_time:
+        measured = sum(cpu_time) / (wall * nprocs)
+        if measured > 1.0:
+            LOGGER.warning(
+                f"Measured CPU time exceeds {nprocs} processors during {wall:.0f}s "
+                f"({measured:.0%}), reporting 100% parallel efficiency."
+            )
+            measured = 1.0
+        efficiency = f"Parallel efficiency: {measured:.0%} (measured CPU time)"
+    else:
+        efficiency = (
+            "Parallel efficiency: n/a (CPU time is measured with "
+            "<code>--resource-monitor</code>)"
+        )
+
+    top_mem = [r for r in run if r.get("peak_rss_gb") is not None]
+    return PERFORMANCE_TEMPLATE.format(
+        wall=wall / 60,
+        nodes=len(run),
+        cached=len(records) - len(run),
+        allocation=requested / (wall * nprocs) if wall > 0 else 0.0,
+        efficiency=efficiency,
+        nprocs=nprocs,
+        gantt=_plot_gantt(run),
+        top_time=_html_table(
+            sorted(run, key=lambda r: -r["duration_s"])[:10],
+            "duration_s",
+            "Wall time (s)",
+        ),
+        top_mem=_html_table(
+            sorted(top_mem, key=lambda r: -r["peak_rss_gb"])[:10],
+            "peak_rss_gb",
+            "Peak memory (GB)",
+        )
+        if top_mem
+        else "\t<p>Memory was not monitored (run with <code>--resource-monitor</code>).</p>",
+    )
+
+
+def _plot_gantt(records):
+    """Plot nodes as horizontal bars along time, and return an inline SVG."""
+    from io import StringIO
+    from matplotlib.figure import Figure
+
+    if not records:
+        return ""
+
+    records = sorted(records, key=lambda r: r["start"])
+    tids = _assign_lanes(records)
+    t0 = records[0]["start"]
+    colors = {}
+
+    fig = Figure(figsize=(12, 1 + 0.25 * (max(tids) + 1)))
+    ax = fig.add_subplot(111)
+    for r, tid in zip(records, tids):
+        color = colors.setdefault(r["interface"], f"C{len(colors) % 10}")
+        ax.barh(tid, r["duration_s"] / 60, left=(r["start"] - t0) / 60, color=color)
+    ax.set_xlabel("Time (min)")
+    ax.set_ylabel("Concurrent nodes")
+    ax.set_yticks([])
+    ax.invert_yaxis()
+
+    svg = StringIO()
+    fig.savefig(svg, format="svg", bbox_inches="tight")
+    return svg.getvalue()[svg.getvalue().find("<svg"):]
+
+
+def _html_table(records, column, header):
+    from html import escape
+
+    rows = "\n".join(
+        f"\t\t<tr><td>{escape(r['node'])}</td><td>{escape(r['interface'])}</td>"
+        f"<td>{r[column]:.2f}</td></tr>"
+        for r in records
+    )
+    return (
+        '\t<table class="table table-sm">\n'
+        f"\t\t<tr><th>Node</th><th>Interface</th><th>{header}</th></tr>\n"
+        f"{rows}\n\t</table>"
+    )
+
+
+def _update_runtime(record, runtime):
+    """Fill in a record with the duration and resources found in a nipype runtime."""
+    if record["status"] == "cached":
+        return
+
+    duration = getattr(runtime, "duration", None)
+    if duration is not None:
+        record["duration_s"] = float(duration)
+
+    # ``cpu_percent`` is the peak of the samples; their mean is used instead
+    cpus = (getattr(runtime, "prof_dict", None) or {}).get("cpus")
+    record["cpu_time_s"] = (
+        record["duration_s"] * sum(cpus) / len(cpus) / 100 if cpus else None
+    )
+    record["peak_rss_gb"] = getattr(runtime, "mem_peak_gb", None)
+
+
+def _format(value):
+    if value is None:
+        return "n/a"
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
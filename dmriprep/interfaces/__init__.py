@@ -1,20 +1,421 @@
 # emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
 # vi: set ft=python sts=4 ts=4 sw=4 et:
 """Custom Nipype interfaces for dMRIPrep."""
-from nipype.interfaces.base import OutputMultiObject, SimpleInterface
+from nipype.interfaces.base import (
+    OutputMultiObject,
+    SimpleInterface,
+    isdefined,
+    traits,
+)
 from niworkflows.interfaces.bids import (
     DerivativesDataSink as _DDS,
     _BIDSDataGrabberOutputSpec,
     _BIDSDataGrabberInputSpec,
+    DEFAULT_DTYPES as _DEFAULT_DTYPES,
     LOGGER as _LOGGER,
 )
+from ..utils.compress import COMPRESSLEVEL
+from ..utils.images import PRECISIONS
+from ..utils.misc import LINK_MODES
+
+
+class _DerivativesDataSinkInputSpec(_DDS.input_spec):
+    compresslevel = traits.Range(
+        low=1,
+        high=9,
+        value=COMPRESSLEVEL,
+        usedefault=True,
+        desc="gzip compression level, from 1 (fastest) to 9 (smallest)",
+    )
+    num_threads = traits.Int(
+        nohash=True,
+        desc="number of threads compressing outputs (default: ``omp_nthreads``)",
+    )
+    link_mode = traits.Enum(
+        *LINK_MODES,
+        nohash=True,
+        desc="materialize outputs by hardlinking or reflinking them when the input "
+        "is already in its final format (default: ``config.execution.output_link_mode``)",
+    )
+    output_precision = traits.Enum(
+        *PRECISIONS,
+        desc="storage type of floating-point NIfTI outputs without an explicit "
+        "``data_dtype`` (default: ``config.execution.output_precision``)",
+    )
+
+
+class _DerivativesDataSinkOutputSpec(_DDS.output_spec):
+    materialization = OutputMultiObject(
+        traits.Str,
+        desc="how each output was written (copy, hardlink, reflink, rewrite, "
+        "parallel-gzip)",
+    )
+    quantization = OutputMultiObject(
+        traits.Dict,
+        desc="quantization error and size reduction of each output (empty if the "
+        "output was not quantized)",
+    )
 
 
 class DerivativesDataSink(_DDS):
-    """A patched DataSink."""
+    """
+    A patched DataSink.
+
+    Outputs to be compressed are first written uncompressed, and then compressed
+    in independent blocks by a pool of threads (see
+    :py:func:`~dmriprep.utils.compress.parallel_gzip`), instead of the
+    single-threaded gzip of the base class.
+
+    Outputs that do not require changes of header, data type or format may
+    be hardlinked or reflinked from the working directory instead of copied
+    (``link_mode``), falling back to copying across filesystems.
+    When linking is enabled, the method used is recorded in the
+    ``FileMaterialization`` field of the sidecar (except for figures, which
+    get no sidecar of their own).
+
+    Floating-point NIfTI outputs without a data type requested explicitly are
+    stored following ``output_precision`` (see
+    :py:func:`~dmriprep.utils.images.quantize`).
+
+    Example
+    -------
+    >>> os.chdir(tmpdir)
+    >>> source = Path('sub-01') / 'dwi' / 'sub-01_dwi.nii.gz'
+    >>> source.parent.mkdir(parents=True, exist_ok=True)
+    >>> nb.Nifti1Image(np.ones((5, 5, 5, 3), dtype='int16'), np.eye(4)).to_filename(source)
+    >>> res = DerivativesDataSink(
+    ...     base_directory='.',
+    ...     desc='preproc',
+    ...     compress=True,
+    ...     compresslevel=1,
+    ...     num_threads=2,
+    ...     in_file=str(source),
+    ...     source_file=str(source),
+    ... ).run()
+    >>> res.outputs.out_file  # doctest: +ELLIPSIS
+    '.../dmriprep/sub-01/dwi/sub-01_desc-preproc_dwi.nii.gz'
+    >>> int(nb.load(res.outputs.out_file).get_fdata().sum())
+    375
+
+    Outputs that are already in their final format can be hardlinked:
+
+    >>> res = DerivativesDataSink(
+    ...     base_directory='.',
+    ...     desc='linked',
+    ...     compress=True,
+    ...     check_hdr=False,
+    ...     link_mode='hardlink',
+    ...     in_file=str(source),
+    ...     source_file=str(source),
+    ... ).run()
+    >>> res.outputs.materialization
+    'hardlink'
+    >>> os.stat(res.outputs.out_file).st_ino == os.stat(source).st_ino
+    True
+    >>> import json
+    >>> sidecar = res.outputs.out_file.replace('.nii.gz', '.json')
+    >>> json.loads(Path(sidecar).read_text())['FileMaterialization']
+    'hardlink'
+
+    >>> svg = Path('sub-01') / 'figures' / 'sub-01_dwi.svg'
+    >>> svg.parent.mkdir(parents=True, exist_ok=True)
+    >>> _ = svg.write_text('<svg/>')
+    >>> res = DerivativesDataSink(
+    ...     base_directory='.',
+    ...     datatype='figures',
+    ...     desc='summary',
+    ...     link_mode='hardlink',
+    ...     in_file=str(svg),
+    ...     source_file=str(source),
+    ... ).run()
+    >>> res.outputs.materialization
+    'hardlink'
+    >>> isdefined(res.outputs.out_meta)
+    False
+
+    Floating-point outputs can be quantized to 16-bit integers:
+
+    >>> fsource = Path('sub-01') / 'dwi' / 'sub-01_desc-float_dwi.nii.gz'
+    >>> nb.Nifti1Image(
+    ...     np.linspace(0, 1, 375).reshape((5, 5, 5, 3)), np.eye(4)
+    ... ).to_filename(fsource)
+    >>> res = DerivativesDataSink(
+    ...     base_directory='.',
+    ...     desc='quantized',
+    ...     compress=True,
+    ...     output_precision='int16',
+    ...     in_file=str(fsource),
+    ...     source_file=str(source),
+    ... ).run()
+    >>> res.outputs.quantization['size_ratio']
+    0.25
+    >>> nb.load(res.outputs.out_file).get_data_dtype().name
+    'int16'
+
+    """
 
+    input_spec = _DerivativesDataSinkInputSpec
+    output_spec = _DerivativesDataSinkOutputSpec
     out_path_base = "dmriprep"
 
+    def _run_interface(self, runtime):
+        from bids.utils import listify
+        from .. import config
+
+        in_file = [str(f) for f in listify(self.inputs.in_file)]
+        link_mode = self.inputs.link_mode
+        if not isdefined(link_mode):
+            link_mode = config.execution.output_link_mode or "copy"
+
+        precision = self.inputs.output_precision
+        if not isdefined(precision):
+            precision = config.execution.output_precision or "native"
+        quantize = self._plan_quantize(in_file, precision)
+
+        compress = listify(self.inputs.compress) or [None]
+        if len(compress) == 1:
+            compress = compress * len(in_file)
+        dest_gz = [
+            src.endswith(".gz") if value is None else bool(value)
+            for value, src in zip(compress, in_file)
+        ]
+
+        # Only inputs stored verbatim, in the format of the destination, are linked
+        data_dtype = self.inputs.data_dtype or _DEFAULT_DTYPES[self.inputs.suffix]
+        linkable = [
+            link_mode != "copy"
+            and not quant
+            and not data_dtype
+            and gz == src.endswith(".gz")
+            and self._can_link(src, runtime)
+            for quant, gz, src in zip(quantize, dest_gz, in_file)
+        ]
+
+        # Let the base class write uncompressed files, and compress them afterwards.
+        # Inputs to be linked are stood in for by header-only placeholders, so that
+        # the base class builds their destination and checks their header without
+        # copying any data.
+        recompress = [
+            bool(value) and not link for value, link in zip(compress, linkable)
+        ]
+        placeholders = {
+            i: _placeholder(src, runtime.cwd, i)
+            for i, src in enumerate(in_file)
+            if linkable[i]
+        }
+        runtime = self._run_base(
+            runtime,
+            [placeholders.get(i, src) for i, src in enumerate(in_file)],
+            compress,
+            recompress,
+        )
+
+        linked = self._link(in_file, placeholders, link_mode)
+        fallback = set(placeholders) - set(linked)
+        if fallback:
+            # Write out the inputs that could not be linked (linked outputs are
+            # now the same file as their inputs, and the base class skips them)
+            for i in fallback:
+                recompress[i] = bool(compress[i])
+            runtime = self._run_base(runtime, in_file, compress, recompress)
+
+        self._results["materialization"] = [
+            linked.get(i) or ("rewrite" if fixed or data_dtype else "copy")
+            for i, fixed in enumerate(self._results["fixed_hdr"])
+        ]
+        self._results["quantization"] = [{} for _ in self._results["out_file"]]
+        if any(quantize):
+            self._quantize(quantize, recompress, precision)
+
+        if any(recompress):
+            self._compress(recompress)
+
+        if link_mode != "copy":
+            self._record_materialization()
+        return runtime
+
+    def _run_base(self, runtime, in_file, compress, recompress):
+        """Run the base class on ``in_file``, leaving ``recompress`` outputs uncompressed."""
+        orig_in_file, orig_compress = self.inputs.in_file, self.inputs.compress
+        self.inputs.in_file = in_file
+        if any(recompress):
+            self.inputs.compress = [
+                False if redo else value for value, redo in zip(compress, recompress)
+            ]
+
+        try:
+            return super()._run_interface(runtime)
+        finally:
+            self.inputs.in_file, self.inputs.compress = orig_in_file, orig_compress
+
+    def _can_link(self, src, runtime):
+        """Check whether the file format of ``src`` allows stand-in placeholders."""
+        from pathlib import Path
+        import nibabel as nb
+
+        # Inputs within the output directory may be their own destination
+        base_directory = self.inputs.base_directory
+        if not isdefined(base_directory):
+            base_directory = runtime.cwd
+        out_path = Path(base_directory).absolute() / self.out_path_base
+        if out_path in Path(src).absolute().parents:
+            return False
+
+        try:
+            return isinstance(nb.load(src), nb.Nifti1Image)
+        except nb.filebasedimages.ImageFileError:  # Not an image
+            return True
+
+    def _link(self, in_file, placeholders, link_mode):
+        """Replace the placeholders written by the base class with links to the inputs."""
+        import os
+        from ..utils.misc import link_file
+
+        linked = {}
+        for i, placeholder in placeholders.items():
+            os.unlink(placeholder)
+            if self._results["fixed_hdr"][i]:
+                continue
+
+            out_file = self._results["out_file"][i]
+            tmp_file = f"{out_file}.link"
+            if os.path.lexists(tmp_file):
+                os.unlink(tmp_file)
+            linked[i] = link_file(in_file[i], tmp_file, mode=link_mode)
+            if linked[i] is None:
+                del linked[i]
+                os.unlink(out_file)
+                continue
+
+            os.replace(tmp_file, out_file)
+        return linked
+
+    def _plan_quantize(self, in_file, precision):
+        """Decide which inputs will be stored with ``precision``."""
+        import nibabel as nb
+        from ..utils.images import needs_quantize
+
+        if precision == "native" or (
+            self.inputs.data_dtype or _DEFAULT_DTYPES[self.inputs.suffix]
+        ):
+            return [False] * len(in_file)
+
+        return [
+            str(f).endswith((".nii", ".nii.gz"))
+            and not str(f).endswith((".dtseries.nii", ".dtseries.nii.gz"))
+            and needs_quantize(nb.load(f).get_data_dtype(), precision)
+            for f in in_file
+        ]
+
+    def _quantize(self, quantize, recompress, precision):
+        import os
+        import nibabel as nb
+        from .. import config
+        from ..utils.compress import parallel_gzip
+        from ..utils.images import quantize as _quantize
+
+        for i, out_file in enumerate(self._results["out_file"]):
+            if not quantize[i]:
+                continue
+
+            tmp_file = f"{out_file.rsplit('.nii', 1)[0]}.quantized.nii"
+            report = _quantize(nb.load(out_file), tmp_file, precision)
+            if out_file.endswith(".gz") and not recompress[i]:
+                num_threads = self.inputs.num_threads
+                if not isdefined(num_threads):
+                    num_threads = config.nipype.omp_nthreads or 1
+                parallel_gzip(
+                    tmp_file,
+                    out_file,
+                    compresslevel=self.inputs.compresslevel,
+                    num_threads=num_threads,
+                )
+                os.unlink(tmp_file)
+            else:
+                os.replace(tmp_file, out_file)
+
+            self._results["materialization"][i] = "rewrite"
+            self._results["quantization"][i] = report
+            _LOGGER.info(
+                f"Stored {out_file} as {precision} ({report['size_ratio']:.2f} of the "
+                f"original size, max. error {report['max_abs_error']:.3g}, "
+                f"RMSE {report['rmse']:.3g})."
+            )
+
+    def _compress(self, recompress):
+        from .. import config
+        from ..utils.compress import compress_inplace
+
+        num_threads = self.inputs.num_threads
+        if not isdefined(num_threads):
+            num_threads = config.nipype.omp_nthreads or 1
+
+        for i, out_file in enumerate(self._results["out_file"]):
+            if recompress[i]:
+                self._results["materialization"][i] = "parallel-gzip"
+                self._results["out_file"][i] = compress_inplace(
+                    out_file,
+                    compresslevel=self.inputs.compresslevel,
+                    num_threads=num_threads,
+                )
+                self._results["compression"][i] = True
+
+    def _record_materialization(self):
+        """Store how a single (non-figure) output was written in its sidecar."""
+        from json import dumps
+        from pathlib import Path
+
+        out_file = self._results["out_file"]
+        if len(out_file) != 1 or getattr(self.inputs, "datatype", None) == "figures":
+            return
+        out_file = Path(out_file[0])
+        if out_file.suffix in (".svg", ".html", ".png", ".jpg", ".gif"):
+            return
+
+        self._metadata["FileMaterialization"] = self._results["materialization"][0]
+        sidecar = out_file.parent / f'{out_file.name.split(".", 1)[0]}.json'
+        sidecar.write_text(dumps(self._metadata, sort_keys=True, indent=2))
+        self._results["out_meta"] = str(sidecar)
+
+
+def _placeholder(src, cwd, index):
+    """
+    Write a file standing in for ``src``, with the same extension and header but no data.
+
+    Examples
+    --------
+    >>> os.chdir(tmpdir)
+    >>> img = nb.Nifti1Image(np.ones((5, 5, 5, 3), dtype='int16'), np.eye(4))
+    >>> img.header.set_xyzt_units("mm", "sec")
+    >>> img.to_filename("sub-01_dwi.nii.gz")
+    >>> placeholder = nb.load(_placeholder("sub-01_dwi.nii.gz", ".", 0))
+    >>> placeholder.shape, placeholder.header.get_xyzt_units()
+    ((1, 1, 1, 1), ('mm', 'sec'))
+    >>> placeholder.header.get_zooms() == img.header.get_zooms()
+    True
+    >>> _ = Path("confounds.tsv").write_text("a\\tb\\n")
+    >>> Path(_placeholder("confounds.tsv", ".", 1)).name
+    '_placeholder1.tsv'
+
+    """
+    from pathlib import Path
+    import nibabel as nb
+    from nibabel.openers import ImageOpener
+
+    out_file = Path(cwd).absolute() / f"_placeholder{index}{''.join(Path(src).suffixes)}"
+    with ImageOpener(out_file, "wb") as fobj:
+        try:
+            img = nb.load(src)
+        except nb.filebasedimages.ImageFileError:  # Not an image
+            return str(out_file)
+
+        header = img.header.copy()
+        header.set_data_shape((1,) * len(img.shape))
+        header.write_to(fobj)
+        fobj.write(b"\0" * max(int(header["vox_offset"]) - fobj.tell(), 0))
+        fobj.write(b"\0" * header.get_data_dtype().itemsize)
+    return str(out_file)
+
 
 class BIDSDataGrabberOutputSpec(_BIDSDataGrabberOutputSpec):
     dwi = OutputMultiObject(desc="output DWI images")
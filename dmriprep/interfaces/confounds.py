@@ -0,0 +1,80 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Interfaces to calculate confounding timeseries."""
+from pathlib import Path
+
+from nipype.interfaces.base import (
+    BaseInterfaceInputSpec,
+    File,
+    SimpleInterface,
+    TraitedSpec,
+    traits,
+)
+
+from ..utils.confounds import eddy_confounds
+from .vectors import _undefined
+
+
+class _EddyMotionConfoundsInputSpec(BaseInterfaceInputSpec):
+    in_parameters = File(
+        exists=True, mandatory=True, desc="eddy's estimated parameters file"
+    )
+    in_movement_rms = File(exists=True, desc="eddy's movement RMS file")
+    mask_file = File(
+        exists=True, desc="a (white-matter) mask in DWI space to average displacements"
+    )
+    radius = traits.Float(
+        50.0, usedefault=True, desc="head radius (mm) for framewise displacement"
+    )
+
+
+class _EddyMotionConfoundsOutputSpec(TraitedSpec):
+    out_file = File(exists=True, desc="the confounds file (TSV)")
+
+
+class EddyMotionConfounds(SimpleInterface):
+    """
+    Calculate head-motion confounds from the parameters estimated by ``eddy``.
+
+    Example
+    -------
+    >>> os.chdir(tmpdir)
+    >>> np.savetxt('dwi.eddy_parameters', np.zeros((6, 16)))
+    >>> res = EddyMotionConfounds(in_parameters='dwi.eddy_parameters').run()
+    >>> np.loadtxt(res.outputs.out_file, skiprows=1, usecols=(7,)).tolist()
+    [0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+
+    """
+
+    input_spec = _EddyMotionConfoundsInputSpec
+    output_spec = _EddyMotionConfoundsOutputSpec
+
+    def _run_interface(self, runtime):
+        self._results["out_file"] = eddy_confounds(
+            self.inputs.in_parameters,
+            mask_file=_undefined(self.inputs, "mask_file"),
+            in_movement_rms=_undefined(self.inputs, "in_movement_rms"),
+            radius=self.inputs.radius,
+            out_file=Path(runtime.cwd).absolute() / "desc-confounds_timeseries.tsv",
+        )
+        return runtime
@@ -29,10 +29,11 @@ from nipype.interfaces.base import (
     File,
     SimpleInterface,
     TraitedSpec,
+    isdefined,
     traits,
 )
 
-from dmriprep.utils.images import extract_b0, median, rescale_b0
+from dmriprep.utils.images import PRECISIONS, extract_b0, median, rescale_b0
 
 LOGGER = logging.getLogger("nipype.interface")
 
@@ -81,6 +82,11 @@ class ExtractB0(SimpleInterface):
 class _RescaleB0InputSpec(BaseInterfaceInputSpec):
     in_file = File(exists=True, mandatory=True, desc="b0s file")
     mask_file = File(exists=True, mandatory=True, desc="mask file")
+    precision = traits.Enum(
+        *PRECISIONS,
+        desc="storage type of the rescaled volumes "
+        "(default: ``config.execution.output_precision``)",
+    )
 
 
 class _RescaleB0OutputSpec(TraitedSpec):
@@ -108,6 +114,11 @@ class RescaleB0(SimpleInterface):
 
     def _run_interface(self, runtime):
         from nipype.utils.filemanip import fname_presuffix
+        from .. import config
+
+        precision = self.inputs.precision
+        if not isdefined(precision):
+            precision = config.execution.output_precision or "native"
 
         out_b0s = fname_presuffix(
             self.inputs.in_file,
@@ -121,7 +132,12 @@ class RescaleB0(SimpleInterface):
         )
 
         self._results["out_b0s"], self._results["signal_drift"] = rescale_b0(
-            self.inputs.in_file, self.inputs.mask_file, out_b0s
+            self.inputs.in_file,
+            self.inputs.mask_file,
+            out_b0s,
+            precision=precision,
+        )
+        self._results["out_ref"] = median(
+            self._results["out_b0s"], out_path=out_ref, precision=precision
         )
-        self._results["out_ref"] = median(self._results["out_b0s"], out_path=out_ref)
         return runtime
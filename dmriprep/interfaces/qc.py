@@ -0,0 +1,224 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Interfaces for the quality control of diffusion MRI series."""
+from pathlib import Path
+
+import numpy as np
+from nipype.interfaces.base import (
+    BaseInterfaceInputSpec,
+    File,
+    SimpleInterface,
+    TraitedSpec,
+    traits,
+)
+
+from ..utils.confounds import write_tsv
+from ..utils.vectors import B0_THRESHOLD
+from ..utils.qc import (
+    CARPET_ROWS,
+    OUTLIER_Z,
+    dropout_outliers,
+    dwi_qc_summary,
+    exclude_volumes,
+    plot_dwi_qc,
+    read_matrix,
+)
+
+
+class _DWIQualitySummaryInputSpec(BaseInterfaceInputSpec):
+    in_file = File(exists=True, mandatory=True, desc="DWI series")
+    mask_file = File(exists=True, mandatory=True, desc="brain mask in DWI space")
+    shells = traits.List(traits.Float, mandatory=True, desc="b-value of each shell")
+    shell_ixs = traits.List(
+        traits.Int, mandatory=True, desc="index of the shell of each volume"
+    )
+    z_thres = traits.Float(
+        OUTLIER_Z, usedefault=True, desc="z-score threshold to flag a slice as outlier"
+    )
+    carpet_rows = traits.Int(
+        CARPET_ROWS, usedefault=True, desc="maximum number of voxels in the carpet"
+    )
+
+
+class _DWIQualitySummaryOutputSpec(TraitedSpec):
+    out_file = File(exists=True, desc="per-volume summary statistics (TSV)")
+    out_report = File(exists=True, desc="carpet plot reportlet (SVG)")
+    out_slice_means = File(
+        exists=True, desc="mean signal within the mask, per volume and slice (TSV)"
+    )
+
+
+class DWIQualitySummary(SimpleInterface):
+    """
+    Generate per-volume summary statistics and a carpet plot of a DWI series.
+
+    The series is read one volume at a time.
+
+    Example
+    -------
+    >>> os.chdir(tmpdir)
+    >>> qc = DWIQualitySummary(
+    ...     in_file=str(data_dir / 'dwi.nii.gz'),
+    ...     mask_file=str(data_dir / 'dwi_mask.nii.gz'),
+    ...     shells=[0.0, 1200.0, 2500.0],
+    ...     shell_ixs=[0, 1, 2, 1, 2],
+    ... )
+    >>> res = qc.run()  # doctest: +SKIP
+
+    """
+
+    input_spec = _DWIQualitySummaryInputSpec
+    output_spec = _DWIQualitySummaryOutputSpec
+
+    def _run_interface(self, runtime):
+        cwd = Path(runtime.cwd).absolute()
+        shells = np.array(self.inputs.shell_ixs)
+        bvals = np.array(self.inputs.shells)[shells]
+
+        summary = dwi_qc_summary(
+            self.inputs.in_file,
+            self.inputs.mask_file,
+            shells,
+            z_thres=self.inputs.z_thres,
+            carpet_rows=self.inputs.carpet_rows,
+        )
+
+        self._results["out_file"] = str(cwd / "dwi_qc.tsv")
+        write_tsv(
+            self._results["out_file"],
+            {
+                "b_value": bvals,
+                "shell": shells,
+                "mean": summary["mean"],
+                "median": summary["median"],
+                "std": summary["std"],
+                "outlier_slices": summary["outlier_slices"],
+            },
+        )
+        self._results["out_slice_means"] = str(cwd / "dwi_slice_means.tsv")
+        write_tsv(
+            self._results["out_slice_means"],
+            {
+                f"slice_{index:03d}": column
+                for index, column in enumerate(summary["slice_means"].T)
+            },
+        )
+        self._results["out_report"] = plot_dwi_qc(
+            summary, shells, cwd / "dwi_carpet.svg", b0_mask=bvals < B0_THRESHOLD
+        )
+        return runtime
+
+
+class _SliceOutliersInputSpec(BaseInterfaceInputSpec):
+    in_slice_means = File(
+        exists=True,
+        mandatory=True,
+        desc="mean signal within the mask, per volume (rows) and slice (columns)",
+    )
+    shells = traits.List(traits.Float, mandatory=True, desc="b-value of each shell")
+    shell_ixs = traits.List(
+        traits.Int, mandatory=True, desc="index of the shell of each volume"
+    )
+    z_thres = traits.Float(
+        OUTLIER_Z,
+        usedefault=True,
+        desc="number of robust standard deviations below the shell's typical signal "
+        "to flag a slice as signal dropout",
+    )
+    min_slices = traits.Int(
+        1, usedefault=True, desc="minimum number of outlier slices to exclude a volume"
+    )
+
+
+class _SliceOutliersOutputSpec(TraitedSpec):
+    out_file = File(exists=True, desc="outlier matrix, volumes by slices (TSV)")
+    out_exclude = File(
+        exists=True, desc="number of outlier slices and exclusion flag per volume (TSV)"
+    )
+    exclude_ixs = traits.List(traits.Int, desc="indices of excluded volumes")
+
+
+class SliceOutliers(SimpleInterface):
+    """
+    Detect slice-wise signal dropout and select the volumes to exclude.
+
+    The mean signal of every slice is compared against the same slice of the
+    volumes within the same shell (as clustered by
+    :py:class:`~dmriprep.interfaces.vectors.CheckGradientTable`).
+    At least one volume of each shell (and one :math:`b=0`) is always retained.
+
+    Example
+    -------
+    >>> os.chdir(tmpdir)
+    >>> shell_ixs = [0] + [1, 2] * 10
+    >>> slice_means = np.full((21, 3), 100.0) + np.arange(21)[:, np.newaxis]
+    >>> slice_means[5, 1] = 10.0
+    >>> np.savetxt('slice_means.tsv', slice_means, header='a\\tb\\tc', delimiter='\\t')
+    >>> res = SliceOutliers(
+    ...     in_slice_means='slice_means.tsv',
+    ...     shells=[0.0, 1000.0, 2000.0],
+    ...     shell_ixs=shell_ixs,
+    ... ).run()
+    >>> res.outputs.exclude_ixs
+    [5]
+
+    """
+
+    input_spec = _SliceOutliersInputSpec
+    output_spec = _SliceOutliersOutputSpec
+
+    def _run_interface(self, runtime):
+        cwd = Path(runtime.cwd).absolute()
+        shells = np.array(self.inputs.shell_ixs)
+        bvals = np.array(self.inputs.shells)[shells]
+        slice_means = read_matrix(self.inputs.in_slice_means)
+        if slice_means.shape[0] != bvals.size:
+            raise ValueError(
+                f"Got slice means for {slice_means.shape[0]} volumes, "
+                f"but got shell indices for {bvals.size} volumes."
+            )
+
+        outliers = dropout_outliers(slice_means, shells, z_thres=self.inputs.z_thres)
+        excluded = exclude_volumes(outliers, shells, min_slices=self.inputs.min_slices)
+
+        self._results["out_file"] = str(cwd / "dwi_slice_outliers.tsv")
+        write_tsv(
+            self._results["out_file"],
+            {
+                f"slice_{index:03d}": column
+                for index, column in enumerate(outliers.T.astype("uint8"))
+            },
+        )
+
+        self._results["exclude_ixs"] = np.flatnonzero(excluded).tolist()
+        self._results["out_exclude"] = str(cwd / "dwi_excluded_volumes.tsv")
+        write_tsv(
+            self._results["out_exclude"],
+            {
+                "b_value": bvals,
+                "shell": shells,
+                "outlier_slices": outliers.sum(axis=1),
+                "excluded": excluded,
+            },
+        )
+        return runtime
@@ -154,3 +154,54 @@ class AboutSummary(SummaryInterface):
             command=self.inputs.command,
             date=time.strftime("%Y-%m-%d %H:%M:%S %z"),
         )
+
+
+class _DeferredReportletOutputSpec(TraitedSpec):
+    out_report = File(exists=True, desc="placeholder reportlet with the rendering recipe")
+
+
+class _DeferredReportlet(SimpleInterface):
+    """
+    Record the inputs of a reportlet, so that it is rendered when reports are generated.
+
+    Subclasses mirror the inputs of the reportlet interface they defer
+    (``_interface``). See :py:func:`~dmriprep.utils.reports.write_recipe`.
+
+    """
+
+    output_spec = _DeferredReportletOutputSpec
+    _interface = None
+
+    def _run_interface(self, runtime):
+        from ..utils.reports import write_recipe
+
+        inputs = {
+            key: value
+            for key, value in self.inputs.get().items()
+            if isdefined(value) and key not in ("out_report", "trait_added", "trait_modified")
+        }
+        self._results["out_report"] = write_recipe(
+            os.path.join(runtime.cwd, "report.svg"), self._interface, inputs
+        )
+        return runtime
+
+
+def _reportlet_spec(path):
+    from importlib import import_module
+
+    module, _, name = path.rpartition(".")
+    return getattr(import_module(module), name).input_spec
+
+
+class DeferredBeforeAfter(_DeferredReportlet):
+    """A deferred :obj:`~niworkflows.interfaces.reportlets.registration.SimpleBeforeAfterRPT`."""
+
+    _interface = "niworkflows.interfaces.reportlets.registration.SimpleBeforeAfterRPT"
+    input_spec = _reportlet_spec(_interface)
+
+
+class DeferredShowMask(_DeferredReportlet):
+    """A deferred :obj:`~niworkflows.interfaces.reportlets.masks.SimpleShowMaskRPT`."""
+
+    _interface = "niworkflows.interfaces.reportlets.masks.SimpleShowMaskRPT"
+    input_spec = _reportlet_spec(_interface)
@@ -0,0 +1,101 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Test the derivatives data sink."""
+import os
+import shutil
+import numpy as np
+import nibabel as nb
+import pytest
+from dmriprep.interfaces import DerivativesDataSink
+
+
+def _source(tmp_path, qform_code=1):
+    source = tmp_path / "sub-01" / "dwi" / "sub-01_dwi.nii.gz"
+    source.parent.mkdir(parents=True)
+    rng = np.random.default_rng(1234)
+    img = nb.Nifti1Image(
+        rng.integers(0, 1000, size=(32, 32, 16, 8)).astype("int16"), np.eye(4)
+    )
+    img.header.set_xyzt_units("mm")
+    img.set_qform(np.eye(4), qform_code)
+    img.set_sform(np.eye(4), 1)
+    img.to_filename(source)
+    return source
+
+
+@pytest.fixture
+def copied(monkeypatch):
+    """Count the bytes copied by the base sink."""
+    copied = []
+
+    def _copyfileobj(fsrc, fdst, *args, **kwargs):
+        data = fsrc.read()
+        copied.append(len(data))
+        fdst.write(data)
+
+    monkeypatch.setattr(shutil, "copyfileobj", _copyfileobj)
+    return copied
+
+
+def test_link_compressed(tmp_path, copied):
+    """Check compressed inputs are linked without writing intermediate copies."""
+    os.chdir(tmp_path)
+    source = _source(tmp_path)
+    res = DerivativesDataSink(
+        base_directory=str(tmp_path),
+        desc="preproc",
+        compress=True,
+        link_mode="hardlink",
+        in_file=str(source),
+        source_file=str(source),
+    ).run()
+
+    assert res.outputs.materialization == "hardlink"
+    assert os.path.samefile(res.outputs.out_file, source)
+    assert sum(copied) < 1024
+    assert sorted(p.name for p in (tmp_path / "dmriprep" / "sub-01" / "dwi").iterdir()) == [
+        "sub-01_desc-preproc_dwi.json",
+        "sub-01_desc-preproc_dwi.nii.gz",
+    ]
+    assert not list(tmp_path.glob("_placeholder*"))
+
+
+def test_link_fixed_header(tmp_path):
+    """Check inputs with headers to be fixed are rewritten instead of linked."""
+    os.chdir(tmp_path)
+    source = _source(tmp_path, qform_code=0)
+    res = DerivativesDataSink(
+        base_directory=str(tmp_path),
+        desc="preproc",
+        compress=True,
+        link_mode="hardlink",
+        in_file=str(source),
+        source_file=str(source),
+    ).run()
+
+    assert res.outputs.materialization == "parallel-gzip"
+    assert res.outputs.fixed_hdr
+    assert not os.path.samefile(res.outputs.out_file, source)
+    out_img = nb.load(res.outputs.out_file)
+    assert int(out_img.header["qform_code"]) == 1
+    assert np.array_equal(out_img.dataobj, nb.load(source).dataobj)
@@ -53,6 +53,13 @@ class _CheckGradientTableOutputSpec(TraitedSpec):
     pole = traits.Tuple(traits.Float, traits.Float, traits.Float)
     b0_ixs = traits.List(traits.Int)
     b0_mask = traits.List(traits.Bool)
+    shells = traits.List(traits.Float, desc="b-value of each shell")
+    shell_ixs = traits.List(traits.Int, desc="index of the shell of each volume")
+    shell_counts = traits.List(traits.Int, desc="number of volumes in each shell")
+    shell_energy = traits.List(
+        traits.Float, desc="electrostatic energy of the directions in each shell"
+    )
+    is_shelled = traits.Bool(desc="whether the scheme is (multi-)shelled")
 
 
 class CheckGradientTable(SimpleInterface):
@@ -70,6 +77,12 @@ class CheckGradientTable(SimpleInterface):
     (0.0, 0.0, 0.0)
     >>> check.outputs.full_sphere
     True
+    >>> check.outputs.shells
+    [0.0, 1200.0, 2500.0]
+    >>> check.outputs.shell_counts
+    [12, 32, 61]
+    >>> check.outputs.is_shelled
+    True
 
     >>> check = CheckGradientTable(
     ...     dwi_file=str(data_dir / 'dwi.nii.gz'),
@@ -106,6 +119,11 @@ class CheckGradientTable(SimpleInterface):
         self._results["full_sphere"] = np.all(pole == 0.0)
         self._results["b0_mask"] = table.b0mask.tolist()
         self._results["b0_ixs"] = np.where(table.b0mask)[0].tolist()
+        self._results["shells"] = table.shells.tolist()
+        self._results["shell_ixs"] = table.shell_ixs.tolist()
+        self._results["shell_counts"] = table.shell_counts.tolist()
+        self._results["shell_energy"] = table.shell_energy.tolist()
+        self._results["is_shelled"] = table.is_shelled
 
         cwd = Path(runtime.cwd).absolute()
         if rasb_file is None:
@@ -59,6 +59,68 @@ def collect_data(bids_dir, participant_label, bids_validate=True):
     return subj_data, layout
 
 
+class LayoutCache:
+    """
+    Resolve the metadata and associated files of each BIDS file only once.
+
+    Every query to :py:class:`~bids.layout.BIDSLayout` for the metadata, b-vectors or
+    b-values of a file resolves the inheritance principle all over again.
+    This proxy memoizes those lookups, and forwards any other attribute to the
+    wrapped layout.
+
+    """
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.hits = 0
+        self.misses = 0
+        self._cache = {}
+
+    def __getattr__(self, name):
+        return getattr(self.layout, name)
+
+    def _lookup(self, method, path):
+        from .. import config
+
+        key = (method, str(path))
+        if key in self._cache:
+            self.hits += 1
+            config.loggers.workflow.debug(f"BIDS metadata cache hit: {method}({path})")
+        else:
+            self.misses += 1
+            config.loggers.workflow.debug(f"BIDS metadata cache miss: {method}({path})")
+            self._cache[key] = getattr(self.layout, method)(str(path))
+        return self._cache[key]
+
+    def get_metadata(self, path):
+        """Memoized :py:meth:`~bids.layout.BIDSLayout.get_metadata`."""
+        return dict(self._lookup("get_metadata", path))
+
+    def get_bvec(self, path):
+        """Memoized :py:meth:`~bids.layout.BIDSLayout.get_bvec`."""
+        return self._lookup("get_bvec", path)
+
+    def get_bval(self, path):
+        """Memoized :py:meth:`~bids.layout.BIDSLayout.get_bval`."""
+        return self._lookup("get_bval", path)
+
+
+_layout_cache = None
+
+
+def get_layout_cache(layout=None):
+    """Return the :py:class:`LayoutCache` that workflow builders share for ``layout``."""
+    global _layout_cache
+    if layout is None:
+        from .. import config
+
+        layout = config.execution.layout
+
+    if _layout_cache is None or _layout_cache.layout is not layout:
+        _layout_cache = LayoutCache(layout)
+    return _layout_cache
+
+
 def write_derivative_description(bids_dir, deriv_dir):
     from ..__about__ import __version__, __url__, DOWNLOAD_URL
 
@@ -105,10 +167,22 @@ def write_derivative_description(bids_dir, deriv_dir):
         json.dump(desc, fobj, indent=4)
 
 
-def validate_input_dir(exec_env, bids_dir, participant_label):
+def validate_input_dir(exec_env, bids_dir, participant_label, cache_dir=None, nprocs=1):
+    """
+    Run ``bids-validator`` on the data of the selected participants.
+
+    Participants pending validation are split into at most ``nprocs`` batches,
+    each validated by one ``bids-validator`` run (in parallel) that ignores all
+    other participants.
+    When ``cache_dir`` is given, the fingerprint of each participant that passed
+    validation is stored there, and participants whose files have not changed
+    since are not validated again.
+
+    """
     # Ignore issues and warnings that should not influence dMRIPrep
     import tempfile
     import subprocess
+    from concurrent.futures import ThreadPoolExecutor
 
     validator_config_dict = {
         "ignore": [
@@ -151,9 +225,11 @@ def validate_input_dir(exec_env, bids_dir, participant_label):
         "error": ["NO_T1W"],
         "ignoredFiles": ["/dataset_description.json", "/participants.tsv"],
     }
+    bids_dir = Path(bids_dir)
+    all_subs = set([s.name[4:] for s in bids_dir.glob("sub-*")])
+    selected_subs = all_subs
     # Limit validation only to data from requested participants
     if participant_label:
-        all_subs = set([s.name[4:] for s in bids_dir.glob("sub-*")])
         selected_subs = set(
             [s[4:] if s.startswith("sub-") else s for s in participant_label]
         )
@@ -180,17 +256,99 @@ def validate_input_dir(exec_env, bids_dir, participant_label):
                 )
             raise RuntimeError(error_msg % ",".join(bad_labels))
 
-        ignored_subs = all_subs.difference(selected_subs)
-        if ignored_subs:
-            for sub in ignored_subs:
-                validator_config_dict["ignoredFiles"].append(f"/sub-{sub}/**")
-    with tempfile.NamedTemporaryFile("w+") as temp:
-        temp.write(json.dumps(validator_config_dict))
-        temp.flush()
+    # Only validate subjects that changed since their last successful validation
+    cache_file = Path(cache_dir) / "bids_validation.json" if cache_dir else None
+    cache = {}
+    if cache_file is not None and cache_file.exists():
+        try:
+            cache = json.loads(cache_file.read_text())
+        except ValueError:
+            cache = {}
+
+    fingerprints = {
+        sub: _subject_fingerprint(bids_dir, sub, validator_config_dict)
+        for sub in sorted(selected_subs)
+    }
+    pending = [sub for sub, fp in fingerprints.items() if cache.get(sub) != fp]
+    if not pending:
+        print(
+            "BIDS validation results are cached for all participants, skipping.",
+            file=sys.stderr,
+        )
+        return
+
+    def _validate(batch):
+        config = dict(validator_config_dict)
+        config["ignoredFiles"] = validator_config_dict["ignoredFiles"] + [
+            f"/sub-{sub}/**" for sub in sorted(all_subs.difference(batch))
+        ]
+        with tempfile.NamedTemporaryFile("w+", suffix=".json") as temp:
+            temp.write(json.dumps(config))
+            temp.flush()
+            cmd = ["bids-validator", str(bids_dir), "-c", temp.name]
+            proc = subprocess.run(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                universal_newlines=True,
+            )
+        return batch, cmd, proc
+
+    # Every run walks the whole dataset, so keep their number down to nprocs
+    nbatches = min(max(nprocs, 1), len(pending))
+    batches = [pending[i::nbatches] for i in range(nbatches)]
+
+    failed = None
+    with ThreadPoolExecutor(max_workers=nbatches) as pool:
         try:
-            subprocess.check_call(["bids-validator", bids_dir, "-c", temp.name])
+            for batch, cmd, proc in pool.map(_validate, batches):
+                print(proc.stdout, end="")
+                if proc.returncode:
+                    for subject in batch:
+                        cache.pop(subject, None)
+                    failed = failed or subprocess.CalledProcessError(
+                        proc.returncode, cmd, output=proc.stdout
+                    )
+                else:
+                    cache.update({sub: fingerprints[sub] for sub in batch})
         except FileNotFoundError:
             print("bids-validator does not appear to be installed", file=sys.stderr)
+            return
+
+    if cache_file is not None:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        cache_file.write_text(json.dumps(cache, indent=2, sort_keys=True))
+
+    if failed is not None:
+        raise failed
+
+
+def _subject_fingerprint(bids_dir, subject, validator_config):
+    """
+    Summarize the files that determine the validation of one subject.
+
+    The fingerprint covers the validator configuration (but the list of ignored
+    files), and the relative path, size and modification time of the subject's files
+    and of the top-level files that may be inherited by them.
+
+    """
+    from hashlib import sha1
+
+    bids_dir = Path(bids_dir)
+    fingerprint = sha1(
+        json.dumps(
+            {k: v for k, v in validator_config.items() if k != "ignoredFiles"},
+            sort_keys=True,
+        ).encode()
+    )
+    files = sorted(f for f in bids_dir.iterdir() if f.is_file())
+    files += sorted(f for f in (bids_dir / f"sub-{subject}").rglob("*") if f.is_file())
+    for path in files:
+        stat = path.stat()
+        fingerprint.update(
+            f"{path.relative_to(bids_dir)}|{stat.st_size}|{stat.st_mtime_ns}\n".encode()
+        )
+    return fingerprint.hexdigest()
 
 
 def _get_shub_version(singularity_url):
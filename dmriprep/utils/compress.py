@@ -0,0 +1,130 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Parallel gzip compression of (large) derivatives."""
+import os
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BLOCK_SIZE = 2 ** 24
+"""Size (in bytes) of the blocks compressed independently (16 MiB)."""
+
+COMPRESSLEVEL = 6
+"""Default compression level (same as zlib's)."""
+
+
+def _gzip_member(block, compresslevel=COMPRESSLEVEL):
+    """Compress a block into a complete gzip member (header, deflate stream, trailer)."""
+    # wbits=31 generates the gzip container, with zero mtime and no file name,
+    # so that identical inputs produce identical outputs.
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 31)
+    return compressor.compress(block) + compressor.flush()
+
+
+def parallel_gzip(
+    in_file,
+    out_file=None,
+    compresslevel=COMPRESSLEVEL,
+    num_threads=None,
+    block_size=BLOCK_SIZE,
+):
+    """
+    Compress a file into a multi-member gzip stream, compressing blocks concurrently.
+
+    The input is split into blocks of ``block_size`` bytes, each block is compressed
+    into an independent gzip member on a thread pool (:py:mod:`zlib` releases the GIL
+    while compressing), and the members are written out in order.
+    Concatenated gzip members are a valid gzip stream (:rfc:`1952`), which standard
+    readers (``gzip``, ``zcat``, :py:mod:`gzip`, nibabel) decompress transparently.
+    At most ``2 * num_threads`` blocks are held in memory at any time.
+
+    Parameters
+    ----------
+    in_file : :obj:`os.PathLike`
+        The file to be compressed.
+    out_file : :obj:`os.PathLike`
+        The destination file. Defaults to ``in_file`` with a ``.gz`` extension appended.
+    compresslevel : :obj:`int`
+        The compression level, from 1 (fastest) to 9 (smallest).
+    num_threads : :obj:`int`
+        Number of compression threads. Defaults to the number of CPUs.
+    block_size : :obj:`int`
+        Size (in bytes) of the blocks compressed independently.
+
+    Returns
+    -------
+    out_file : :obj:`str`
+        The path of the compressed file.
+
+    Examples
+    --------
+    >>> import gzip
+    >>> os.chdir(tmpdir)
+    >>> data = os.urandom(1000) * 100
+    >>> _ = Path("data.bin").write_bytes(data)
+    >>> out_file = parallel_gzip("data.bin", num_threads=2, block_size=4096)
+    >>> out_file
+    'data.bin.gz'
+    >>> gzip.decompress(Path(out_file).read_bytes()) == data
+    True
+
+    """
+    out_file = str(out_file or f"{in_file}.gz")
+    num_threads = num_threads or os.cpu_count() or 1
+
+    with open(in_file, "rb") as f_in, open(out_file, "wb") as f_out:
+        if num_threads < 2:
+            for block in iter(lambda: f_in.read(block_size), b""):
+                f_out.write(_gzip_member(block, compresslevel))
+            return out_file
+
+        with ThreadPoolExecutor(max_workers=num_threads) as pool:
+            pending = deque()
+            for block in iter(lambda: f_in.read(block_size), b""):
+                pending.append(pool.submit(_gzip_member, block, compresslevel))
+                if len(pending) >= 2 * num_threads:
+                    f_out.write(pending.popleft().result())
+            while pending:
+                f_out.write(pending.popleft().result())
+    return out_file
+
+
+def compress_inplace(in_file, **kwargs):
+    """
+    Replace a file with its gzip-compressed version (see :py:func:`parallel_gzip`).
+
+    Examples
+    --------
+    >>> os.chdir(tmpdir)
+    >>> _ = Path("img.nii").write_bytes(b"0" * 1024)
+    >>> compress_inplace("img.nii")
+    'img.nii.gz'
+    >>> Path("img.nii").exists()
+    False
+
+    """
+    in_file = Path(in_file)
+    out_file = parallel_gzip(in_file, **kwargs)
+    in_file.unlink()
+    return out_file
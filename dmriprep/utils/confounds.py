@@ -0,0 +1,248 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Estimating confounding timeseries from head-motion parameters."""
+from pathlib import Path
+import numpy as np
+import nibabel as nb
+
+EDDY_PARAMETERS = ("trans_x", "trans_y", "trans_z", "rot_x", "rot_y", "rot_z")
+
+
+def read_eddy_parameters(in_file):
+    """
+    Read the rigid-body parameters estimated by ``eddy``.
+
+    The ``.eddy_parameters`` file has one row per volume, where the first three
+    columns are translations (mm) and the next three are rotations (radians).
+    The remaining columns (eddy-current fields) are discarded.
+
+    """
+    return np.loadtxt(str(in_file), ndmin=2)[:, :6]
+
+
+def rigid_matrices(params):
+    """
+    Compose one rigid-body transform per row of motion parameters.
+
+    All volumes are processed at once, rotations are composed as
+    :math:`R = R_x R_y R_z`.
+
+    Examples
+    --------
+    >>> rigid_matrices(np.zeros((2, 6))).tolist() == [np.eye(4).tolist()] * 2
+    True
+
+    >>> rigid_matrices([[1.0, 2.0, 3.0, 0.0, 0.0, 0.0]])[0, :3, 3].tolist()
+    [1.0, 2.0, 3.0]
+
+    >>> np.round(rigid_matrices([[0.0, 0.0, 0.0, 0.0, 0.0, np.pi / 2]])[0, :3, :3])
+    array([[ 0., -1.,  0.],
+           [ 1.,  0.,  0.],
+           [ 0.,  0.,  1.]])
+
+    """
+    params = np.array(params, dtype=float, ndmin=2)
+    nvols = params.shape[0]
+    cos = np.cos(params[:, 3:6])
+    sin = np.sin(params[:, 3:6])
+
+    rot_x = np.tile(np.eye(3), (nvols, 1, 1))
+    rot_x[:, 1, 1] = rot_x[:, 2, 2] = cos[:, 0]
+    rot_x[:, 1, 2] = -sin[:, 0]
+    rot_x[:, 2, 1] = sin[:, 0]
+
+    rot_y = np.tile(np.eye(3), (nvols, 1, 1))
+    rot_y[:, 0, 0] = rot_y[:, 2, 2] = cos[:, 1]
+    rot_y[:, 0, 2] = sin[:, 1]
+    rot_y[:, 2, 0] = -sin[:, 1]
+
+    rot_z = np.tile(np.eye(3), (nvols, 1, 1))
+    rot_z[:, 0, 0] = rot_z[:, 1, 1] = cos[:, 2]
+    rot_z[:, 0, 1] = -sin[:, 2]
+    rot_z[:, 1, 0] = sin[:, 2]
+
+    matrices = np.tile(np.eye(4), (nvols, 1, 1))
+    matrices[:, :3, :3] = rot_x @ rot_y @ rot_z
+    matrices[:, :3, 3] = params[:, :3]
+    return matrices
+
+
+def framewise_displacement(params, radius=50.0):
+    """
+    Calculate the framewise displacement (FD) as defined by Power et al. (2012).
+
+    Rotations are converted to displacements on the surface of a sphere of
+    ``radius`` millimeters. The first volume has no predecessor and is set to NaN.
+
+    Examples
+    --------
+    >>> params = [[0.0] * 6, [1.0, 0.0, 0.0, 0.0, 0.0, 0.0], [1.0, 0.0, 0.0, 0.01, 0.0, 0.0]]
+    >>> framewise_displacement(params).tolist()
+    [nan, 1.0, 0.5]
+
+    """
+    params = np.array(params, dtype=float, ndmin=2)
+    deltas = np.abs(np.diff(params[:, :6], axis=0))
+    deltas[:, 3:] *= radius
+    return np.hstack(([np.nan], deltas.sum(axis=1)))
+
+
+def mask_moments(mask_file=None, radius=50.0):
+    """
+    Calculate the second-order moments of the voxel coordinates within a mask.
+
+    Coordinates are given in millimeters, relative to the center of the field of
+    view (which is the reference ``eddy`` uses for rotations).
+    When no mask is given, a uniform ball of ``radius`` millimeters is assumed.
+
+    Returns
+    -------
+    moments : :obj:`numpy.ndarray`
+        The :math:`4 \\times 4` matrix :math:`E[x x^T]` with homogeneous coordinates.
+
+    Examples
+    --------
+    >>> mask_moments(radius=10.0).tolist()  # doctest: +NORMALIZE_WHITESPACE
+    [[20.0, 0.0, 0.0, 0.0], [0.0, 20.0, 0.0, 0.0],
+     [0.0, 0.0, 20.0, 0.0], [0.0, 0.0, 0.0, 1.0]]
+
+    """
+    if mask_file is None:
+        return np.diag([radius ** 2 / 5.0] * 3 + [1.0])
+
+    img = nb.load(str(mask_file))
+    mask = np.asanyarray(img.dataobj).reshape(img.shape[:3]) > 0.5
+    if not mask.any():
+        raise ValueError(f"Mask <{mask_file}> is empty.")
+
+    center = (np.array(mask.shape) - 1) * 0.5
+    coords = (np.argwhere(mask) - center) * np.array(img.header.get_zooms()[:3])
+    coords = np.hstack((coords, np.ones((coords.shape[0], 1))))
+    return coords.T @ coords / coords.shape[0]
+
+
+def rms_displacement(matrices, moments, relative=False):
+    """
+    Calculate the root-mean-square displacement of the voxels summarized by ``moments``.
+
+    The mean squared displacement under the affine difference :math:`M` is
+    :math:`\\mathrm{tr}(M S M^T)`, where :math:`S` are the second-order moments of the
+    coordinates, so the displacement is calculated for all volumes at once and
+    without ever visiting the voxels individually.
+
+    Parameters
+    ----------
+    matrices : :obj:`numpy.ndarray`
+        An :math:`N \\times 4 \\times 4` array of rigid-body transforms.
+    moments : :obj:`numpy.ndarray`
+        The output of :py:func:`mask_moments`.
+    relative : :obj:`bool`
+        Calculate displacements with respect to the previous volume instead of
+        the reference.
+
+    Examples
+    --------
+    >>> matrices = rigid_matrices([[0.0] * 6, [3.0, 4.0, 0.0, 0.0, 0.0, 0.0]])
+    >>> rms_displacement(matrices, mask_moments()).tolist()
+    [0.0, 5.0]
+
+    >>> rms_displacement(matrices, mask_moments(), relative=True).tolist()
+    [nan, 5.0]
+
+    """
+    if relative:
+        delta = np.diff(matrices[:, :3, :], axis=0)
+    else:
+        delta = matrices[:, :3, :] - np.eye(4)[np.newaxis, :3, :]
+
+    rms = np.sqrt(np.clip(np.einsum("nij,jk,nik->n", delta, moments, delta), 0, None))
+    return np.hstack(([np.nan], rms)) if relative else rms
+
+
+def eddy_confounds(
+    in_parameters, mask_file=None, in_movement_rms=None, radius=50.0, out_file=None
+):
+    """
+    Write a BIDS confounds file from the head-motion estimates of ``eddy``.
+
+    Parameters
+    ----------
+    in_parameters : :obj:`os.PathLike`
+        The ``.eddy_parameters`` file.
+    mask_file : :obj:`os.PathLike`
+        A mask (e.g., of the white matter) in the space of the DWI data, within which
+        the voxel displacements are averaged.
+    in_movement_rms : :obj:`os.PathLike`
+        The ``.eddy_movement_rms`` file, whose two columns are copied over.
+    radius : :obj:`float`
+        The head radius (mm) to calculate the framewise displacement.
+    out_file : :obj:`os.PathLike`
+        The path of the output TSV file.
+
+    """
+    if out_file is None:
+        out_file = Path("desc-confounds_timeseries.tsv").absolute()
+
+    params = read_eddy_parameters(in_parameters)
+    matrices = rigid_matrices(params)
+    moments = mask_moments(mask_file, radius=radius)
+
+    columns = dict(zip(EDDY_PARAMETERS, params.T))
+    columns["framewise_displacement"] = framewise_displacement(params, radius=radius)
+    columns["rms_displacement"] = rms_displacement(matrices, moments)
+    columns["rel_rms_displacement"] = rms_displacement(
+        matrices, moments, relative=True
+    )
+
+    if in_movement_rms is not None:
+        movement_rms = np.loadtxt(str(in_movement_rms), ndmin=2)
+        columns["eddy_movement_rms"] = movement_rms[:, 0]
+        columns["eddy_rel_movement_rms"] = movement_rms[:, 1]
+
+    write_tsv(out_file, columns)
+    return str(out_file)
+
+
+def write_tsv(out_file, columns):
+    """
+    Write a dictionary of equally long columns to a BIDS TSV file.
+
+    Missing values (NaN) are written as ``n/a``.
+
+    Examples
+    --------
+    >>> os.chdir(tmpdir)
+    >>> write_tsv("out.tsv", {"a": [np.nan, 1.0], "b": [2, 3]})
+    >>> print(Path("out.tsv").read_text().strip())
+    a	b
+    n/a	2
+    1	3
+
+    """
+    names = list(columns)
+    data = np.column_stack([np.asanyarray(columns[name], dtype=float) for name in names])
+    lines = ["\t".join(names)] + [
+        "\t".join("n/a" if np.isnan(value) else f"{value:.10g}" for value in row)
+        for row in data
+    ]
+    Path(out_file).write_text("\n".join(lines) + "\n")
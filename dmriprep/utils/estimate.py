@@ -0,0 +1,335 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""
+Pre-flight estimation of the resources a run will require.
+
+The cost model distributed with *dMRIPrep* is a rough default.
+It can be calibrated with the traces of past runs, which are written
+as ``<output_dir>/dmriprep/sub-<label>/log/<run_uuid>/trace.tsv``
+(see :py:class:`~dmriprep.engine.tracing.NodeTracer`)::
+
+    from bids.layout import BIDSLayout
+    from dmriprep.utils.estimate import fit_model, records_from_traces
+
+    records = records_from_traces("derivatives/dmriprep", BIDSLayout("bids"))
+    Path("cost_model.json").write_text(json.dumps(fit_model(records), indent=2))
+
+and then used with ``dmriprep --estimate-only --cost-model cost_model.json``.
+
+"""
+import json
+from pathlib import Path
+import numpy as np
+import nibabel as nb
+
+TARGETS = ("cpu_hours", "peak_mem_gb", "work_gb")
+"""Resources predicted by the cost model."""
+
+
+def load_model(filename=None):
+    """
+    Load a cost model (by default, the one distributed with *dMRIPrep*).
+
+    Examples
+    --------
+    >>> model = load_model()
+    >>> sorted(set(model) - {"description"})
+    ['cpu_hours', 'peak_mem_gb', 'work_gb']
+
+    """
+    if filename is None:
+        from pkg_resources import resource_filename as pkgrf
+
+        filename = pkgrf("dmriprep", "data/cost_model.json")
+    return json.loads(Path(filename).read_text())
+
+
+def subject_features(subject_data, run_reconall=False):
+    """
+    Calculate the features of a subject the cost model is based upon.
+
+    Only the headers of the images are read.
+
+    Parameters
+    ----------
+    subject_data : :obj:`dict`
+        The subject's inputs, as returned by :py:func:`~dmriprep.utils.bids.collect_data`.
+    run_reconall : :obj:`bool`
+        Whether surfaces will be reconstructed with FreeSurfer.
+
+    Examples
+    --------
+    >>> os.chdir(tmpdir)
+    >>> nb.Nifti1Image(np.zeros((10, 10, 10, 5), dtype="int16"), None).to_filename("dwi.nii.gz")
+    >>> nb.Nifti1Image(np.zeros((20, 20, 20), dtype="int16"), None).to_filename("t1w.nii.gz")
+    >>> features = subject_features({"dwi": ["dwi.nii.gz"] * 2, "t1w": ["t1w.nii.gz"]})
+    >>> [(key, features[key]) for key in sorted(features)]  # doctest: +NORMALIZE_WHITESPACE
+    [('dwi_max_mvox', 0.005), ('dwi_mvox', 0.01), ('dwi_runs', 2),
+     ('run_reconall', 0.0), ('t1w_mvox', 0.008)]
+
+    """
+    dwi_sizes = [_mvox(f) for f in subject_data.get("dwi", [])]
+    return {
+        "dwi_runs": len(dwi_sizes),
+        "dwi_mvox": float(np.sum(dwi_sizes)),
+        "dwi_max_mvox": float(np.max(dwi_sizes, initial=0)),
+        "t1w_mvox": float(np.sum([_mvox(f) for f in subject_data.get("t1w", [])])),
+        "run_reconall": float(run_reconall),
+    }
+
+
+def predict(features, model=None):
+    """
+    Predict the resources required given some features.
+
+    Examples
+    --------
+    >>> model = {"cpu_hours": {"intercept": 1.0, "dwi_mvox": 0.5}}
+    >>> predict({"dwi_mvox": 4.0}, model)
+    {'cpu_hours': 3.0}
+
+    """
+    model = model or load_model()
+    features = {"intercept": 1.0, **features}
+    return {
+        target: float(
+            sum(coeff * features.get(name, 0.0) for name, coeff in model[target].items())
+        )
+        for target in TARGETS
+        if target in model
+    }
+
+
+def fit_model(records, features=None):
+    """
+    Calibrate a cost model from the features and resources of recorded runs.
+
+    Coefficients are fit by non-negative least squares.
+
+    Parameters
+    ----------
+    records : :obj:`list` of :obj:`dict`
+        Each record contains the features of a subject (see :py:func:`subject_features`)
+        and the resources its processing took (see :py:data:`TARGETS`).
+    features : :obj:`list` of :obj:`str`
+        The features the model will use (all features in the records, by default).
+
+    Examples
+    --------
+    >>> records = [
+    ...     {"dwi_mvox": x, "cpu_hours": 1.0 + 0.5 * x, "work_gb": 2.0 * x}
+    ...     for x in (10.0, 20.0, 40.0)
+    ... ]
+    >>> model = fit_model(records)
+    >>> {k: round(v, 3) for k, v in model["cpu_hours"].items()}
+    {'intercept': 1.0, 'dwi_mvox': 0.5}
+    >>> {k: round(v, 3) for k, v in model["work_gb"].items()}
+    {'intercept': 0.0, 'dwi_mvox': 2.0}
+
+    Other coefficients are refit when one is constrained to zero:
+
+    >>> records = [
+    ...     {"dwi_mvox": x, "cpu_hours": 4.0 * x - 1.0} for x in (1.0, 2.0, 3.0)
+    ... ]
+    >>> {k: round(v, 3) for k, v in fit_model(records)["cpu_hours"].items()}
+    {'intercept': 0.0, 'dwi_mvox': 3.571}
+
+    """
+    from scipy.optimize import nnls
+
+    if features is None:
+        features = sorted(
+            {key for rec in records for key in rec if key not in TARGETS}
+            - {"subject", "nodes"}
+        )
+    names = ["intercept"] + list(features)
+    design = np.array(
+        [[1.0] + [float(rec.get(name, 0.0)) for name in features] for rec in records]
+    )
+
+    model = {}
+    for target in TARGETS:
+        rows = [i for i, rec in enumerate(records) if target in rec]
+        if not rows:
+            continue
+        values = np.array([records[i][target] for i in rows], dtype=float)
+        coeffs = nnls(design[rows], values)[0]
+        model[target] = dict(zip(names, coeffs.tolist()))
+    return model
+
+
+def trace_resources(trace_file):
+    """
+    Add up the resources a subject took, from the ``trace.tsv`` file of a run.
+
+    CPU time falls back to the wall time of nodes run without the resource monitor,
+    and the peak memory is only reported with it.
+    Traces of runs that reused cached results are incomplete, and ``None`` is returned.
+
+    Examples
+    --------
+    >>> os.chdir(tmpdir)
+    >>> _ = Path("trace.tsv").write_text(
+    ...     "node\\tinterface\\tdwi_run\\tstatus\\tstart\\tduration_s\\tcpu_time_s\\t"
+    ...     "peak_rss_gb\\tout_bytes\\n"
+    ...     "a\\tEddy\\tAP\\tend\\t0.0\\t3600\\t7200\\t2.5\\t1000000000\\n"
+    ...     "b\\tMerge\\tn/a\\tend\\t1.0\\t1800\\tn/a\\tn/a\\t500000000\\n"
+    ... )
+    >>> trace_resources("trace.tsv")
+    {'cpu_hours': 2.5, 'work_gb': 1.5, 'peak_mem_gb': 2.5}
+
+    """
+    lines = Path(trace_file).read_text().splitlines()
+    header = lines[0].split("\t")
+    rows = [dict(zip(header, line.split("\t"))) for line in lines[1:]]
+    if any(row["status"] == "cached" for row in rows):
+        return None
+
+    def _values(column):
+        return [float(row[column]) for row in rows if row.get(column, "n/a") != "n/a"]
+
+    cpu_time = sum(
+        float(row["cpu_time_s"] if row["cpu_time_s"] != "n/a" else row["duration_s"])
+        for row in rows
+    )
+    resources = {"cpu_hours": cpu_time / 3600, "work_gb": sum(_values("out_bytes")) / 1e9}
+    peak_mem = _values("peak_rss_gb")
+    if peak_mem:
+        resources["peak_mem_gb"] = max(peak_mem)
+    return resources
+
+
+def records_from_traces(output_dir, layout, run_reconall=False):
+    """
+    Gather the records of past runs, to calibrate a cost model with :py:func:`fit_model`.
+
+    Parameters
+    ----------
+    output_dir : :obj:`os.PathLike`
+        The ``dmriprep`` folder of the derivatives, where traces were written.
+    layout : :py:class:`~bids.layout.BIDSLayout`
+        The dataset the runs processed, from which features are calculated.
+    run_reconall : :obj:`bool`
+        Whether the runs reconstructed surfaces with FreeSurfer.
+
+    """
+    from .bids import collect_data
+
+    records = []
+    for trace_file in sorted(Path(output_dir).glob("sub-*/log/*/trace.tsv")):
+        resources = trace_resources(trace_file)
+        if resources is None:
+            continue
+        subject = trace_file.parents[2].name[4:]
+        features = subject_features(
+            collect_data(layout, subject)[0], run_reconall=run_reconall
+        )
+        records.append({"subject": subject, **features, **resources})
+    return records
+
+
+def estimate_workflow(workflow, layout, participants, model=None, run_reconall=False):
+    """
+    Estimate the resources each participant of a workflow will require.
+
+    Returns
+    -------
+    estimates : :obj:`list` of :obj:`dict`
+        One row per participant (with the number of nodes of its workflow), plus
+        a last row (``subject="total"``) adding up CPU time and disk space,
+        and taking the maximum of the peak memory.
+
+    """
+    from .bids import collect_data
+
+    model = model or load_model()
+    rows = []
+    for subject_id in participants:
+        features = subject_features(
+            collect_data(layout, subject_id)[0], run_reconall=run_reconall
+        )
+        subject_wf = workflow.get_node(f"single_subject_{subject_id}_wf")
+        rows.append(
+            {
+                "subject": subject_id,
+                "nodes": len(subject_wf._get_all_nodes()) if subject_wf else 0,
+                **features,
+                **predict(features, model),
+            }
+        )
+
+    rows.append(
+        {
+            "subject": "total",
+            "nodes": sum(row["nodes"] for row in rows),
+            "cpu_hours": sum(row["cpu_hours"] for row in rows),
+            "peak_mem_gb": max((row["peak_mem_gb"] for row in rows), default=0.0),
+            "work_gb": sum(row["work_gb"] for row in rows),
+        }
+    )
+    return rows
+
+
+def write_estimates(rows, filename):
+    """
+    Write estimates out as a TSV file, and return a printable summary.
+
+    Examples
+    --------
+    >>> os.chdir(tmpdir)
+    >>> row = {"nodes": 10, "cpu_hours": 1.5, "peak_mem_gb": 4.0, "work_gb": 8.25}
+    >>> rows = [{"subject": "01", **row}, {"subject": "total", **row}]
+    >>> print(write_estimates(rows, "estimates.tsv"))
+    subject  nodes  CPU (h)  peak RAM (GB)  work dir (GB)
+    01          10      1.5            4.0            8.2
+    total       10      1.5            4.0            8.2
+    >>> Path("estimates.tsv").read_text().splitlines()[0].split("\\t")[:3]
+    ['subject', 'nodes', 'cpu_hours']
+
+    """
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    lines = ["\t".join(columns)] + [
+        "\t".join(_format(row.get(col, "n/a")) for col in columns) for row in rows
+    ]
+    Path(filename).write_text("\n".join(lines) + "\n")
+
+    summary = [
+        f"{'subject':<7}  {'nodes':>5}  {'CPU (h)':>7}  "
+        f"{'peak RAM (GB)':>13}  {'work dir (GB)':>13}"
+    ] + [
+        f"{row['subject']:<7}  {row['nodes']:>5}  {row['cpu_hours']:>7.1f}  "
+        f"{row['peak_mem_gb']:>13.1f}  {row['work_gb']:>13.1f}"
+        for row in rows
+    ]
+    return "\n".join(summary)
+
+
+def _mvox(filename):
+    """Read the number of voxels (in millions) of an image from its header."""
+    return float(np.prod(nb.load(filename).shape)) / 1e6
+
+
+def _format(value):
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
@@ -0,0 +1,182 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""
+Cached content fingerprints of (large) files for Nipype's input hashing.
+
+With ``hash_method = content``, Nipype reads every byte of every input file
+each time it checks whether a node is up to date.
+The :py:class:`FingerprintCache` computes the digest of a file once, and stores it
+in a SQLite database keyed on the device, inode, size and modification time of
+the file, so that only files that changed since are read again.
+Digests are the same MD5 sums Nipype calculates, so existing working
+directories remain valid.
+
+"""
+import hashlib
+import os
+import sqlite3
+from functools import partial
+from pathlib import Path
+
+CHUNK_SIZE = 2 ** 20
+"""Size (in bytes) of the chunks read while digesting a file (1 MiB)."""
+
+_SCHEMA = """\
+CREATE TABLE IF NOT EXISTS fingerprints (
+    device INTEGER,
+    inode INTEGER,
+    size INTEGER,
+    mtime_ns INTEGER,
+    digest TEXT,
+    PRIMARY KEY (device, inode)
+)"""
+
+_CACHE = None
+_nipype_initializer = None
+
+
+def file_digest(path, crypto=hashlib.md5, chunk_size=CHUNK_SIZE):
+    """
+    Calculate the digest of a file, streaming it in chunks.
+
+    Examples
+    --------
+    >>> os.chdir(tmpdir)
+    >>> _ = Path("data.bin").write_bytes(b"dmriprep")
+    >>> file_digest("data.bin")
+    '93621953cff54314dbe38cf6e702816a'
+
+    """
+    digest = crypto()
+    with open(path, "rb") as fobj:
+        for chunk in iter(partial(fobj.read, chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FingerprintCache:
+    """
+    A persistent cache of file digests.
+
+    The database may be shared by several processes: each process opens its own
+    connection, and concurrent writers wait for each other.
+
+    Examples
+    --------
+    >>> os.chdir(tmpdir)
+    >>> _ = Path("data.bin").write_bytes(b"dmriprep")
+    >>> cache = FingerprintCache("fingerprints.sqlite")
+    >>> cache.digest("data.bin")
+    '93621953cff54314dbe38cf6e702816a'
+    >>> cache.misses
+    1
+    >>> cache.digest("data.bin") == cache.digest(Path("data.bin").absolute())
+    True
+    >>> cache.misses
+    1
+
+    A new modification time invalidates the stored digest.
+
+    >>> os.utime("data.bin", ns=(0, 0))
+    >>> cache.digest("data.bin")
+    '93621953cff54314dbe38cf6e702816a'
+    >>> cache.misses
+    2
+
+    """
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self.misses = 0
+        self._conn = None
+        self._pid = None
+
+    @property
+    def connection(self):
+        """Open the database lazily, and once per process."""
+        if self._conn is None or self._pid != os.getpid():
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_SCHEMA)
+            self._pid = os.getpid()
+        return self._conn
+
+    def digest(self, path):
+        """Return the MD5 digest of ``path``, reading it only if it changed."""
+        stat = os.stat(path)
+        key = (stat.st_dev, stat.st_ino)
+        row = self.connection.execute(
+            "SELECT size, mtime_ns, digest FROM fingerprints "
+            "WHERE device = ? AND inode = ?",
+            key,
+        ).fetchone()
+        if row is not None and row[:2] == (stat.st_size, stat.st_mtime_ns):
+            return row[2]
+
+        self.misses += 1
+        digest = file_digest(path)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?)",
+            key + (stat.st_size, stat.st_mtime_ns, digest),
+        )
+        return digest
+
+
+def hash_infile(afile, chunk_len=8192, crypto=hashlib.md5, raise_notfound=False):
+    """Drop-in replacement of :py:func:`nipype.utils.filemanip.hash_infile`."""
+    from nipype.utils.filemanip import hash_infile as _hash_infile
+
+    if _CACHE is None or crypto is not hashlib.md5 or not os.path.isfile(afile):
+        return _hash_infile(
+            afile, chunk_len=chunk_len, crypto=crypto, raise_notfound=raise_notfound
+        )
+    return _CACHE.digest(afile)
+
+
+def install(db_path):
+    """
+    Back Nipype's content hashing with a :py:class:`FingerprintCache`.
+
+    The cache is installed in the current process, and in the workers of the
+    process pools that the ``MultiProc`` plugin creates afterwards.
+
+    """
+    from nipype.interfaces.base import specs, support
+    from nipype.pipeline.plugins import multiproc
+
+    global _CACHE, _nipype_initializer
+    _CACHE = FingerprintCache(db_path)
+    specs.hash_infile = support.hash_infile = hash_infile
+    if _nipype_initializer is None:
+        _nipype_initializer = multiproc.process_initializer
+    multiproc.process_initializer = partial(_init_worker, db_path=str(db_path))
+
+
+def _init_worker(cwd, db_path):
+    """Initialize a pool worker, then install the fingerprint cache in it."""
+    from nipype.pipeline.plugins import multiproc
+
+    # Forked workers inherit the patched module, fresh ones import the original
+    (_nipype_initializer or multiproc.process_initializer)(cwd)
+    install(db_path)
@@ -25,6 +25,12 @@ import numpy as np
 import nibabel as nb
 from nipype.utils.filemanip import fname_presuffix
 
+PRECISIONS = ("native", "float32", "int16")
+"""Storage policies for floating-point images (see :py:func:`quantize`)."""
+
+_PRECISION_DTYPES = {"float32": np.dtype("float32"), "int16": np.dtype("int16")}
+_INT16_RANGE = 32767
+
 
 def extract_b0(in_file, b0_ixs, out_path=None):
     """Extract the *b0* volumes from a DWI dataset."""
@@ -41,7 +47,7 @@ def extract_b0(in_file, b0_ixs, out_path=None):
     return out_path
 
 
-def rescale_b0(in_file, mask_file, out_path=None):
+def rescale_b0(in_file, mask_file, out_path=None, precision="native"):
     """Rescale the input volumes using the median signal intensity."""
     if out_path is None:
         out_path = fname_presuffix(in_file, suffix="_rescaled", use_ext=True)
@@ -52,7 +58,6 @@ def rescale_b0(in_file, mask_file, out_path=None):
 
     mask_data = nb.load(mask_file).get_fdata() > 0
 
-    dtype = img.get_data_dtype()
     data = img.get_fdata()
 
     median_signal = np.median(data[mask_data, ...], axis=0)
@@ -60,11 +65,11 @@ def rescale_b0(in_file, mask_file, out_path=None):
     signal_drift = median_signal[0] / median_signal
     data /= signal_drift
 
-    nb.Nifti1Image(data.astype(dtype), img.affine, img.header).to_filename(out_path)
+    _write_result(data, img, out_path, precision=precision)
     return out_path, signal_drift.tolist()
 
 
-def median(in_file, out_path=None):
+def median(in_file, out_path=None, precision="native"):
     """Average a 4D dataset across the last dimension using median."""
     if out_path is None:
         out_path = fname_presuffix(in_file, suffix="_b0ref", use_ext=True)
@@ -76,10 +81,167 @@ def median(in_file, out_path=None):
         nb.squeeze_image(img).to_filename(out_path)
         return out_path
 
-    dtype = img.get_data_dtype()
     median_data = np.median(img.get_fdata(), axis=-1)
+    _write_result(median_data, img, out_path, precision=precision)
+    return out_path
 
-    nb.Nifti1Image(median_data.astype(dtype), img.affine, img.header).to_filename(
-        out_path
+
+def needs_quantize(dtype, precision):
+    """
+    Check whether data of type ``dtype`` would be stored more compactly by ``precision``.
+
+    Only floating-point data are ever quantized.
+
+    Examples
+    --------
+    >>> needs_quantize("float64", "float32")
+    True
+    >>> needs_quantize("float32", "float32")
+    False
+    >>> needs_quantize("float32", "int16")
+    True
+    >>> needs_quantize("uint8", "int16")
+    False
+    >>> needs_quantize("float64", "native")
+    False
+
+    """
+    dtype = np.dtype(dtype)
+    return (
+        precision != "native"
+        and dtype.kind == "f"
+        and dtype.itemsize > _PRECISION_DTYPES[precision].itemsize
+    )
+
+
+def quantize(img, out_path, precision="int16"):
+    """
+    Write a floating-point image with a more compact data type, one volume at a time.
+
+    With ``precision="int16"``, a first pass over the volumes finds the range of the
+    data, and the second pass writes them as 16-bit integers with the ``scl_slope``
+    and ``scl_inter`` mapping that range (NIfTI allows a single scaling per file).
+    With ``precision="float32"``, volumes are just cast.
+    Volumes are read and written one by one, so that the full series is never
+    held in memory when ``img`` is backed by a file.
+
+    Parameters
+    ----------
+    img : :obj:`~nibabel.nifti1.Nifti1Image`
+        The image to be stored.
+    out_path : :obj:`os.PathLike`
+        The output file (it can be compressed).
+    precision : :obj:`str`
+        One of ``"float32"`` or ``"int16"``.
+
+    Returns
+    -------
+    report : :obj:`dict`
+        The maximum absolute and root-mean-square quantization errors, and the
+        ratio between the sizes of the stored and the original data.
+
+    Examples
+    --------
+    >>> os.chdir(tmpdir)
+    >>> data = np.random.default_rng(0).normal(1000, 100, size=(10, 10, 10, 4))
+    >>> report = quantize(nb.Nifti1Image(data, np.eye(4)), "quantized.nii.gz")
+    >>> report["size_ratio"]
+    0.25
+    >>> bool(report["max_abs_error"] <= 0.51 * (data.max() - data.min()) / 65534)
+    True
+    >>> img = nb.load("quantized.nii.gz")
+    >>> img.get_data_dtype().name, img.shape
+    ('int16', (10, 10, 10, 4))
+    >>> bool(np.allclose(img.get_fdata(), data, atol=report["max_abs_error"] + 1e-6))
+    True
+
+    >>> quantize(nb.Nifti1Image(data, np.eye(4)), "single.nii", "float32")["size_ratio"]
+    0.5
+
+    """
+    from nibabel.openers import ImageOpener
+
+    out_dtype = _PRECISION_DTYPES[precision]
+    in_dtype = np.dtype(getattr(img.dataobj, "dtype", img.get_data_dtype()))
+
+    slope, inter = 1.0, 0.0
+    if out_dtype.kind == "i":
+        lo, hi = np.inf, -np.inf
+        for vol in _iter_volumes(img):
+            lo, hi = min(lo, vol.min()), max(hi, vol.max())
+        if hi > lo:
+            slope = (hi - lo) / (2 * _INT16_RANGE)
+        inter = 0.5 * (hi + lo)
+        # The header stores the scaling in single precision
+        slope, inter = float(np.float32(slope)), float(np.float32(inter))
+
+    hdr = img.header.copy()
+    hdr.set_data_shape(img.shape)
+    hdr.set_data_dtype(out_dtype)
+    hdr.set_slope_inter(slope, inter)
+    hdr.set_data_offset(hdr.single_vox_offset + hdr.extensions.get_sizeondisk())
+
+    max_error, sq_error, nvoxels = 0.0, 0.0, 0
+    with ImageOpener(out_path, "wb") as fobj:
+        hdr.write_to(fobj)
+        fobj.write(b"\x00" * (int(hdr.get_data_offset()) - fobj.tell()))
+        for vol in _iter_volumes(img):
+            if out_dtype.kind == "i":
+                stored = np.clip(
+                    np.rint((vol - inter) / slope), -_INT16_RANGE, _INT16_RANGE
+                ).astype(out_dtype)
+                error = vol - (stored * slope + inter)
+            else:
+                stored = vol.astype(out_dtype)
+                error = vol - stored
+
+            fobj.write(stored.astype(hdr.get_data_dtype()).tobytes(order="F"))
+            max_error = max(max_error, float(np.abs(error).max()))
+            sq_error += float((error ** 2).sum())
+            nvoxels += error.size
+
+    return {
+        "precision": precision,
+        "max_abs_error": max_error,
+        "rmse": float(np.sqrt(sq_error / max(nvoxels, 1))),
+        "size_ratio": out_dtype.itemsize / in_dtype.itemsize,
+    }
+
+
+def _iter_volumes(img):
+    """
+    Generate the volumes of a 4D image (or the full 3D image) as float64 arrays.
+
+    Non-finite values are zeroed, so that they do not blow up the scaling range.
+
+    """
+    if len(img.shape) != 4:
+        yield np.nan_to_num(
+            np.asanyarray(img.dataobj, dtype="float64"), posinf=0.0, neginf=0.0
+        )
+        return
+
+    for i in range(img.shape[-1]):
+        yield np.nan_to_num(
+            np.asanyarray(img.dataobj[..., i], dtype="float64"), posinf=0.0, neginf=0.0
+        )
+
+
+def _write_result(data, ref_img, out_path, precision="native"):
+    """
+    Write floating-point results, casting to the reference type or quantizing.
+
+    The policy applies to the type the reference is stored with (not to the type of
+    the computation), so that, e.g., integer inputs are never written out as floats.
+
+    """
+    if not needs_quantize(ref_img.get_data_dtype(), precision):
+        dtype = ref_img.get_data_dtype()
+        nb.Nifti1Image(data.astype(dtype), ref_img.affine, ref_img.header).to_filename(
+            out_path
+        )
+        return None
+
+    return quantize(
+        nb.Nifti1Image(data, ref_img.affine, ref_img.header), out_path, precision
     )
-    return out_path
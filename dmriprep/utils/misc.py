@@ -21,6 +21,14 @@
 #     https://www.nipreps.org/community/licensing/
 #
 """Miscellaneous utilities."""
+import os
+
+LINK_MODES = ("copy", "hardlink", "reflink", "auto")
+"""Strategies to materialize a file at a new path (see :py:func:`link_file`)."""
+
+_FICLONE = 0x40049409  # Linux ioctl to clone the extents of a file
+
+_PICKLE_MAGIC = b"DMRIPKL\x05"
 
 
 def check_deps(workflow):
@@ -51,3 +59,157 @@ def sub_prefix(subid):
 
     """
     return f"sub-{subid.replace('sub-', '')}"
+
+
+def reflink(src, dst):
+    """
+    Clone ``src`` into ``dst``, sharing their data blocks with copy-on-write semantics.
+
+    Raises :obj:`OSError` if the filesystem (or the OS) does not support reflinks.
+
+    """
+    import fcntl
+
+    with open(src, "rb") as f_src, open(dst, "wb") as f_dst:
+        try:
+            fcntl.ioctl(f_dst.fileno(), _FICLONE, f_src.fileno())
+        except OSError:
+            f_dst.close()
+            os.unlink(dst)
+            raise
+
+
+def link_file(src, dst, mode="auto"):
+    """
+    Materialize ``src`` at ``dst`` without copying data, if possible.
+
+    Parameters
+    ----------
+    src : :obj:`os.PathLike`
+        The existing file.
+    dst : :obj:`os.PathLike`
+        The path to materialize, which must not exist.
+    mode : :obj:`str`
+        ``"reflink"`` (copy-on-write clone), ``"hardlink"``, or ``"auto"`` to try
+        a reflink first and then a hardlink. ``"copy"`` never links.
+
+    Returns
+    -------
+    method : :obj:`str` or ``None``
+        The method that succeeded, or ``None`` if the file could not be linked
+        (e.g., ``src`` and ``dst`` are on different filesystems), in which
+        case the caller should copy it.
+
+    Examples
+    --------
+    >>> os.chdir(tmpdir)
+    >>> _ = Path("src.txt").write_text("data")
+    >>> link_file("src.txt", "dst.txt", mode="hardlink")
+    'hardlink'
+    >>> os.stat("src.txt").st_ino == os.stat("dst.txt").st_ino
+    True
+    >>> link_file("src.txt", "copy.txt", mode="copy") is None
+    True
+
+    """
+    methods = {
+        "copy": (),
+        "hardlink": ("hardlink",),
+        "reflink": ("reflink",),
+        "auto": ("reflink", "hardlink"),
+    }[mode]
+
+    for method in methods:
+        try:
+            if method == "reflink":
+                reflink(src, dst)
+            else:
+                os.link(src, dst)
+        except OSError:
+            continue
+        return method
+    return None
+
+
+def dump_pickle(obj, filename):
+    """
+    Serialize ``obj`` into a file, with pickle protocol 5 and out-of-band buffers.
+
+    Large buffers (e.g., the data of :obj:`numpy.ndarray` objects) are not copied
+    into the pickle stream, but written out raw after it, so that
+    :py:func:`load_pickle` can map them back without copies.
+
+    Returns
+    -------
+    nbytes : :obj:`int`
+        The size of the file written.
+    nbuffers : :obj:`int`
+        The number of out-of-band buffers.
+
+    Examples
+    --------
+    >>> os.chdir(tmpdir)
+    >>> obj = {"name": "dwi", "data": np.arange(1000, dtype="float32")}
+    >>> nbytes, nbuffers = dump_pickle(obj, "obj.pkl")
+    >>> nbuffers
+    1
+    >>> nbytes == os.path.getsize("obj.pkl")
+    True
+    >>> out = load_pickle("obj.pkl")
+    >>> out["name"], bool(np.all(out["data"] == obj["data"]))
+    ('dwi', True)
+
+    """
+    import pickle
+    import struct
+
+    buffers = []
+    if pickle.HIGHEST_PROTOCOL >= 5:
+        payload = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    else:  # Python 3.7
+        payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    buffers = [buf.raw() for buf in buffers]
+
+    lengths = [len(payload)] + [buf.nbytes for buf in buffers]
+    with open(filename, "wb") as fobj:
+        fobj.write(_PICKLE_MAGIC)
+        fobj.write(struct.pack(f"<I{len(lengths)}Q", len(buffers), *lengths))
+        fobj.write(payload)
+        for buf in buffers:
+            fobj.write(buf)
+    return len(_PICKLE_MAGIC) + 4 + 8 * len(lengths) + sum(lengths), len(buffers)
+
+
+def load_pickle(filename):
+    """
+    Load an object serialized with :py:func:`dump_pickle`.
+
+    The file is memory-mapped (copy-on-write), so that the out-of-band buffers
+    are not read until accessed, nor copied.
+
+    """
+    import mmap
+    import pickle
+    import struct
+
+    with open(filename, "rb") as fobj:
+        mapped = mmap.mmap(fobj.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    view = memoryview(mapped)
+    offset = len(_PICKLE_MAGIC)
+    if bytes(view[:offset]) != _PICKLE_MAGIC:
+        raise ValueError(f"<{filename}> was not written by dump_pickle.")
+
+    (nbuffers,) = struct.unpack_from("<I", view, offset)
+    offset += 4
+    lengths = struct.unpack_from(f"<{nbuffers + 1}Q", view, offset)
+    offset += 8 * len(lengths)
+
+    chunks = []
+    for length in lengths:
+        chunks.append(view[offset : offset + length])
+        offset += length
+
+    if nbuffers:
+        return pickle.loads(chunks[0], buffers=chunks[1:])
+    return pickle.loads(chunks[0])
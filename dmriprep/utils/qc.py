@@ -0,0 +1,274 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Quality control of diffusion MRI series."""
+import warnings
+import numpy as np
+import nibabel as nb
+
+
+CARPET_ROWS = 2000
+"""Maximum number of voxels sampled into the carpet plot."""
+
+OUTLIER_Z = 4.0
+"""Robust standard deviations below which a slice has signal dropout (as eddy's ``--ol_nstd``)."""
+
+
+def iter_volumes(img, dtype="float32"):
+    """
+    Iterate over the volumes of a 4D image, reading one volume at a time.
+
+    Examples
+    --------
+    >>> img = nb.Nifti1Image(np.arange(24, dtype="int16").reshape(2, 2, 2, 3), np.eye(4))
+    >>> [float(vol.sum()) for vol in iter_volumes(img)]
+    [84.0, 92.0, 100.0]
+
+    """
+    for index in range(img.shape[-1]):
+        yield np.asanyarray(img.dataobj[..., index], dtype=dtype)
+
+
+def shell_zscores(values, shells):
+    """
+    Standardize a (volumes x features) matrix robustly, within each shell.
+
+    Each column is centered on the median of the volumes of the same shell
+    and scaled by the corresponding median absolute deviation.
+    Features with no spread within a shell are given a zero score.
+
+    Examples
+    --------
+    >>> values = np.array([[1.0, 10.0], [1.0, 12.0], [1.0, 11.0], [5.0, 11.0]])
+    >>> np.round(shell_zscores(values, [0, 0, 0, 1]), 2).tolist()
+    [[0.0, -0.67], [0.0, 0.67], [0.0, 0.0], [0.0, 0.0]]
+
+    """
+    values = np.asanyarray(values, dtype=float)
+    shells = np.asanyarray(shells)
+    zscores = np.zeros_like(values)
+    for label in np.unique(shells):
+        rows = shells == label
+        with warnings.catch_warnings():
+            # Features that are all-NaN (e.g., slices outside the mask) are dismissed
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            center = np.nanmedian(values[rows], axis=0)
+            spread = 1.4826 * np.nanmedian(np.abs(values[rows] - center), axis=0)
+
+        valid = spread > 0
+        shell_values = values[rows][:, valid]
+        zscores[np.ix_(rows, valid)] = (shell_values - center[valid]) / spread[valid]
+    return zscores
+
+
+def dropout_outliers(slice_means, shells, z_thres=OUTLIER_Z):
+    """
+    Flag slices with signal dropout, given a (volumes x slices) matrix of mean signal.
+
+    A slice is an outlier when its mean signal falls more than ``z_thres`` robust
+    standard deviations below the same slice of the volumes of the same shell.
+    Slices without brain voxels (NaN) are never flagged.
+
+    Examples
+    --------
+    >>> slice_means = np.array([
+    ...     [100.0, 98.0, np.nan],
+    ...     [101.0, 99.0, np.nan],
+    ...     [99.0, 40.0, np.nan],
+    ...     [102.0, 97.0, np.nan],
+    ...     [100.0, 150.0, np.nan],
+    ... ])
+    >>> dropout_outliers(slice_means, [0, 0, 0, 0, 0]).astype(int).tolist()
+    [[0, 0, 0], [0, 0, 0], [0, 1, 0], [0, 0, 0], [0, 0, 0]]
+
+    """
+    return np.nan_to_num(shell_zscores(slice_means, shells)) < -z_thres
+
+
+def exclude_volumes(outliers, shells, min_slices=1):
+    """
+    Select the volumes to exclude, given the (volumes x slices) matrix of outliers.
+
+    Volumes with ``min_slices`` or more outlier slices are excluded, but at least
+    one volume of each shell (including the :math:`b=0` "shell") is always retained,
+    namely the one with the fewest outlier slices.
+
+    Examples
+    --------
+    >>> outliers = np.array([[0, 0], [1, 0], [1, 1], [0, 1], [1, 1]], dtype=bool)
+    >>> exclude_volumes(outliers, [0, 1, 1, 1, 2]).tolist()
+    [False, False, True, True, False]
+    >>> exclude_volumes(outliers, [0, 1, 1, 1, 2], min_slices=2).tolist()
+    [False, False, True, False, False]
+
+    """
+    counts = np.asanyarray(outliers).sum(axis=1)
+    shells = np.asanyarray(shells)
+    excluded = counts >= min_slices
+    for label in np.unique(shells[excluded]):
+        rows = np.flatnonzero(shells == label)
+        if np.all(excluded[rows]):
+            excluded[rows[np.argmin(counts[rows])]] = False
+    return excluded
+
+
+def read_matrix(in_file):
+    """Read a numerical table with a header row, where missing values are ``n/a``."""
+    return np.atleast_2d(
+        np.genfromtxt(
+            in_file,
+            delimiter="\t",
+            skip_header=1,
+            missing_values="n/a",
+            filling_values=np.nan,
+        )
+    )
+
+
+def dwi_qc_summary(
+    dwi_file, mask_file, shells, z_thres=OUTLIER_Z, carpet_rows=CARPET_ROWS
+):
+    """
+    Calculate per-volume summary statistics of a DWI series in a single streaming pass.
+
+    Volumes are read one at a time, so that the memory footprint does not depend
+    on the length of the series, beyond the (small) summaries stored per volume.
+
+    Parameters
+    ----------
+    dwi_file : :obj:`os.PathLike`
+        The diffusion-weighted image series.
+    mask_file : :obj:`os.PathLike`
+        A brain mask in the space of the DWI series.
+    shells : :obj:`numpy.ndarray`
+        The shell index of each volume (see
+        :py:attr:`~dmriprep.utils.vectors.DiffusionGradientTable.shell_ixs`).
+    z_thres : :obj:`float`
+        Number of standard deviations below which the mean signal of a slice is
+        an outlier with respect to the same slice of all volumes of the same shell
+        (see :py:func:`dropout_outliers`).
+    carpet_rows : :obj:`int`
+        Maximum number of voxels sampled into the carpet plot.
+
+    Returns
+    -------
+    summary : :obj:`dict`
+        Per-volume ``mean``, ``median``, ``std``, the ``slice_means`` matrix
+        (volumes x slices), the number of ``outlier_slices``, and the
+        (voxels x volumes) ``carpet`` matrix.
+
+    """
+    img = nb.load(str(dwi_file))
+    mask = np.asanyarray(nb.load(str(mask_file)).dataobj).reshape(img.shape[:3]) > 0.5
+    shells = np.asanyarray(shells)
+    if shells.size != img.shape[-1]:
+        raise ValueError(
+            f"Got {shells.size} shell labels for {img.shape[-1]} DWI volumes."
+        )
+
+    # Carpet rows are sampled evenly across the mask, sorted by slice
+    ijk = np.argwhere(mask)
+    ijk = ijk[np.lexsort((ijk[:, 1], ijk[:, 0], ijk[:, 2]))]
+    nrows = min(carpet_rows, ijk.shape[0])
+    carpet_ijk = ijk[np.linspace(0, ijk.shape[0] - 1, nrows).astype(int)]
+    carpet_ijk = tuple(carpet_ijk.T)
+
+    slices = ijk[:, 2]
+    mask_ijk = tuple(ijk.T)
+    slice_counts = np.bincount(slices, minlength=mask.shape[2]).astype(float)
+    slice_counts[slice_counts == 0] = np.nan
+
+    nvols = img.shape[-1]
+    stats = {name: np.zeros(nvols) for name in ("mean", "median", "std")}
+    slice_means = np.zeros((nvols, mask.shape[2]))
+    carpet = np.zeros((nrows, nvols), dtype="float32")
+    for index, volume in enumerate(iter_volumes(img)):
+        voxels = volume[mask_ijk]
+        stats["mean"][index] = voxels.mean()
+        stats["median"][index] = np.median(voxels)
+        stats["std"][index] = voxels.std()
+        slice_means[index] = (
+            np.bincount(slices, weights=voxels, minlength=mask.shape[2]) / slice_counts
+        )
+        carpet[:, index] = volume[carpet_ijk]
+
+    stats["outlier_slices"] = dropout_outliers(slice_means, shells, z_thres).sum(axis=1)
+    stats["slice_means"] = slice_means
+    stats["carpet"] = carpet
+    return stats
+
+
+def plot_dwi_qc(summary, shells, out_file, b0_mask=None):
+    """
+    Plot a carpet of the DWI series, with the per-volume summaries on top.
+
+    Each voxel (row) of the carpet is normalized by its average
+    :math:`b=0` signal when ``b0_mask`` is given (i.e., the signal attenuation is shown),
+    or by its median across volumes otherwise.
+
+    """
+    from matplotlib.figure import Figure
+
+    carpet = summary["carpet"]
+    if b0_mask is not None and np.any(b0_mask):
+        reference = carpet[:, np.asanyarray(b0_mask, dtype=bool)].mean(axis=1)
+    else:
+        reference = np.median(carpet, axis=1)
+    reference[reference == 0] = 1.0
+    carpet = carpet / reference[:, np.newaxis]
+
+    nvols = carpet.shape[1]
+    fig = Figure(figsize=(12, 7))
+    grid = fig.add_gridspec(3, 1, height_ratios=(1, 4, 1), hspace=0.05)
+
+    ax_stats = fig.add_subplot(grid[0])
+    ax_stats.plot(summary["mean"], label="mean")
+    ax_stats.plot(summary["median"], label="median")
+    ax_stats.set_ylabel("Signal")
+    ax_stats.legend(loc="upper right", fontsize="small")
+    ax_stats.set_xlim(-0.5, nvols - 0.5)
+    ax_stats.set_xticks([])
+
+    ax_carpet = fig.add_subplot(grid[1])
+    vmax = np.percentile(carpet, 99) if carpet.size else 1.0
+    ax_carpet.imshow(
+        carpet,
+        aspect="auto",
+        cmap="gray",
+        interpolation="nearest",
+        vmin=0.0,
+        vmax=vmax,
+    )
+    ax_carpet.set_ylabel("Voxels (sorted by slice)")
+    ax_carpet.set_yticks([])
+    ax_carpet.set_xticks([])
+
+    ax_outliers = fig.add_subplot(grid[2])
+    ax_outliers.bar(
+        np.arange(nvols), summary["outlier_slices"], color=[f"C{s % 10}" for s in shells]
+    )
+    ax_outliers.set_xlim(-0.5, nvols - 0.5)
+    ax_outliers.set_ylabel("Outlier slices")
+    ax_outliers.set_xlabel("Volume (colored by shell)")
+
+    fig.savefig(str(out_file), format="svg", bbox_inches="tight")
+    return str(out_file)
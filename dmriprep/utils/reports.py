@@ -0,0 +1,279 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Generation of the individual reports."""
+import json
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+_RECIPE_RE = re.compile(
+    r'<metadata id="dmriprep-recipe"(?: data-rendered="(?P<rendered>[0-9a-f]*)")?>'
+    r"<!\[CDATA\[(?P<recipe>.*?)\]\]></metadata>",
+    re.DOTALL,
+)
+
+PLACEHOLDER_TEMPLATE = """\
+<svg xmlns="http://www.w3.org/2000/svg" width="600" height="40">\
+{metadata}\
+<text x="10" y="25">This reportlet has not been rendered yet.</text></svg>
+"""
+
+
+def generate_reports(
+    subject_list,
+    output_dir,
+    run_uuid,
+    config=None,
+    work_dir=None,
+    packagename="dmriprep",
+    nprocs=1,
+    cache_dir=None,
+):
+    """
+    Execute :py:func:`niworkflows.reports.core.run_reports` on a list of subjects.
+
+    A drop-in replacement for :py:func:`niworkflows.reports.generate_reports`, which
+    renders the reports of up to ``nprocs`` subjects in parallel processes.
+    Deferred reportlets (see :py:func:`write_recipe`) are rendered first,
+    caching the results in ``cache_dir``.
+
+    Returns
+    -------
+    errno : :obj:`int`
+        The total number of errors found across subjects (a subject whose report
+        could not be generated counts as one error).
+
+    """
+    from .. import config as dmriprep_config
+
+    if config is None:
+        from pkg_resources import resource_filename as pkgrf
+
+        config = pkgrf("dmriprep", "config/reports-spec.yml")
+
+    reportlets_dir = None
+    if work_dir is not None:
+        reportlets_dir = Path(work_dir) / "reportlets"
+
+    jobs = [
+        (output_dir, subject_label, run_uuid, config, reportlets_dir, packagename, cache_dir)
+        for subject_label in subject_list
+    ]
+    nprocs = min(int(nprocs or 1), len(jobs))
+    if nprocs > 1:
+        with ProcessPoolExecutor(max_workers=nprocs) as pool:
+            report_errors = list(pool.map(_run_reports, jobs))
+    else:
+        report_errors = [_run_reports(job) for job in jobs]
+
+    errno = sum(report_errors)
+    if errno:
+        error_list = ", ".join(
+            f"{subid} ({err})"
+            for subid, err in zip(subject_list, report_errors)
+            if err
+        )
+        dmriprep_config.loggers.cli.error(
+            "Preprocessing did not finish successfully. Errors occurred while processing "
+            f"data from participants: {error_list}. Check the HTML reports for details."
+        )
+    return errno
+
+
+def _run_reports(args):
+    """Generate one subject's report, turning exceptions into an error count."""
+    from niworkflows.reports.core import run_reports
+    from .. import config
+
+    output_dir, subject_label, run_uuid, spec, reportlets_dir, packagename, cache_dir = args
+    errors = 0
+    for figure in sorted(
+        (Path(output_dir) / packagename / f"sub-{subject_label}" / "figures").glob("*.svg")
+    ):
+        try:
+            render_recipe(figure, cache_dir)
+        except Exception as exc:
+            config.loggers.cli.error(f"Could not render deferred reportlet {figure}: {exc}")
+            errors += 1
+
+    try:
+        return errors + run_reports(
+            output_dir,
+            subject_label,
+            run_uuid,
+            config=spec,
+            reportlets_dir=reportlets_dir,
+            packagename=packagename,
+        )
+    except Exception as exc:
+        config.loggers.cli.error(
+            f"Could not generate the report of participant {subject_label}: {exc}"
+        )
+        return errors + 1
+
+
+def write_recipe(out_file, interface, inputs):
+    """
+    Write out a placeholder SVG with the recipe to render a reportlet later.
+
+    Parameters
+    ----------
+    out_file : :obj:`os.PathLike`
+        The placeholder file.
+    interface : :obj:`str`
+        The import path of the reportlet interface.
+    inputs : :obj:`dict`
+        The inputs to run the interface with.
+
+    Examples
+    --------
+    >>> os.chdir(tmpdir)
+    >>> _ = Path("ref.txt").write_text("reference")
+    >>> placeholder = write_recipe(
+    ...     "report.svg", "niworkflows.interfaces.Reportlet", {"in_file": "ref.txt"}
+    ... )
+    >>> recipe, rendered = read_recipe(placeholder)
+    >>> recipe["interface"], rendered
+    ('niworkflows.interfaces.Reportlet', None)
+    >>> recipe["inputs"]["in_file"] == str(Path("ref.txt").absolute())
+    True
+
+    """
+    inputs = {
+        key: str(Path(value).absolute())
+        if isinstance(value, str) and Path(value).is_file()
+        else value
+        for key, value in inputs.items()
+    }
+    recipe = json.dumps({"interface": interface, "inputs": inputs}, sort_keys=True)
+    Path(out_file).write_text(
+        PLACEHOLDER_TEMPLATE.format(metadata=_recipe_metadata(recipe))
+    )
+    return str(Path(out_file).absolute())
+
+
+def read_recipe(in_file):
+    """
+    Read the recipe embedded in a reportlet, if any.
+
+    Returns
+    -------
+    recipe : :obj:`dict` or ``None``
+        The recipe, or ``None`` if the reportlet was not deferred.
+    rendered : :obj:`str` or ``None``
+        The hash of the recipe the reportlet was rendered from, or ``None`` if
+        it has not been rendered.
+
+    """
+    match = _RECIPE_RE.search(Path(in_file).read_text())
+    if match is None:
+        return None, None
+    return json.loads(match.group("recipe")), match.group("rendered") or None
+
+
+def recipe_hash(recipe):
+    """
+    Calculate a hash of a recipe, including the contents of its input files.
+
+    The version of *NiWorkflows* (which implements the reportlets) is also
+    hashed, so that reportlets are rendered again when it changes.
+
+    Examples
+    --------
+    >>> os.chdir(tmpdir)
+    >>> _ = Path("ref.txt").write_text("reference")
+    >>> recipe = {"interface": "Reportlet", "inputs": {"in_file": str(Path("ref.txt").absolute())}}
+    >>> before = recipe_hash(recipe)
+    >>> before == recipe_hash(recipe)
+    True
+    >>> _ = Path("ref.txt").write_text("changed")
+    >>> before == recipe_hash(recipe)
+    False
+
+    """
+    from hashlib import sha1
+    from niworkflows import __version__ as nw_version
+
+    digest = sha1(nw_version.encode())
+    digest.update(json.dumps(recipe, sort_keys=True).encode())
+    for _, value in sorted(recipe["inputs"].items()):
+        for path in value if isinstance(value, list) else [value]:
+            if isinstance(path, str) and Path(path).is_file():
+                with open(path, "rb") as fobj:
+                    for block in iter(lambda: fobj.read(2 ** 20), b""):
+                        digest.update(block)
+    return digest.hexdigest()
+
+
+def render_recipe(in_file, cache_dir=None):
+    """
+    Render a deferred reportlet in place, unless it is up to date.
+
+    Rendered reportlets keep their recipe, and the hash it had, so they are
+    rendered again only if the recipe, its input files or *NiWorkflows* change.
+    With a ``cache_dir``, rendered reportlets are also stored by hash, and
+    reused.
+
+    Returns
+    -------
+    status : :obj:`str` or ``None``
+        ``"rendered"``, ``"cached"``, ``"current"``, or ``None`` if ``in_file``
+        is not a deferred reportlet.
+
+    """
+    from importlib import import_module
+    from tempfile import TemporaryDirectory
+
+    recipe, rendered = read_recipe(in_file)
+    if recipe is None:
+        return None
+
+    digest = recipe_hash(recipe)
+    if digest == rendered:
+        return "current"
+
+    cached = Path(cache_dir) / f"{digest}.svg" if cache_dir else None
+    if cached is not None and cached.exists():
+        Path(in_file).write_text(cached.read_text())
+        return "cached"
+
+    module, _, name = recipe["interface"].rpartition(".")
+    interface = getattr(import_module(module), name)(**recipe["inputs"])
+    with TemporaryDirectory() as tmpdir:
+        svg = Path(interface.run(cwd=tmpdir).outputs.out_report).read_text()
+
+    # Keep the recipe within the rendered reportlet, after the opening <svg> tag
+    metadata = _recipe_metadata(json.dumps(recipe, sort_keys=True), digest)
+    svg_start = svg.find(">", svg.find("<svg")) + 1
+    svg = f"{svg[:svg_start]}{metadata}{svg[svg_start:]}"
+    Path(in_file).write_text(svg)
+
+    if cached is not None:
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        cached.write_text(svg)
+    return "rendered"
+
+
+def _recipe_metadata(recipe, rendered=None):
+    attr = f' data-rendered="{rendered}"' if rendered else ""
+    return f'<metadata id="dmriprep-recipe"{attr}><![CDATA[{recipe}]]></metadata>'
@@ -0,0 +1,136 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Test BIDS input utilities."""
+import json
+import os
+import stat
+import subprocess
+from pathlib import Path
+import pytest
+from dmriprep.utils.bids import get_layout_cache, validate_input_dir
+
+VALIDATOR = """\
+#!/bin/sh
+cp "$3" "{calls}/$(date +%s%N).json"
+exit {code}
+"""
+
+
+def _fake_validator(bin_dir, calls_dir, code=0):
+    validator = bin_dir / "bids-validator"
+    validator.write_text(VALIDATOR.format(calls=calls_dir, code=code))
+    validator.chmod(validator.stat().st_mode | stat.S_IEXEC)
+
+
+def _validated(calls_dir):
+    """Return the subjects each validator call was not told to ignore."""
+    subjects = []
+    for call in sorted(calls_dir.glob("*.json")):
+        ignored = json.loads(call.read_text())["ignoredFiles"]
+        subjects.append(
+            sorted(
+                {"01", "02", "03"}.difference(
+                    f[5:7] for f in ignored if f.startswith("/sub-")
+                )
+            )
+        )
+        call.unlink()
+    return sorted(subjects)
+
+
+def test_validate_input_dir(tmpdir, monkeypatch):
+    """Check subjects are validated in up to nprocs runs, and only when their files change."""
+    tmpdir.chdir()
+    tmp_path = Path(tmpdir)
+    bids_dir = tmp_path / "bids"
+    for subject in ("01", "02", "03"):
+        (bids_dir / f"sub-{subject}" / "dwi").mkdir(parents=True)
+        (bids_dir / f"sub-{subject}" / "dwi" / f"sub-{subject}_dwi.bval").write_text("0")
+    (bids_dir / "dataset_description.json").write_text("{}")
+
+    bin_dir = tmp_path / "bin"
+    calls_dir = tmp_path / "calls"
+    bin_dir.mkdir()
+    calls_dir.mkdir()
+    _fake_validator(bin_dir, calls_dir)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.getenv('PATH')}")
+
+    validate_input_dir("posix", bids_dir, ["01", "sub-02"], cache_dir=tmp_path, nprocs=2)
+    assert _validated(calls_dir) == [["01"], ["02"]]
+
+    # Cached subjects are skipped, new selections are validated
+    validate_input_dir("posix", bids_dir, None, cache_dir=tmp_path, nprocs=2)
+    assert _validated(calls_dir) == [["03"]]
+    validate_input_dir("posix", bids_dir, None, cache_dir=tmp_path)
+    assert _validated(calls_dir) == []
+
+    # Modified subjects are validated again, all in a single run with one process
+    (bids_dir / "sub-02" / "dwi" / "sub-02_dwi.bval").write_text("0 1000")
+    (bids_dir / "sub-03" / "dwi" / "sub-03_dwi.bval").write_text("0 1000")
+    validate_input_dir("posix", bids_dir, None, cache_dir=tmp_path)
+    assert _validated(calls_dir) == [["02", "03"]]
+
+    # Failures are raised, and not cached
+    (bids_dir / "sub-01" / "dwi" / "sub-01_dwi.bvec").write_text("0")
+    _fake_validator(bin_dir, calls_dir, code=1)
+    with pytest.raises(subprocess.CalledProcessError):
+        validate_input_dir("posix", bids_dir, None, cache_dir=tmp_path)
+    assert _validated(calls_dir) == [["01"]]
+    assert "01" not in json.loads((tmp_path / "bids_validation.json").read_text())
+
+    with pytest.raises(RuntimeError):
+        validate_input_dir("posix", bids_dir, ["04"], cache_dir=tmp_path)
+
+
+def test_layout_cache(tmpdir):
+    """Check metadata and associated files are resolved once per file."""
+    from bids.layout import BIDSLayout
+
+    bids_dir = Path(tmpdir) / "bids"
+    dwi_dir = bids_dir / "sub-01" / "dwi"
+    dwi_dir.mkdir(parents=True)
+    (bids_dir / "dataset_description.json").write_text(
+        '{"Name": "test", "BIDSVersion": "1.4.0"}'
+    )
+    (bids_dir / "dwi.json").write_text('{"PhaseEncodingDirection": "j"}')
+    for ext in ("nii.gz", "bval", "bvec"):
+        (dwi_dir / f"sub-01_dwi.{ext}").write_text("")
+    (dwi_dir / "sub-01_dwi.json").write_text('{"TotalReadoutTime": 0.05}')
+    dwi_file = dwi_dir / "sub-01_dwi.nii.gz"
+
+    layout = BIDSLayout(str(bids_dir), validate=False)
+    cache = get_layout_cache(layout)
+    assert get_layout_cache(layout) is cache
+
+    metadata = cache.get_metadata(dwi_file)
+    assert metadata == layout.get_metadata(str(dwi_file))
+    metadata["TotalReadoutTime"] = 1.0
+    assert cache.get_metadata(str(dwi_file))["TotalReadoutTime"] == 0.05
+    assert cache.get_bvec(dwi_file) == layout.get_bvec(str(dwi_file))
+    assert cache.get_bval(dwi_file) == layout.get_bval(str(dwi_file))
+    cache.get_bval(dwi_file)
+    assert (cache.hits, cache.misses) == (2, 3)
+
+    # Other attributes are those of the layout
+    assert cache.root == layout.root
+    assert get_layout_cache(BIDSLayout(str(bids_dir), validate=False)) is not cache
@@ -0,0 +1,59 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Test parallel compression."""
+import gzip
+import zlib
+import numpy as np
+import nibabel as nb
+import pytest
+from dmriprep.utils.compress import parallel_gzip
+
+
+@pytest.mark.parametrize("num_threads", [1, 3])
+def test_parallel_gzip(tmp_path, num_threads):
+    """Check multi-member gzip streams are read back by standard readers."""
+    rng = np.random.default_rng(1234)
+    data = rng.integers(0, 200, size=(20, 21, 22, 11)).astype("int16")
+    in_file = tmp_path / "dwi.nii"
+    nb.Nifti1Image(data, np.eye(4), None).to_filename(in_file)
+
+    out_file = parallel_gzip(
+        in_file,
+        tmp_path / "dwi.nii.gz",
+        num_threads=num_threads,
+        block_size=10000,
+    )
+    raw = in_file.read_bytes()
+    compressed = (tmp_path / "dwi.nii.gz").read_bytes()
+    assert gzip.decompress(compressed) == raw
+
+    # One gzip member per block
+    members = 0
+    while compressed:
+        decompressor = zlib.decompressobj(31)
+        decompressor.decompress(compressed)
+        compressed = decompressor.unused_data
+        members += 1
+    assert members == -(-len(raw) // 10000)
+
+    assert np.all(np.asanyarray(nb.load(out_file).dataobj) == data)
@@ -0,0 +1,86 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Test confounds utilities."""
+from pathlib import Path
+import numpy as np
+import nibabel as nb
+from dmriprep.utils import confounds as c
+
+
+def test_rms_displacement(tmp_path):
+    """Check the moments-based displacement against explicit voxel displacements."""
+    rng = np.random.default_rng(1234)
+    mask = rng.random((20, 22, 18)) > 0.7
+    img = nb.Nifti1Image(mask.astype("uint8"), np.diag([2.0, 2.0, 2.5, 1.0]), None)
+    img.header.set_zooms((2.0, 2.0, 2.5))
+    mask_file = tmp_path / "mask.nii.gz"
+    img.to_filename(mask_file)
+
+    params = np.hstack(
+        (rng.normal(0, 1.0, size=(10, 3)), rng.normal(0, 0.02, size=(10, 3)))
+    )
+    matrices = c.rigid_matrices(params)
+
+    center = (np.array(mask.shape) - 1) * 0.5
+    coords = (np.argwhere(mask) - center) * np.array([2.0, 2.0, 2.5])
+    coords = np.hstack((coords, np.ones((coords.shape[0], 1))))
+    moved = np.einsum("nij,vj->nvi", matrices[:, :3, :], coords)
+
+    moments = c.mask_moments(mask_file)
+    expected = np.sqrt(((moved - coords[np.newaxis, :, :3]) ** 2).sum(-1).mean(-1))
+    assert np.allclose(c.rms_displacement(matrices, moments), expected)
+
+    expected = np.sqrt(((moved[1:] - moved[:-1]) ** 2).sum(-1).mean(-1))
+    relative = c.rms_displacement(matrices, moments, relative=True)
+    assert np.isnan(relative[0])
+    assert np.allclose(relative[1:], expected)
+
+
+def test_eddy_confounds(tmpdir):
+    """Check the generation of the confounds file."""
+    tmpdir.chdir()
+    tmp_path = Path(tmpdir)
+    params = np.zeros((5, 16))
+    params[:, 0] = np.arange(5)
+    np.savetxt(tmp_path / "dwi.eddy_parameters", params)
+    np.savetxt(tmp_path / "dwi.eddy_movement_rms", np.ones((5, 2)))
+
+    out_file = c.eddy_confounds(
+        tmp_path / "dwi.eddy_parameters",
+        in_movement_rms=tmp_path / "dwi.eddy_movement_rms",
+        out_file=tmp_path / "confounds.tsv",
+    )
+
+    lines = [line.split("\t") for line in open(out_file).read().splitlines()]
+    header = lines.pop(0)
+    assert header[:6] == list(c.EDDY_PARAMETERS)
+    assert header[6:] == [
+        "framewise_displacement",
+        "rms_displacement",
+        "rel_rms_displacement",
+        "eddy_movement_rms",
+        "eddy_rel_movement_rms",
+    ]
+    assert len(lines) == 5
+    fd = [row[header.index("framewise_displacement")] for row in lines]
+    assert fd == ["n/a", "1", "1", "1", "1"]
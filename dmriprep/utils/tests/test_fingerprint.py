@@ -0,0 +1,79 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Test the cache of file fingerprints."""
+import sqlite3
+from pathlib import Path
+from nipype.interfaces.base import specs, support
+from nipype.interfaces.utility import Function
+from nipype.pipeline import engine as pe
+from nipype.pipeline.plugins import multiproc
+from nipype.utils.filemanip import hash_infile as nipype_hash_infile
+from dmriprep.utils import fingerprint
+
+
+def _hashing_module(in_file):
+    from nipype.interfaces.base import specs
+
+    return specs.hash_infile.__module__
+
+
+def test_install(tmpdir, monkeypatch):
+    """Check Nipype's content hashing uses the cache, also within pool workers."""
+    tmpdir.chdir()
+    tmp_path = Path(tmpdir)
+    monkeypatch.setattr(specs, "hash_infile", specs.hash_infile)
+    monkeypatch.setattr(support, "hash_infile", support.hash_infile)
+    monkeypatch.setattr(multiproc, "process_initializer", multiproc.process_initializer)
+    monkeypatch.setattr(fingerprint, "_CACHE", None)
+    monkeypatch.setattr(fingerprint, "_nipype_initializer", None)
+
+    in_file = tmp_path / "dwi.nii"
+    in_file.write_bytes(b"\0" * (3 * fingerprint.CHUNK_SIZE + 7))
+    db_path = tmp_path / "fingerprints.sqlite"
+    fingerprint.install(db_path)
+    fingerprint.install(db_path)
+    assert fingerprint._nipype_initializer.__module__ == multiproc.__name__
+
+    assert specs.hash_infile(str(in_file)) == nipype_hash_infile(str(in_file))
+    assert fingerprint._CACHE.misses == 1
+    specs.hash_infile(str(in_file))
+    assert fingerprint._CACHE.misses == 1
+    assert specs.hash_infile(str(tmp_path / "missing.nii")) is None
+
+    node = pe.Node(
+        Function(function=_hashing_module, output_names=["module"]),
+        name="hashing",
+        base_dir=str(tmp_path),
+    )
+    node.inputs.in_file = str(in_file)
+    wf = pe.Workflow(name="wf", base_dir=str(tmp_path))
+    wf.add_nodes([node])
+    wf.config["execution"]["hash_method"] = "content"
+    res = wf.run(
+        plugin="MultiProc", plugin_args={"n_procs": 2, "mp_context": "forkserver"}
+    )
+    (result,) = [n.result for n in res.nodes()]
+    assert result.outputs.module == fingerprint.__name__
+
+    with sqlite3.connect(str(db_path)) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0] >= 1
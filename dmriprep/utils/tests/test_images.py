@@ -0,0 +1,84 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Test image utilities."""
+import numpy as np
+import nibabel as nb
+import pytest
+from dmriprep.utils.images import median, quantize, rescale_b0
+
+
+@pytest.mark.parametrize("precision,ratio", [("float32", 0.5), ("int16", 0.25)])
+def test_quantize(tmp_path, precision, ratio):
+    """Check quantized images are read back within the reported error."""
+    rng = np.random.default_rng(1234)
+    data = rng.normal(500, 200, size=(12, 13, 14, 5))
+    data[..., 2] = 0  # constant volumes must not break the scaling
+    in_file = tmp_path / "dwi.nii"
+    nb.Nifti1Image(data, np.eye(4), None).to_filename(in_file)
+
+    out_file = tmp_path / f"dwi_{precision}.nii.gz"
+    report = quantize(nb.load(in_file), out_file, precision)
+
+    assert report["size_ratio"] == ratio
+    assert report["rmse"] <= report["max_abs_error"]
+
+    img = nb.load(out_file)
+    assert img.shape == data.shape
+    assert np.allclose(img.affine, np.eye(4))
+    assert np.abs(img.get_fdata() - data).max() <= report["max_abs_error"] + 1e-6
+
+
+def test_precision_policy(tmp_path):
+    """Check image writers honour the precision policy."""
+    data = np.random.default_rng(1234).normal(500, 20, size=(10, 10, 10, 4))
+    in_file = tmp_path / "b0s.nii.gz"
+    nb.Nifti1Image(data.astype("int16"), np.eye(4), None).to_filename(in_file)
+    mask_file = tmp_path / "mask.nii.gz"
+    nb.Nifti1Image(np.ones((10, 10, 10), dtype="uint8"), np.eye(4), None).to_filename(
+        mask_file
+    )
+
+    native, _ = rescale_b0(in_file, mask_file, tmp_path / "native.nii.gz")
+    assert nb.load(native).get_data_dtype() == np.int16
+
+    # Integer inputs are not promoted to floating point
+    rescaled, _ = rescale_b0(
+        in_file, mask_file, tmp_path / "float32.nii.gz", precision="float32"
+    )
+    assert nb.load(rescaled).get_data_dtype() == np.int16
+
+    float_file = tmp_path / "b0s_float.nii.gz"
+    data[0, 0, 0, 0] = np.inf
+    nb.Nifti1Image(data, np.eye(4), None).to_filename(float_file)
+    rescaled, _ = rescale_b0(
+        float_file, mask_file, tmp_path / "float32.nii.gz", precision="float32"
+    )
+    assert nb.load(rescaled).get_data_dtype() == np.float32
+
+    ref = median(float_file, tmp_path / "ref.nii.gz", precision="int16")
+    ref_img = nb.load(ref)
+    assert ref_img.get_data_dtype() == np.int16
+    assert ref_img.shape == (10, 10, 10)
+    # Infinite values do not take over the range of the integer scaling
+    expected = np.median(data, axis=-1)
+    assert np.abs(ref_img.get_fdata() - expected)[1:, 1:, 1:].max() < 0.1
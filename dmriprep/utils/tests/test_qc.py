@@ -0,0 +1,66 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Test quality control utilities."""
+import numpy as np
+import nibabel as nb
+from dmriprep.utils import qc
+
+
+def test_dwi_qc_summary(tmp_path):
+    """Check the streaming summary against in-memory statistics."""
+    rng = np.random.default_rng(1234)
+    data = rng.normal(100.0, 5.0, size=(10, 12, 8, 7)).astype("float32")
+    shells = np.array([0, 1, 1, 1, 1, 1, 0])
+    # Signal dropout in one slice of one volume
+    data[..., 4, 3] = 10.0
+
+    affine = np.eye(4)
+    dwi_file = tmp_path / "dwi.nii.gz"
+    nb.Nifti1Image(data, affine, None).to_filename(dwi_file)
+
+    mask = np.zeros(data.shape[:3], dtype="uint8")
+    mask[2:-2, 2:-2, 1:-1] = 1
+    mask_file = tmp_path / "mask.nii.gz"
+    nb.Nifti1Image(mask, affine, None).to_filename(mask_file)
+
+    summary = qc.dwi_qc_summary(dwi_file, mask_file, shells, carpet_rows=50)
+    voxels = data[mask > 0]
+    assert np.allclose(summary["mean"], voxels.mean(0), rtol=1e-5)
+    assert np.allclose(summary["median"], np.median(voxels, 0), rtol=1e-5)
+    assert np.allclose(summary["std"], voxels.std(0), rtol=1e-4)
+    assert summary["carpet"].shape == (50, 7)
+    assert np.all(np.isnan(summary["slice_means"][:, 0]))
+    assert np.argmax(summary["outlier_slices"]) == 3
+
+    out_file = qc.plot_dwi_qc(
+        summary, shells, tmp_path / "carpet.svg", b0_mask=shells == 0
+    )
+    assert out_file.endswith("carpet.svg")
+
+
+def test_outlier_threshold():
+    """Check the QC summary and the dropout detector flag the same slices."""
+    from dmriprep.interfaces.qc import DWIQualitySummary, SliceOutliers
+
+    assert DWIQualitySummary().inputs.z_thres == qc.OUTLIER_Z
+    assert SliceOutliers().inputs.z_thres == qc.OUTLIER_Z
@@ -0,0 +1,79 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Test parallel report generation."""
+from pathlib import Path
+from dmriprep.utils.reports import generate_reports
+
+
+def test_generate_reports(tmpdir):
+    """Check reports are generated for every subject, and errors aggregated."""
+    tmpdir.chdir()
+    out_dir = Path(tmpdir) / "out"
+    for subject in ("01", "02"):
+        (out_dir / "dmriprep" / f"sub-{subject}" / "figures").mkdir(parents=True)
+
+    errno = generate_reports(["01", "02"], out_dir, "uuid", nprocs=2)
+    assert errno == 0
+    assert (out_dir / "dmriprep" / "sub-01.html").exists()
+    assert (out_dir / "dmriprep" / "sub-02.html").exists()
+
+    # A report specification that cannot be read fails every subject
+    errno = generate_reports(
+        ["01", "02"], out_dir, "uuid", config=str(tmpdir / "missing.yml")
+    )
+    assert errno == 2
+
+
+def test_deferred_reportlet(tmpdir):
+    """Check deferred reportlets are rendered from their recipe, and cached."""
+    import shutil
+    import numpy as np
+    import nibabel as nb
+    from dmriprep.interfaces.reports import DeferredShowMask
+    from dmriprep.utils.reports import read_recipe, render_recipe
+
+    tmpdir.chdir()
+    data = np.zeros((20, 20, 20), dtype="float32")
+    data[5:15, 5:15, 5:15] = 1.0
+    nb.Nifti1Image(data, np.eye(4), None).to_filename("ref.nii.gz")
+    nb.Nifti1Image(data.astype("uint8"), np.eye(4), None).to_filename("mask.nii.gz")
+
+    result = DeferredShowMask(
+        background_file="ref.nii.gz", mask_file="mask.nii.gz", compress_report=False
+    ).run()
+    placeholder = Path(result.outputs.out_report)
+    recipe, rendered = read_recipe(placeholder)
+    assert recipe["interface"].endswith("SimpleShowMaskRPT")
+    assert rendered is None
+
+    figure = Path("sub-01_desc-brain_mask.svg")
+    shutil.copy(placeholder, figure)
+    cache_dir = Path(tmpdir) / "cache"
+    assert render_recipe(figure, cache_dir) == "rendered"
+    assert read_recipe(figure)[1] is not None
+    assert render_recipe(figure, cache_dir) == "current"
+
+    # A fresh placeholder with the same inputs is taken from the cache
+    shutil.copy(placeholder, figure)
+    assert render_recipe(figure, cache_dir) == "cached"
+    assert "<svg" in figure.read_text()
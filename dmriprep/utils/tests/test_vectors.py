@@ -147,3 +147,64 @@ def test_b0mask_from_data(tmp_path):
         np.concatenate((lowb, highb), axis=3).astype(float), np.eye(4), None
     ).to_filename(dwi_file)
     assert v.b0mask_from_data(dwi_file, mask_file).sum() == 1
+
+
+def test_shells():
+    """Check shell clustering and sampling-scheme metrics."""
+    rng = np.random.default_rng(1234)
+    bvals = np.hstack(([0, 5], rng.normal(1000, 10, 30), rng.normal(3000, 15, 60)))
+    bvecs = rng.normal(size=(bvals.size, 3))
+    bvecs /= np.linalg.norm(bvecs, axis=1)[:, np.newaxis]
+    bvecs[:2] = 0.0
+    rasb = np.hstack((bvecs, bvals[:, np.newaxis]))
+
+    dgt = v.DiffusionGradientTable()
+    dgt.gradients = rasb
+    assert np.allclose(dgt.shells, [2.5, 1000, 3000], atol=5)
+    assert dgt.shell_counts.tolist() == [2, 30, 60]
+    assert dgt.is_shelled
+
+    energy = dgt.shell_energy
+    assert np.isnan(energy[0])
+    # Energy grows with the number of directions
+    assert energy[2] > energy[1] > 0
+
+    # Cache is invalidated when the table is replaced
+    rasb[2:, -1] = 1000
+    dgt.gradients = rasb
+    assert dgt.shell_counts.tolist() == [2, 90]
+
+
+def test_cache(tmp_path):
+    """Check derived quantities are memoized and invalidated upon reassignment."""
+    rng = np.random.default_rng(1234)
+    bvecs = rng.normal(size=(20, 3))
+    bvecs[bvecs[:, 2] < 0] *= -1.0  # Just half a sphere
+    bvecs[0] = 0.0
+    bvals = np.array([0] + [1000] * 19)
+
+    dgt = v.DiffusionGradientTable(dwi_file=np.eye(4), bvecs=bvecs, bvals=bvals)
+    pole = dgt.pole
+    assert pole is dgt.pole
+    assert dgt.b0mask is dgt.b0mask
+    assert not pole.flags.writeable
+    assert np.any(pole != 0)
+
+    # New b-vectors drop the derived RAS+B table and everything cached on it
+    dgt.bvecs = np.vstack((bvecs, -bvecs[1:]))[:20]
+    assert dgt.gradients is None
+    assert not dgt.normalized
+    dgt.generate_rasb()
+    assert dgt.pole is not pole
+
+    # A user-provided RAS+B table survives changes of the affine,
+    # but the b-vectors derived from it do not
+    rasb = tmp_path / "dwi.tsv"
+    dgt.to_filename(rasb)
+    dgt = v.DiffusionGradientTable(dwi_file=np.eye(4), rasb_file=rasb)
+    assert dgt.bvecs is not None
+    dgt.affine = np.diag([-1.0, 1.0, 1.0, 1.0])
+    assert dgt.gradients is not None
+    assert dgt.bvecs is None
+    dgt.generate_vecval()
+    assert np.allclose(dgt.bvecs[1:, 0], -dgt.gradients[1:, 0], atol=1e-6)
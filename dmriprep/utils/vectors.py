@@ -22,6 +22,7 @@
 #
 """Utilities to operate on diffusion gradients."""
 from .. import config
+from functools import lru_cache
 from pathlib import Path
 from itertools import permutations
 import nibabel as nb
@@ -30,6 +31,8 @@ from dipy.core.gradients import round_bvals
 
 B0_THRESHOLD = 50
 BVEC_NORM_EPSILON = 0.1
+SHELL_TOLERANCE = 100
+MAX_SHELLS = 6
 
 
 class DiffusionGradientTable:
@@ -42,6 +45,8 @@ class DiffusionGradientTable:
         "_bvals",
         "_bvec_norm_epsilon",
         "_bvecs",
+        "_cache",
+        "_derived",
         "_gradients",
         "_normalized",
         "_raise_inconsistent",
@@ -118,6 +123,8 @@ class DiffusionGradientTable:
         self._bvals = None
         self._bvec_norm_epsilon = bvec_norm_epsilon
         self._bvecs = None
+        self._cache = {}
+        self._derived = set()
         self._gradients = None
         self._normalized = False
         self._raise_inconsistent = raise_inconsistent
@@ -162,23 +169,23 @@ class DiffusionGradientTable:
     @affine.setter
     def affine(self, value):
         if isinstance(value, (str, Path)):
-            dwi_file = nb.load(str(value))
-            self._affine = dwi_file.affine.copy()
-            return
+            value = nb.load(str(value))
         if hasattr(value, "affine"):
-            self._affine = value.affine
+            value = value.affine
         self._affine = np.array(value)
+        self._invalidate("affine")
 
     @gradients.setter
     def gradients(self, value):
         if isinstance(value, (str, Path)):
-            value = np.loadtxt(value, skiprows=1)
+            value = _loadtxt(value, skiprows=1)
         self._gradients = value
+        self._invalidate("gradients")
 
     @bvecs.setter
     def bvecs(self, value):
         if isinstance(value, (str, Path)):
-            value = np.loadtxt(str(value)).T
+            value = _loadtxt(value).T
         else:
             value = np.array(value, dtype="float32")
 
@@ -187,19 +194,63 @@ class DiffusionGradientTable:
         if self.bvals is not None and value.shape[0] != self.bvals.shape[0]:
             raise ValueError("The number of b-vectors and b-values do not match")
         self._bvecs = value
+        self._invalidate("bvecs")
 
     @bvals.setter
     def bvals(self, value):
         if isinstance(value, (str, Path)):
-            value = np.loadtxt(str(value)).flatten()
+            value = _loadtxt(value).flatten()
         if self.bvecs is not None and value.shape[0] != self.bvecs.shape[0]:
             raise ValueError("The number of b-vectors and b-values do not match")
         self._bvals = np.array(value)
+        self._invalidate("bvals")
+
+    def _invalidate(self, changed):
+        """
+        Drop the quantities that are stale after ``changed`` is reassigned.
+
+        The RAS+B table and the bvec/bval pair are derived from each other (together
+        with the affine) by :py:meth:`generate_rasb` and :py:meth:`generate_vecval`,
+        respectively. Only the one that was derived (if any) is dropped, while
+        the one set by the user is kept.
+        All the cached properties (:py:attr:`pole`, :py:attr:`b0mask`, shells)
+        derive from the RAS+B table.
+
+        """
+        if changed == "gradients":
+            stale = {"bvecs", "bvals"}
+            self._cache.clear()
+        elif changed == "affine":
+            stale = {"gradients", "bvecs", "bvals"}
+        else:
+            stale = {"gradients"}
+            self._normalized = False
+
+        stale &= self._derived
+        self._derived -= stale | {changed}
+        if "gradients" in stale:
+            self._gradients = None
+            self._cache.clear()
+        if stale & {"bvecs", "bvals"}:
+            self._bvecs = self._bvals = None
+            self._normalized = False
+
+    def _cached(self, key, factory):
+        """Memoize a quantity derived from the RAS+B table, as a read-only array."""
+        if key not in self._cache:
+            self.generate_rasb()
+            value = factory()
+            for array in value if isinstance(value, tuple) else (value,):
+                array.flags.writeable = False
+            self._cache[key] = value
+        return self._cache[key]
 
     @property
     def b0mask(self):
         """Get a mask of low-b frames."""
-        return np.squeeze(self.gradients[..., -1] < self._b0_thres)
+        return self._cached(
+            "b0mask", lambda: np.squeeze(self.gradients[..., -1] < self._b0_thres)
+        )
 
     def normalize(self):
         """Normalize (l2-norm) b-vectors."""
@@ -214,6 +265,7 @@ class DiffusionGradientTable:
             b_scale=self._b_scale,
             raise_error=self._raise_inconsistent,
         )
+        self._invalidate("bvecs")
         self._normalized = True
 
     def generate_rasb(self):
@@ -222,6 +274,7 @@ class DiffusionGradientTable:
             self.normalize()
             _ras = bvecs2ras(self.affine, self.bvecs)
             self.gradients = np.hstack((_ras, self.bvals[..., np.newaxis]))
+            self._derived.add("gradients")
 
     def reorient_rasb(self):
         """Reorient the vectors based o a list of affine transforms."""
@@ -268,6 +321,7 @@ class DiffusionGradientTable:
                 np.linalg.inv(self.affine), self.gradients[..., :-1]
             )
             self._bvals = self.gradients[..., -1].flatten()
+            self._derived |= {"bvecs", "bvals"}
 
     @property
     def pole(self):
@@ -277,9 +331,70 @@ class DiffusionGradientTable:
         If pole is all-zeros then the b-vectors cover a full sphere.
 
         """
-        self.generate_rasb()
-        return calculate_pole(
-            self.gradients[..., :-1], bvec_norm_epsilon=self._bvec_norm_epsilon
+        return self._cached(
+            "pole",
+            lambda: calculate_pole(
+                self.gradients[..., :-1], bvec_norm_epsilon=self._bvec_norm_epsilon
+            ),
+        )
+
+    def _cluster(self):
+        return self._cached(
+            "shells",
+            lambda: cluster_shells(self.gradients[..., -1], b0_threshold=self._b0_thres),
+        )
+
+    @property
+    def shells(self):
+        """Get the *b*-value of each shell (the average of its members), sorted."""
+        return self._cluster()[0]
+
+    @property
+    def shell_ixs(self):
+        """Get the index of the shell each volume belongs to."""
+        return self._cluster()[1]
+
+    @property
+    def shell_counts(self):
+        """Get the number of volumes of each shell."""
+        return np.bincount(self.shell_ixs, minlength=len(self.shells))
+
+    @property
+    def shell_energy(self):
+        """
+        Get the electrostatic energy of the directions of each shell.
+
+        Low-*b* "shells" are given ``NaN``, as they do not sample directions.
+
+        """
+        ixs = self.shell_ixs
+        vecs = self.gradients[..., :-1]
+        return self._cached(
+            "shell_energy",
+            lambda: np.array(
+                [
+                    np.nan
+                    if bval < self._b0_thres
+                    else electrostatic_energy(vecs[ixs == i])
+                    for i, bval in enumerate(self.shells)
+                ]
+            ),
+        )
+
+    @property
+    def is_shelled(self):
+        """
+        Check whether the scheme is multi-shell (rather than, e.g., Cartesian q-space).
+
+        Following the assumptions of FSL's ``eddy --data_is_shelled``, the scheme is
+        considered shelled if there are at most ``MAX_SHELLS`` shells and every
+        non-zero shell has (at least) as many directions as shells in the scheme.
+
+        """
+        dw_shells = self.shells >= self._b0_thres
+        nshells = int(dw_shells.sum())
+        return 0 < nshells <= MAX_SHELLS and bool(
+            np.all(self.shell_counts[dw_shells] >= nshells)
         )
 
     def to_filename(self, filename, filetype="rasb"):
@@ -301,6 +416,18 @@ class DiffusionGradientTable:
             raise ValueError(f'Unknown filetype "{filetype}"')
 
 
+@lru_cache(maxsize=32)
+def _loadtxt_cached(fname, mtime_ns, size, skiprows):
+    return np.loadtxt(fname, skiprows=skiprows)
+
+
+def _loadtxt(fname, skiprows=0):
+    """Parse a text file, skipping the parsing if it has not changed since last read."""
+    fname = Path(fname).absolute()
+    stat = fname.stat()
+    return _loadtxt_cached(str(fname), stat.st_mtime_ns, stat.st_size, skiprows).copy()
+
+
 def normalize_gradients(
     bvecs,
     bvals,
@@ -392,6 +519,89 @@ def normalize_gradients(
     return bvecs, bvals.astype("uint16")
 
 
+def cluster_shells(bvals, b0_threshold=B0_THRESHOLD, tolerance=SHELL_TOLERANCE):
+    """
+    Cluster *b*-values into shells.
+
+    *b*-values are sorted and a new shell is started wherever the gap between
+    two consecutive values is larger than ``tolerance``.
+    All *b*-values below ``b0_threshold`` are grouped into the first shell.
+
+    Parameters
+    ----------
+    bvals : 1d array
+        The *b*-value of each volume.
+    b0_threshold : :obj:`float`
+        The upper threshold to consider a volume as :math:`b=0`.
+    tolerance : :obj:`float`
+        Maximum gap between the sorted *b*-values of the same shell.
+
+    Returns
+    -------
+    shells : 1d array
+        The average *b*-value of each shell, in increasing order.
+    labels : 1d int array
+        The index of the shell each volume belongs to.
+
+    Examples
+    --------
+    >>> shells, labels = cluster_shells([5, 1000, 995, 2000, 0, 3010, 1005, 2990])
+    >>> shells.tolist()
+    [2.5, 1000.0, 2000.0, 3000.0]
+    >>> labels.tolist()
+    [0, 1, 1, 2, 0, 3, 1, 3]
+
+    >>> shells, labels = cluster_shells([1000, 2000, 1000])
+    >>> shells.tolist(), labels.tolist()
+    ([1000.0, 2000.0], [0, 1, 0])
+
+    """
+    bvals = np.asanyarray(bvals, dtype=float).reshape(-1)
+    order = np.argsort(bvals, kind="stable")
+    sorted_bvals = bvals[order]
+
+    gaps = np.diff(sorted_bvals) > tolerance
+    # Low-b volumes are gathered together regardless of their spread
+    gaps &= sorted_bvals[1:] >= b0_threshold
+    gaps |= (sorted_bvals[:-1] < b0_threshold) & (sorted_bvals[1:] >= b0_threshold)
+
+    labels = np.empty_like(order)
+    labels[order] = np.concatenate(([0], np.cumsum(gaps)))
+    shells = np.bincount(labels, weights=bvals) / np.bincount(labels)
+    return shells, labels
+
+
+def electrostatic_energy(bvecs):
+    """
+    Calculate the electrostatic energy of a set of antipodally-symmetric directions.
+
+    Each direction is modeled as a pair of unit charges at :math:`\\pm\\mathbf{u}`,
+    and the energy is the sum of the inverse distances across pairs of different
+    directions.
+    All distances are calculated at once from the Gram matrix
+    :math:`\\mathbf{G} = \\mathbf{U}\\mathbf{U}^T`, since
+    :math:`\\|\\mathbf{u}_i \\mp \\mathbf{u}_j\\|^2 = 2 \\mp 2 G_{ij}`
+    for unit vectors.
+    Lower energies indicate more uniformly distributed directions.
+
+    Examples
+    --------
+    >>> round(float(electrostatic_energy(np.eye(3))), 4)
+    4.2426
+    >>> float(electrostatic_energy([(1.0, 0.0, 0.0), (-1.0, 0.0, 0.0)]))
+    inf
+
+    """
+    bvecs = np.array(bvecs, dtype=float)
+    bvecs /= np.linalg.norm(bvecs, axis=1)[:, np.newaxis]
+    gram = np.clip(bvecs @ bvecs.T, -1.0, 1.0)
+    upper = np.triu_indices(gram.shape[0], k=1)
+    gram = gram[upper]
+    with np.errstate(divide="ignore"):
+        energy = 1.0 / np.sqrt(2.0 - 2.0 * gram) + 1.0 / np.sqrt(2.0 + 2.0 * gram)
+    return energy.sum()
+
+
 def calculate_pole(bvecs, bvec_norm_epsilon=BVEC_NORM_EPSILON):
     """
     Check whether the b-vecs cover a hemisphere, and if so, calculate the pole.
@@ -37,7 +37,7 @@ from smriprep.workflows.anatomical import init_anat_preproc_wf
 
 from ..interfaces import DerivativesDataSink, BIDSDataGrabber
 from ..interfaces.reports import SubjectSummary, AboutSummary
-from ..utils.bids import collect_data
+from ..utils.bids import collect_data, get_layout_cache
 
 
 def init_dmriprep_wf():
@@ -107,6 +107,10 @@ def init_dmriprep_wf():
         log_dir.mkdir(exist_ok=True, parents=True)
         config.to_filename(log_dir / "dmriprep.toml")
 
+    layout_cache = get_layout_cache()
+    config.loggers.workflow.debug(
+        f"BIDS metadata cache: {layout_cache.hits} hits, {layout_cache.misses} misses."
+    )
     return dmriprep_wf
 
 
@@ -453,7 +457,7 @@ Setting-up fieldmap "{estimator.bids_id}" ({estimator.method}) with \
                 str(s.path) for s in estimator.sources
                 if s.suffix in ("dwi",)
             ]
-            layout = config.execution.layout
+            layout = get_layout_cache()
             syn_preprocessing_wf = init_syn_preprocessing_wf(
                 omp_nthreads=config.nipype.omp_nthreads,
                 debug=config.execution.debug is True,
@@ -90,17 +90,22 @@ def init_dwi_preproc_wf(dwi_file, has_fieldmap=False):
     * :py:func:`~dmriprep.workflows.dwi.outputs.init_reportlets_wf`
 
     """
-    from niworkflows.interfaces.reportlets.registration import (
-        SimpleBeforeAfterRPT as SimpleBeforeAfter,
-    )
+    from niworkflows.interfaces.reportlets.registration import SimpleBeforeAfterRPT
     from niworkflows.workflows.epi.refmap import init_epi_reference_wf
     from sdcflows.workflows.ancillary import init_brainextraction_wf
 
+    from ...interfaces.qc import DWIQualitySummary, SliceOutliers
+    from ...interfaces.reports import DeferredBeforeAfter
     from ...interfaces.vectors import CheckGradientTable
+    from ...utils.bids import get_layout_cache
     from .outputs import init_dwi_derivatives_wf, init_reportlets_wf
     from .eddy import init_eddy_wf
+    from .confounds import init_dwi_confounds_wf
 
-    layout = config.execution.layout
+    SimpleBeforeAfter = (
+        DeferredBeforeAfter if config.execution.defer_reportlets else SimpleBeforeAfterRPT
+    )
+    layout = get_layout_cache()
 
     dwi_file = Path(dwi_file)
     config.loggers.workflow.debug(
@@ -165,6 +170,8 @@ def init_dwi_preproc_wf(dwi_file, has_fieldmap=False):
     )
 
     gradient_table = pe.Node(CheckGradientTable(), name="gradient_table")
+    dwi_qc = pe.Node(DWIQualitySummary(), name="dwi_qc", mem_gb=0.5)
+    slice_outliers = pe.Node(SliceOutliers(), name="slice_outliers", mem_gb=0.1)
 
     dwi_reference_wf = init_epi_reference_wf(
         omp_nthreads=config.nipype.omp_nthreads,
@@ -200,6 +207,17 @@ def init_dwi_preproc_wf(dwi_file, has_fieldmap=False):
         (buffernode, outputnode, [("dwi_reference", "dwi_reference"),
                                   ("dwi_mask", "dwi_mask")]),
         (gradient_table, outputnode, [("out_rasb", "gradients_rasb")]),
+        (gradient_table, dwi_qc, [("shells", "shells"),
+                                  ("shell_ixs", "shell_ixs")]),
+        (brainextraction_wf, dwi_qc, [("outputnode.out_mask", "mask_file")]),
+        (dwi_qc, dwi_derivatives_wf, [("out_file", "inputnode.qc_file")]),
+        (gradient_table, slice_outliers, [("shells", "shells"),
+                                          ("shell_ixs", "shell_ixs")]),
+        (dwi_qc, slice_outliers, [("out_slice_means", "in_slice_means")]),
+        (slice_outliers, dwi_derivatives_wf, [
+            ("out_file", "inputnode.outliers_file"),
+            ("out_exclude", "inputnode.exclude_file"),
+        ]),
     ])
     # fmt: on
 
@@ -272,18 +290,32 @@ def init_dwi_preproc_wf(dwi_file, has_fieldmap=False):
             mem_gb=0.1,
         )
 
+        dwi_confounds_wf = init_dwi_confounds_wf(
+            output_dir=str(config.execution.output_dir)
+        )
+
         # fmt:off
         workflow.connect([
             (inputnode, eddy_wf, [("dwi_file", "inputnode.dwi_file"),
                                   ("in_bvec", "inputnode.in_bvec"),
                                   ("in_bval", "inputnode.in_bval")]),
+            (gradient_table, eddy_wf, [("is_shelled", "inputnode.is_shelled")]),
             (inputnode, ds_report_eddy, [("dwi_file", "source_file")]),
+            (inputnode, dwi_confounds_wf, [("dwi_file", "inputnode.source_file")]),
+            (eddy_wf, dwi_confounds_wf, [
+                ("outputnode.out_parameter", "inputnode.eddy_parameters"),
+                ("outputnode.out_movement_rms", "inputnode.eddy_movement_rms")]),
+            (brainextraction_wf, dwi_confounds_wf, [
+                ("outputnode.out_mask", "inputnode.dwi_mask")]),
             (brainextraction_wf, eddy_wf, [("outputnode.out_mask", "inputnode.dwi_mask")]),
             (brainextraction_wf, eddy_report, [("outputnode.out_file", "before")]),
             (eddy_wf, eddy_report, [("outputnode.eddy_ref_image", "after")]),
             (eddy_report, ds_report_eddy, [("out_report", "in_file")]),
+            (eddy_wf, dwi_qc, [("outputnode.out_eddy", "in_file")]),
         ])
         # fmt:on
+    else:
+        workflow.connect([(inputnode, dwi_qc, [("dwi_file", "in_file")])])
 
     # REPORTING ############################################################
     reportlets_wf = init_reportlets_wf(
@@ -300,6 +332,7 @@ def init_dwi_preproc_wf(dwi_file, has_fieldmap=False):
             ("dwi_reference", "inputnode.dwi_ref"),
             ("dwi_mask", "inputnode.dwi_mask"),
         ]),
+        (dwi_qc, reportlets_wf, [("out_report", "inputnode.carpet_report")]),
     ])
     # fmt: on
 
@@ -0,0 +1,107 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2021 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Calculate confounding timeseries."""
+from nipype.pipeline import engine as pe
+from nipype.interfaces import utility as niu
+from niworkflows.engine.workflows import LiterateWorkflow as Workflow
+from ...interfaces import DerivativesDataSink
+
+
+def init_dwi_confounds_wf(output_dir, name="dwi_confounds_wf"):
+    """
+    Calculate head-motion confounds from the estimates of ``eddy`` and store them.
+
+    Workflow Graph
+        .. workflow::
+            :graph2use: orig
+            :simple_form: yes
+
+            from dmriprep.workflows.dwi.confounds import init_dwi_confounds_wf
+            wf = init_dwi_confounds_wf(output_dir=".")
+
+    Parameters
+    ----------
+    output_dir : :obj:`str`
+        Directory in which to save derivatives.
+    name : :obj:`str`
+        Workflow name (default: ``"dwi_confounds_wf"``).
+
+    Inputs
+    ------
+    source_file
+        One dwi file that will serve as a file naming reference.
+    eddy_parameters
+        The ``.eddy_parameters`` file.
+    eddy_movement_rms
+        The ``.eddy_movement_rms`` file.
+    dwi_mask
+        A mask in DWI space, within which voxel displacements are averaged.
+
+    Outputs
+    -------
+    confounds_file
+        A BIDS ``desc-confounds_timeseries.tsv`` file.
+
+    """
+    from ...interfaces.confounds import EddyMotionConfounds
+
+    workflow = Workflow(name=name)
+    workflow.__desc__ = """\
+The framewise displacement [FD, @power_fd_dvars] and the root-mean-square displacement
+of the voxels within the brain mask were calculated from the head-motion parameters
+estimated by ``eddy``.
+"""
+    inputnode = pe.Node(
+        niu.IdentityInterface(
+            fields=["source_file", "eddy_parameters", "eddy_movement_rms", "dwi_mask"]
+        ),
+        name="inputnode",
+    )
+    outputnode = pe.Node(
+        niu.IdentityInterface(fields=["confounds_file"]), name="outputnode"
+    )
+
+    eddy_confounds = pe.Node(EddyMotionConfounds(), name="eddy_confounds")
+
+    ds_confounds = pe.Node(
+        DerivativesDataSink(
+            base_directory=output_dir,
+            desc="confounds",
+            suffix="timeseries",
+            datatype="dwi",
+        ),
+        name="ds_confounds",
+        run_without_submitting=True,
+    )
+
+    # fmt:off
+    workflow.connect([
+        (inputnode, eddy_confounds, [("eddy_parameters", "in_parameters"),
+                                     ("eddy_movement_rms", "in_movement_rms"),
+                                     ("dwi_mask", "mask_file")]),
+        (inputnode, ds_confounds, [("source_file", "source_file")]),
+        (eddy_confounds, ds_confounds, [("out_file", "in_file")]),
+        (eddy_confounds, outputnode, [("out_file", "confounds_file")]),
+    ])
+    # fmt:on
+    return workflow
@@ -101,25 +101,50 @@ def init_eddy_wf(debug=False, name="eddy_wf"):
     ------
     dwi_file
         dwi NIfTI file
+    is_shelled
+        Whether the diffusion scheme is (multi-)shelled, as calculated by
+        :py:class:`~dmriprep.interfaces.vectors.CheckGradientTable`
 
     Outputs
     -------
     out_eddy
         The eddy corrected diffusion image
+    out_rotated_bvecs
+        The b-vectors rotated according to the estimated head-motion
+    eddy_ref_image
+        The first volume of the eddy corrected diffusion image
+    out_parameter
+        The head-motion and eddy-current parameters estimated per volume
+    out_movement_rms
+        The RMS of the estimated movement, with respect to the first and the
+        previous volumes
 
     """
     from nipype.interfaces.fsl import Eddy, ExtractROI
 
     inputnode = pe.Node(
         niu.IdentityInterface(
-            fields=["dwi_file", "metadata", "dwi_mask", "in_bvec", "in_bval"]
+            fields=[
+                "dwi_file",
+                "metadata",
+                "dwi_mask",
+                "in_bvec",
+                "in_bval",
+                "is_shelled",
+            ]
         ),
         name="inputnode",
     )
 
     outputnode = pe.Node(
         niu.IdentityInterface(
-            fields=["out_rotated_bvecs", "eddy_ref_image", "out_eddy"]
+            fields=[
+                "out_rotated_bvecs",
+                "eddy_ref_image",
+                "out_eddy",
+                "out_parameter",
+                "out_movement_rms",
+            ]
         ),
         name="outputnode",
     )
@@ -140,6 +165,8 @@ included in FSL {Eddy().version} [@eddy].
         eddy.inputs.is_shelled = True
         eddy.inputs.dont_peas = True
         eddy.inputs.nvoxhp = 100
+    else:
+        workflow.connect([(inputnode, eddy, [("is_shelled", "is_shelled")])])
 
     # Generate the acqp and index files for eddy
     gen_eddy_files = pe.Node(
@@ -171,7 +198,9 @@ included in FSL {Eddy().version} [@eddy].
         ]),
         (eddy, outputnode, [
             ("out_corrected", "out_eddy"),
-            ("out_rotated_bvecs", "out_rotated_bvecs")
+            ("out_rotated_bvecs", "out_rotated_bvecs"),
+            ("out_parameter", "out_parameter"),
+            ("out_movement_rms", "out_movement_rms"),
         ]),
         (eddy, eddy_ref_img, [("out_corrected", "in_file")]),
         (eddy_ref_img, outputnode, [("roi_file", "eddy_ref_image")]),
@@ -30,7 +30,10 @@ from ...interfaces import DerivativesDataSink
 def init_reportlets_wf(output_dir, sdc_report=False, name="reportlets_wf"):
     """Set up a battery of datasinks to store reports in the right location."""
     from niworkflows.interfaces.reportlets.masks import SimpleShowMaskRPT
+    from ... import config
+    from ...interfaces.reports import DeferredShowMask
 
+    ShowMask = DeferredShowMask if config.execution.defer_reportlets else SimpleShowMaskRPT
     workflow = Workflow(name=name)
 
     inputnode = pe.Node(
@@ -41,11 +44,12 @@ def init_reportlets_wf(output_dir, sdc_report=False, name="reportlets_wf"):
                 "dwi_mask",
                 "validation_report",
                 "sdc_report",
+                "carpet_report",
             ]
         ),
         name="inputnode",
     )
-    mask_reportlet = pe.Node(SimpleShowMaskRPT(), name="mask_reportlet")
+    mask_reportlet = pe.Node(ShowMask(), name="mask_reportlet")
 
     ds_report_mask = pe.Node(
         DerivativesDataSink(
@@ -61,6 +65,13 @@ def init_reportlets_wf(output_dir, sdc_report=False, name="reportlets_wf"):
         name="ds_report_validation",
         run_without_submitting=True,
     )
+    ds_report_carpet = pe.Node(
+        DerivativesDataSink(
+            base_directory=output_dir, desc="carpet", suffix="dwi", datatype="figures"
+        ),
+        name="ds_report_carpet",
+        run_without_submitting=True,
+    )
 
     # fmt:off
     workflow.connect([
@@ -68,6 +79,8 @@ def init_reportlets_wf(output_dir, sdc_report=False, name="reportlets_wf"):
                                      ("dwi_mask", "mask_file")]),
         (inputnode, ds_report_validation, [("source_file", "source_file")]),
         (inputnode, ds_report_mask, [("source_file", "source_file")]),
+        (inputnode, ds_report_carpet, [("source_file", "source_file"),
+                                       ("carpet_report", "in_file")]),
         (inputnode, ds_report_validation, [("validation_report", "in_file")]),
         (mask_reportlet, ds_report_mask, [("out_report", "in_file")]),
     ])
@@ -108,11 +121,26 @@ def init_dwi_derivatives_wf(output_dir, name="dwi_derivatives_wf"):
         The b0 reference.
     dwi_mask
         The brain mask for the dwi file.
+    qc_file
+        A table of per-volume summary statistics.
+    outliers_file
+        A (volumes x slices) matrix flagging slices with signal dropout.
+    exclude_file
+        A table flagging the volumes excluded because of signal dropout.
 
     """
     workflow = pe.Workflow(name=name)
     inputnode = pe.Node(
-        niu.IdentityInterface(fields=["source_file", "dwi_ref", "dwi_mask"]),
+        niu.IdentityInterface(
+            fields=[
+                "source_file",
+                "dwi_ref",
+                "dwi_mask",
+                "qc_file",
+                "outliers_file",
+                "exclude_file",
+            ]
+        ),
         name="inputnode",
     )
 
@@ -137,12 +165,51 @@ def init_dwi_derivatives_wf(output_dir, name="dwi_derivatives_wf"):
         name="ds_mask",
     )
 
+    ds_qc = pe.Node(
+        DerivativesDataSink(
+            base_directory=output_dir,
+            desc="qc",
+            suffix="timeseries",
+            datatype="dwi",
+        ),
+        name="ds_qc",
+        run_without_submitting=True,
+    )
+
+    ds_outliers = pe.Node(
+        DerivativesDataSink(
+            base_directory=output_dir,
+            desc="sliceoutliers",
+            suffix="timeseries",
+            datatype="dwi",
+        ),
+        name="ds_outliers",
+        run_without_submitting=True,
+    )
+
+    ds_exclude = pe.Node(
+        DerivativesDataSink(
+            base_directory=output_dir,
+            desc="excluded",
+            suffix="timeseries",
+            datatype="dwi",
+        ),
+        name="ds_exclude",
+        run_without_submitting=True,
+    )
+
     # fmt:off
     workflow.connect([
         (inputnode, ds_reference, [("source_file", "source_file"),
                                    ("dwi_ref", "in_file")]),
         (inputnode, ds_mask, [("source_file", "source_file"),
                               ("dwi_mask", "in_file")]),
+        (inputnode, ds_qc, [("source_file", "source_file"),
+                            ("qc_file", "in_file")]),
+        (inputnode, ds_outliers, [("source_file", "source_file"),
+                                  ("outliers_file", "in_file")]),
+        (inputnode, ds_exclude, [("source_file", "source_file"),
+                                 ("exclude_file", "in_file")]),
     ])
     # fmt:on
 